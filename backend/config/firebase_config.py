@@ -8,8 +8,10 @@ Usage:
 """
 
 import os
-import firebase_admin
-from firebase_admin import credentials, firestore
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from google.cloud.firestore import Client
 
 # Always use raw string for Windows paths!
 SERVICE_KEY_PATH = os.getenv(
@@ -19,11 +21,17 @@ SERVICE_KEY_PATH = os.getenv(
 
 def _init_app() -> None:
     """Initialise the default Firebase app exactly once."""
+    # firebase_admin pulls in the whole Google Cloud client stack; import it on first use
+    import firebase_admin
+    from firebase_admin import credentials
+
     if not firebase_admin._apps:  # type: ignore
         cred = credentials.Certificate(SERVICE_KEY_PATH)
         firebase_admin.initialize_app(cred)
 
-def get_firestore() -> firestore.Client:  # type: ignore
+def get_firestore() -> "Client":
     """Return a Firestore client instance."""
+    from firebase_admin import firestore
+
     _init_app()
     return firestore.client()
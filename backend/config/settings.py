@@ -0,0 +1,61 @@
+# backend/config/settings.py
+"""
+Runtime settings for the API process, read from environment variables.
+
+Usage:
+    from config import settings
+    if settings.EXPLAIN_ON_SUBMIT: ...
+"""
+
+import os
+
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+# Versioned model artifacts served by the API (LATEST names the version to serve)
+MODEL_ARTIFACTS_PATH = os.getenv("KREDAI_MODEL_ARTIFACTS_PATH", "trained_models/artifacts")
+
+# How often each API process checks LATEST for a new model version
+MODEL_POLL_INTERVAL_S = float(os.getenv("KREDAI_MODEL_POLL_INTERVAL_S", 5.0))
+
+# Compute the SHAP vector together with the prediction on /applications/
+EXPLAIN_ON_SUBMIT = _env_bool("KREDAI_EXPLAIN_ON_SUBMIT", False)
+
+# Max explanations kept in the in-process LRU (keyed by application_id)
+EXPLANATION_CACHE_SIZE = _env_int("KREDAI_EXPLANATION_CACHE_SIZE", 10000)
+
+# Threads used to run the synchronous Firestore client off the event loop
+FIRESTORE_IO_WORKERS = _env_int("KREDAI_FIRESTORE_IO_WORKERS", 16)
+
+# Where CPU-bound model calls run: "thread" (shared models) or "process" (models preloaded per worker)
+INFERENCE_POOL_MODE = os.getenv("KREDAI_INFERENCE_POOL_MODE", "thread")
+
+# Inference workers, and how many extra calls may queue before answering 429
+INFERENCE_WORKERS = _env_int("KREDAI_INFERENCE_WORKERS", min(4, os.cpu_count() or 1))
+INFERENCE_QUEUE_SIZE = _env_int("KREDAI_INFERENCE_QUEUE_SIZE", 64)
+
+# Run synthetic predictions/explanations at startup before reporting ready
+WARM_UP_ON_STARTUP = _env_bool("KREDAI_WARM_UP_ON_STARTUP", True)
+
+# Coalesce concurrent /applications/ predictions into one model call
+PREDICTION_BATCHING = _env_bool("KREDAI_PREDICTION_BATCHING", False)
+PREDICTION_BATCH_MAX_SIZE = _env_int("KREDAI_PREDICTION_BATCH_MAX_SIZE", 64)
+PREDICTION_BATCH_MAX_WAIT_MS = float(os.getenv("KREDAI_PREDICTION_BATCH_MAX_WAIT_MS", 2.0))
+
+# /admin/retrain runs training as a child process limited to this many cores, at lower priority
+RETRAIN_MAX_CPUS = _env_int("KREDAI_RETRAIN_MAX_CPUS", max(1, (os.cpu_count() or 1) // 2))
+RETRAIN_NICE = _env_int("KREDAI_RETRAIN_NICE", 10)
+RETRAIN_TIMEOUT_S = float(os.getenv("KREDAI_RETRAIN_TIMEOUT_S", 3600.0))
+# Training dataset (defaults to the training script's own path) and per-job log directory
+RETRAIN_DATA_PATH = os.getenv("KREDAI_RETRAIN_DATA_PATH")
+RETRAIN_LOG_DIR = os.getenv("KREDAI_RETRAIN_LOG_DIR", "trained_models/retrain_jobs")
@@ -9,16 +9,26 @@ federated learning integration, and explainable AI.
 from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
 import logging
+import time
 import uuid
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import asyncio
+import sys
+from pathlib import Path
 
 # Import services and models
-from services.prediction_service import PredictionService
-from services.explainability_service import ExplainabilityService
-from services.firebase_service import FirebaseService
+from config import settings
+from services.explanation_cache import ExplanationCache
+from services.firebase_service import FirebaseService, AsyncFirebaseService
+from services.inference_pool import InferencePool, InferencePoolSaturated
+from services.prediction_batcher import PredictionBatcher
+from services.model_registry import ModelRegistry, ModelHandle
+from services.retrain_jobs import RetrainJobManager, RetrainJobConflict
+from services.startup import StartupState
+from models.model_artifact import ArtifactError
 from models.pydantic_models import (
     CreditApplicationRequest,
     UserCreationRequest,
@@ -37,13 +47,114 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Model versions are loaded by the lifespan startup below; until then model endpoints answer 503
+model_registry = ModelRegistry(settings.MODEL_ARTIFACTS_PATH, warm_up=settings.WARM_UP_ON_STARTUP)
+firebase_service: Optional[AsyncFirebaseService] = None
+explanation_cache = ExplanationCache(settings.EXPLANATION_CACHE_SIZE)
+startup_state = StartupState()
+
+def _resolve_service(name: str, version: Optional[str] = None):
+    """Service of the pinned (or current) model version for thread-mode inference workers"""
+    return model_registry.get(version).service(name)
+
+def _retrain_command(n_cpus: int) -> List[str]:
+    """Training script invocation for a retraining job limited to n_cpus cores"""
+    command = [
+        sys.executable, str(Path(__file__).parent / "scripts" / "train_model.py"),
+        "--n-jobs", str(n_cpus),
+        "--client-workers", str(n_cpus),
+        "--models-dir", str(Path(settings.MODEL_ARTIFACTS_PATH).parent)
+    ]
+    if settings.RETRAIN_DATA_PATH:
+        command += ["--data-path", settings.RETRAIN_DATA_PATH]
+    return command
+
+async def _serve_retrained_model() -> str:
+    """Training published a new LATEST version: load, validate and swap it off the event loop;
+    other API processes pick it up on their next poll"""
+    await asyncio.to_thread(model_registry.refresh)
+    return model_registry.current.version
+
+# Retraining runs in a child process so it never blocks request handling
+retrain_jobs = RetrainJobManager(
+    _retrain_command,
+    log_dir=settings.RETRAIN_LOG_DIR,
+    max_cpus=settings.RETRAIN_MAX_CPUS,
+    nice=settings.RETRAIN_NICE,
+    timeout_s=settings.RETRAIN_TIMEOUT_S,
+    on_success=_serve_retrained_model
+)
+
+# CPU-bound model calls run here instead of on the event loop
+inference_pool = InferencePool(
+    mode=settings.INFERENCE_POOL_MODE,
+    max_workers=settings.INFERENCE_WORKERS,
+    max_queue=settings.INFERENCE_QUEUE_SIZE,
+    resolver=_resolve_service,
+    artifact_root=settings.MODEL_ARTIFACTS_PATH
+)
+
+# Optional micro-batching of concurrent predictions (scored on the inference pool)
+prediction_batcher = PredictionBatcher(
+    lambda matrix, version: inference_pool.run("prediction", "predict_encoded_batch", matrix, version=version),
+    max_batch_size=settings.PREDICTION_BATCH_MAX_SIZE,
+    max_wait_ms=settings.PREDICTION_BATCH_MAX_WAIT_MS
+)
+
+async def _start_models():
+    """Load, warm up and validate the LATEST model version"""
+    start = time.perf_counter()
+    await asyncio.to_thread(model_registry.refresh)
+    startup_state.component("models", True, time.perf_counter() - start)
+
+async def _start_inference_pool():
+    start = time.perf_counter()
+    await asyncio.to_thread(inference_pool.warm_up)
+    startup_state.component("inference_pool", True, time.perf_counter() - start)
+
+async def _start_firestore():
+    """Connect Firestore; a failure degrades storage endpoints but not model serving"""
+    global firebase_service
+    start = time.perf_counter()
+    try:
+        client = await asyncio.to_thread(FirebaseService)
+        firebase_service = AsyncFirebaseService(client, settings.FIRESTORE_IO_WORKERS)
+        startup_state.component("firestore", True, time.perf_counter() - start)
+    except Exception as e:
+        logger.error(f"Error connecting to Firestore: {str(e)}")
+        startup_state.component("firestore", False, time.perf_counter() - start, str(e))
+
+async def start_services():
+    """Load, connect and warm up every component concurrently, then mark the API ready"""
+    try:
+        await asyncio.gather(_start_models(), _start_inference_pool(), _start_firestore())
+        startup_state.mark_ready()
+    except Exception as e:
+        startup_state.mark_failed(str(e))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start in the background so the server (and /health/live) answers while models load
+    startup_task = asyncio.create_task(start_services())
+    # Every API process polls the LATEST stamp and hot-swaps new model versions
+    watch_task = asyncio.create_task(model_registry.watch(settings.MODEL_POLL_INTERVAL_S))
+    yield
+    startup_task.cancel()
+    watch_task.cancel()
+    await retrain_jobs.shutdown()
+    await prediction_batcher.stop()
+    inference_pool.shutdown()
+    if firebase_service is not None:
+        firebase_service.shutdown()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Credit Risk Assessment API",
     description="API for credit risk assessment using federated learning and explainable AI",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -55,10 +166,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize services
-prediction_service = PredictionService()
-explainability_service = ExplainabilityService()
-firebase_service = FirebaseService()
+async def require_ready():
+    """Dependency for model endpoints: 503 until startup has loaded and warmed the models"""
+    if not startup_state.ready:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Service is {startup_state.status}",
+            headers={"Retry-After": "1"}
+        )
+
+async def pinned_model():
+    """Dependency: the model version serving this request, kept alive until the request ends"""
+    await require_ready()
+    with model_registry.acquire() as model:
+        yield model
+
+def require_firestore() -> AsyncFirebaseService:
+    """Firestore service, or 503 when it is not (yet) connected"""
+    if firebase_service is None:
+        raise HTTPException(status_code=503, detail="Firestore is unavailable", headers={"Retry-After": "5"})
+    return firebase_service
 
 # Exception handler for better error responses
 @app.exception_handler(Exception)
@@ -73,6 +200,19 @@ async def general_exception_handler(request, exc):
         }
     )
 
+@app.exception_handler(InferencePoolSaturated)
+async def inference_saturated_handler(request, exc):
+    logger.warning(f"Rejecting request, inference pool saturated: {str(exc)}")
+    return JSONResponse(
+        status_code=429,
+        content={
+            "error": "Too many requests",
+            "detail": str(exc),
+            "timestamp": datetime.now().isoformat()
+        },
+        headers={"Retry-After": "1"}
+    )
+
 # Health check endpoint
 @app.get("/", response_model=HealthCheckResponse, tags=["Health"])
 async def root():
@@ -84,25 +224,40 @@ async def root():
 
 @app.get("/health", response_model=HealthCheckResponse, tags=["Health"])
 async def health_check():
-    """Detailed health check"""
-    try:
-        # Check if services are loaded
-        model_loaded = prediction_service.model is not None
-        explainer_loaded = explainability_service.explainer is not None
-        
-        status = "healthy" if model_loaded and explainer_loaded else "degraded"
-        
-        return HealthCheckResponse(
-            status=f"API Status: {status} | Model: {'OK' if model_loaded else 'Error'} | Explainer: {'OK' if explainer_loaded else 'Error'}",
-            version="1.0.0"
-        )
-    except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
-        raise HTTPException(status_code=503, detail="Service unavailable")
+    """Detailed health check: liveness, readiness and per-component startup status"""
+    state = startup_state.to_dict()
+    firestore_ok = state["components"].get("firestore", {}).get("ok", False)
+    model = model_registry.current
+    
+    if startup_state.ready:
+        status = "healthy" if firestore_ok else "degraded"
+    else:
+        status = startup_state.status
+    
+    return HealthCheckResponse(
+        status=f"API Status: {status} | Model: {model.version if model else 'Loading'} | "
+               f"Explainer: {'OK' if model else 'Loading'} | "
+               f"Firestore: {'OK' if firestore_ok else 'Unavailable'}",
+        version="1.0.0",
+        live=True,
+        ready=startup_state.ready,
+        components=state["components"]
+    )
+
+@app.get("/health/live", tags=["Health"])
+async def liveness():
+    """Liveness probe: the process is up and serving HTTP"""
+    return {"live": True}
+
+@app.get("/health/ready", tags=["Health"])
+async def readiness():
+    """Readiness probe: 200 once models are loaded and warmed up, 503 before"""
+    state = startup_state.to_dict()
+    return JSONResponse(status_code=200 if startup_state.ready else 503, content=state)
 
 # User management endpoints
 @app.post("/users/", response_model=Dict[str, str], tags=["Users"])
-async def create_user(user_data: UserCreationRequest):
+async def create_user(user_data: UserCreationRequest, firestore: AsyncFirebaseService = Depends(require_firestore)):
     """Create a new user profile"""
     try:
         # Store user in Firebase
@@ -115,7 +270,7 @@ async def create_user(user_data: UserCreationRequest):
             "applications": []
         }
         
-        firebase_service.create_user(user_data.user_id, user_doc)
+        await firestore.create_user(user_data.user_id, user_doc)
         
         logger.info(f"User created: {user_data.user_id}")
         return {
@@ -132,7 +287,8 @@ async def create_user(user_data: UserCreationRequest):
 async def submit_credit_application(
     application: CreditApplicationRequest,
     background_tasks: BackgroundTasks,
-    user_id: str = "anonymous"  # In production, extract from JWT token
+    user_id: str = "anonymous",  # In production, extract from JWT token
+    model: ModelHandle = Depends(pinned_model)
 ):
     """Submit credit application and get immediate risk assessment"""
     try:
@@ -141,17 +297,16 @@ async def submit_credit_application(
         
         logger.info(f"Processing credit application: {application_id}")
         
-        # Convert application to dictionary for prediction
-        application_data = application.dict()
+        # Convert application to dictionary and calculate derived features
+        application_data = model.prediction.schema.apply_derived(application.dict())
         
-        # Calculate derived features
-        if application.loan_amnt and application.person_income:
-            application_data["loan_percent_income"] = application.loan_amnt / application.person_income
+        # Encode once and make prediction
+        features = model.prediction.schema.encode(application_data)
+        if settings.PREDICTION_BATCHING:
+            prediction_result = await prediction_batcher.submit(features, model.version)
         else:
-            application_data["loan_percent_income"] = 0
-        
-        # Make prediction
-        prediction_result = prediction_service.predict(application_data)
+            prediction_result = await inference_pool.run("prediction", "predict_encoded", features,
+                                                         version=model.version)
         
         # Create application record
         application_record = {
@@ -163,6 +318,16 @@ async def submit_credit_application(
             "status": "completed"
         }
         
+        # Optionally explain on the same encoded row so /explain/ is a cache lookup
+        if settings.EXPLAIN_ON_SUBMIT:
+            shap_record = await inference_pool.run("explainability", "shap_record", features,
+                                                   version=model.version)
+            application_record["shap_explanation"] = shap_record
+            explanation_cache.put(application_id, {
+                "application_data": application_data,
+                "shap_explanation": shap_record
+            })
+        
         # Store in Firebase (background task)
         background_tasks.add_task(
             store_application_async,
@@ -182,6 +347,8 @@ async def submit_credit_application(
         logger.info(f"Application processed: {application_id} - Status: {prediction_result['loan_status']}")
         return response
         
+    except InferencePoolSaturated:
+        raise
     except Exception as e:
         logger.error(f"Error processing application: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -189,17 +356,18 @@ async def submit_credit_application(
 async def store_application_async(user_id: str, application_id: str, application_record: Dict[str, Any]):
     """Background task to store application in Firebase"""
     try:
-        firebase_service.store_application(user_id, application_id, application_record)
+        await require_firestore().store_application(user_id, application_id, application_record)
         logger.info(f"Application stored in Firebase: {application_id}")
     except Exception as e:
         logger.error(f"Error storing application in Firebase: {str(e)}")
 
 @app.get("/applications/{user_id}/", response_model=UserApplicationsResponse, tags=["Applications"])
-async def get_user_applications(user_id: str, limit: int = 10, offset: int = 0):
+async def get_user_applications(user_id: str, limit: int = 10, offset: int = 0,
+                                firestore: AsyncFirebaseService = Depends(require_firestore)):
     """Retrieve user's application history"""
     try:
         # Get applications from Firebase
-        applications = firebase_service.get_user_applications(user_id, limit, offset)
+        applications = await firestore.get_user_applications(user_id, limit, offset)
         
         # Convert to response format
         application_responses = []
@@ -224,20 +392,34 @@ async def get_user_applications(user_id: str, limit: int = 10, offset: int = 0):
 
 # Explainability endpoints
 @app.get("/explain/{application_id}/", response_model=ExplanationResponse, tags=["Explainability"])
-async def get_application_explanation(application_id: str, top_features: int = 10):
+async def get_application_explanation(application_id: str, top_features: int = 10,
+                                      model: ModelHandle = Depends(pinned_model)):
     """Get SHAP explanation for a specific application"""
     try:
-        # Get application data from Firebase
-        application_data = firebase_service.get_application(application_id)
+        # Serve from the explanation cache when the SHAP vector was computed at submission
+        application_data = explanation_cache.get(application_id)
         
-        if not application_data:
-            raise HTTPException(status_code=404, detail="Application not found")
+        if application_data is None:
+            # Get application data from Firebase
+            application_data = await require_firestore().get_application(application_id)
+            
+            if not application_data:
+                raise HTTPException(status_code=404, detail="Application not found")
         
         # Get original input data
         input_data = application_data["application_data"]
-        
-        # Generate SHAP explanation
-        explanation = explainability_service.explain_prediction(input_data, top_features)
+        shap_record = application_data.get("shap_explanation")
+        
+        # Generate SHAP explanation (re-using the stored SHAP vector when present)
+        if shap_record and shap_record.get("feature_names") == model.explainability.schema.feature_names:
+            explanation = model.explainability.explain_from_record(shap_record, input_data, top_features)
+            explanation_cache.put(application_id, {
+                "application_data": input_data,
+                "shap_explanation": shap_record
+            })
+        else:
+            explanation = await inference_pool.run("explainability", "explain_prediction", input_data, top_features,
+                                                   version=model.version)
         
         # Create response
         response = ExplanationResponse(
@@ -252,7 +434,7 @@ async def get_application_explanation(application_id: str, top_features: int = 1
         logger.info(f"Explanation generated for application: {application_id}")
         return response
         
-    except HTTPException:
+    except (HTTPException, InferencePoolSaturated):
         raise
     except Exception as e:
         logger.error(f"Error generating explanation: {str(e)}")
@@ -261,26 +443,24 @@ async def get_application_explanation(application_id: str, top_features: int = 1
 @app.post("/explain/batch/", response_model=List[ExplanationResponse], tags=["Explainability"])
 async def explain_batch_predictions(
     application_data_list: List[CreditApplicationRequest],
-    top_features: int = 10
+    top_features: int = 10,
+    model: ModelHandle = Depends(pinned_model)
 ):
     """Get explanations for multiple predictions (batch processing)"""
     try:
-        explanations = []
+        # Calculate derived features
+        input_data_list = [
+            model.explainability.schema.apply_derived(application.dict())
+            for application in application_data_list
+        ]
+        
+        # Generate all explanations with one SHAP call
+        batch_explanations = await inference_pool.run(
+            "explainability", "explain_batch", input_data_list, top_features, version=model.version
+        )
         
-        for i, application in enumerate(application_data_list):
-            application_data = application.dict()
-            
-            # Calculate derived features
-            if application.loan_amnt and application.person_income:
-                application_data["loan_percent_income"] = application.loan_amnt / application.person_income
-            else:
-                application_data["loan_percent_income"] = 0
-            
-            # Generate explanation
-            explanation = explainability_service.explain_prediction(application_data, top_features)
-            
-            # Create response
-            response = ExplanationResponse(
+        explanations = [
+            ExplanationResponse(
                 application_id=f"batch_{i}",
                 top_features=explanation["top_features"],
                 base_value=explanation["base_value"],
@@ -288,25 +468,29 @@ async def explain_batch_predictions(
                 total_shap_contribution=explanation["total_shap_contribution"],
                 readable_explanation=explanation["readable_explanation"]
             )
-            
-            explanations.append(response)
+            for i, explanation in enumerate(batch_explanations)
+        ]
         
         logger.info(f"Batch explanations generated for {len(explanations)} applications")
         return explanations
         
+    except InferencePoolSaturated:
+        raise
     except Exception as e:
         logger.error(f"Error in batch explanation: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
 # Model information endpoints
 @app.get("/model/info", tags=["Model"])
-async def get_model_info():
+async def get_model_info(model: ModelHandle = Depends(pinned_model)):
     """Get information about the loaded model"""
     try:
-        feature_importance = prediction_service.get_feature_importance()
+        feature_importance = model.prediction.get_feature_importance()
         
         return {
             "model_version": "1.0",
+            "artifact_version": model.version,
+            "loaded_at": model.loaded_at.isoformat(),
             "model_type": "LightGBM Classifier",
             "training_approach": "Federated Learning Simulation",
             "total_features": len(feature_importance),
@@ -319,10 +503,10 @@ async def get_model_info():
         raise HTTPException(status_code=500, detail="Error retrieving model information")
 
 @app.get("/model/features", tags=["Model"])
-async def get_model_features():
+async def get_model_features(model: ModelHandle = Depends(pinned_model)):
     """Get list of all model features and their importance"""
     try:
-        feature_importance = prediction_service.get_feature_importance()
+        feature_importance = model.prediction.get_feature_importance()
         
         return {
             "features": feature_importance,
@@ -333,43 +517,76 @@ async def get_model_features():
         logger.error(f"Error getting model features: {str(e)}")
         raise HTTPException(status_code=500, detail="Error retrieving model features")
 
+@app.get("/metrics/inference", tags=["Model"])
+async def get_inference_metrics():
+    """Inference pool queue depth and wait-time metrics"""
+    metrics = inference_pool.metrics()
+    if settings.PREDICTION_BATCHING:
+        metrics["batching"] = prediction_batcher.metrics()
+    return metrics
+
+@app.get("/metrics/models", tags=["Model"])
+async def get_model_metrics():
+    """Served model version, hot-swap counters and versions still draining"""
+    return model_registry.metrics()
+
 # Administrative endpoints
-@app.post("/admin/retrain", tags=["Admin"])
-async def trigger_model_retraining(background_tasks: BackgroundTasks):
-    """Trigger model retraining (admin only)"""
+@app.post("/admin/retrain", tags=["Admin"], status_code=202)
+async def trigger_model_retraining():
+    """Start model retraining in a supervised subprocess (admin only)"""
     try:
-        # Add retraining as background task
-        background_tasks.add_task(retrain_model_async)
-        
+        job = await retrain_jobs.start()
         return {
             "message": "Model retraining initiated",
-            "status": "started",
+            "job_id": job.job_id,
+            "status": job.status,
             "timestamp": datetime.now().isoformat()
         }
         
+    except RetrainJobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         logger.error(f"Error initiating model retraining: {str(e)}")
         raise HTTPException(status_code=500, detail="Error initiating retraining")
 
-async def retrain_model_async():
-    """Background task for model retraining"""
+@app.get("/admin/retrain", tags=["Admin"])
+async def list_retraining_jobs():
+    """Recent retraining jobs of this API process, newest first"""
+    return {"jobs": [job.to_dict() for job in retrain_jobs.list()]}
+
+@app.get("/admin/retrain/{job_id}", tags=["Admin"])
+async def get_retraining_job(job_id: str):
+    """Status, timings and log tail of a retraining job"""
     try:
-        logger.info("Starting model retraining...")
-        # Import training script and run
-        from scripts.train_model import FederatedLearningSimulator
-        
-        simulator = FederatedLearningSimulator()
-        simulator.run_federated_simulation()
-        
-        # Reload services with new models
-        global prediction_service, explainability_service
-        prediction_service = PredictionService()
-        explainability_service = ExplainabilityService()
-        
-        logger.info("Model retraining completed successfully")
+        return retrain_jobs.get(job_id).to_dict()
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Retraining job not found")
+
+@app.post("/admin/retrain/{job_id}/cancel", tags=["Admin"])
+async def cancel_retraining_job(job_id: str):
+    """Stop a running retraining job"""
+    try:
+        job = await retrain_jobs.cancel(job_id)
+        return job.to_dict()
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Retraining job not found")
+
+@app.post("/admin/models/{version}/promote", tags=["Admin"])
+async def promote_model_version(version: str):
+    """Serve an existing artifact version (e.g. roll back) in every API process"""
+    try:
+        handle = await asyncio.to_thread(model_registry.promote, version)
+        return {
+            "message": "Model version promoted",
+            "version": handle.version,
+            "timestamp": datetime.now().isoformat()
+        }
         
+    except (FileNotFoundError, ArtifactError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
-        logger.error(f"Error during model retraining: {str(e)}")
+        logger.error(f"Error promoting model version {version}: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,181 @@
+# backend/models/feature_schema.py
+"""
+Model Feature Schema
+
+Single source of truth for the model's input features: order, dtypes,
+defaults and derived-feature rules. The schema is saved next to the
+model artifact so training and serving always agree on the layout; the
+fitted preprocessing pipeline shipped with the artifact is attached to it.
+"""
+
+import json
+import numpy as np
+from pathlib import Path
+import logging
+from typing import Dict, Any, List, Optional, Sequence
+
+from models.feature_layout import FeatureLayout
+from models.model_artifact import resolve_version_dir
+from models.preprocessing_pipeline import PreprocessingPipeline
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_FILENAME = "feature_schema.json"
+SCHEMA_VERSION = 1
+
+# Model features in training order
+MODEL_FEATURES = [
+    'person_income', 'person_emp_length', 'loan_amnt', 'loan_int_rate',
+    'loan_percent_income', 'cb_person_cred_hist_length', 'age',
+    'estimated_monthly_income', 'monthly_airtime_spend', 'monthly_data_usage_gb',
+    'avg_calls_per_day', 'avg_sms_per_day', 'digital_wallet_usage',
+    'monthly_digital_transactions', 'avg_transaction_amount',
+    'social_media_activity_score', 'mobile_banking_user',
+    'digital_engagement_score', 'financial_inclusion_score',
+    'electricity_bill_avg', 'water_bill_avg', 'gas_bill_avg',
+    'total_utility_expense', 'utility_to_income_ratio',
+    'on_time_payments_12m', 'late_payments_12m', 'credit_risk_score'
+]
+
+# Features computed from other request fields before scoring
+DERIVED_FEATURES = {
+    'loan_percent_income': {
+        'rule': 'ratio',
+        'numerator': 'loan_amnt',
+        'denominator': 'person_income',
+        'default': 0.0
+    }
+}
+
+
+def _ratio_rule(data: Dict[str, Any], spec: Dict[str, Any]) -> float:
+    """numerator / denominator, or the default when either is missing or zero"""
+    numerator = data.get(spec['numerator'])
+    denominator = data.get(spec['denominator'])
+    if numerator and denominator:
+        return numerator / denominator
+    return spec.get('default', 0.0)
+
+
+DERIVED_FEATURE_RULES = {
+    'ratio': _ratio_rule
+}
+
+
+class FeatureSchema:
+    """Precompiled feature schema shared by training, prediction and SHAP"""
+
+    def __init__(self, feature_names: Sequence[str], dtypes: Optional[Dict[str, str]] = None,
+                 defaults: Optional[Dict[str, float]] = None,
+                 derived_features: Optional[Dict[str, Dict[str, Any]]] = None,
+                 pipeline: Optional[PreprocessingPipeline] = None):
+        self.feature_names: List[str] = list(feature_names)
+        self.feature_index = {name: i for i, name in enumerate(self.feature_names)}
+        self.dtypes = {name: (dtypes or {}).get(name, 'float64') for name in self.feature_names}
+        self.defaults = {name: float((defaults or {}).get(name, 0.0)) for name in self.feature_names}
+        self.derived_features = dict(derived_features or {})
+
+        for name, spec in self.derived_features.items():
+            if spec.get('rule') not in DERIVED_FEATURE_RULES:
+                raise ValueError(f"Unknown rule for derived feature {name}: {spec.get('rule')}")
+
+        # Fitted fill/clip/scale step applied by every encode (None: fill with the defaults only)
+        self.pipeline = pipeline
+        self.layout = FeatureLayout(self.feature_names, [self.defaults[name] for name in self.feature_names],
+                                    pipeline=pipeline)
+
+    @classmethod
+    def default(cls) -> "FeatureSchema":
+        """Schema matching the features the model is trained on"""
+        return cls(MODEL_FEATURES, derived_features=DERIVED_FEATURES)
+
+    @property
+    def n_features(self) -> int:
+        return len(self.feature_names)
+
+    def with_pipeline(self, pipeline: Optional[PreprocessingPipeline]) -> "FeatureSchema":
+        """Copy of the schema that encodes through a fitted preprocessing pipeline"""
+        return FeatureSchema(self.feature_names, self.dtypes, self.defaults, self.derived_features, pipeline)
+
+    def apply_derived(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Return a copy of the request with derived features calculated"""
+        data = dict(input_data)
+        for name, spec in self.derived_features.items():
+            data[name] = DERIVED_FEATURE_RULES[spec['rule']](data, spec)
+        return data
+
+    def encode(self, input_data: Dict[str, Any]) -> np.ndarray:
+        """Encode a request into a (1, n_features) feature row
+
+        The row is a fresh array, so it can be handed to both the model and
+        the explainer without re-encoding.
+        """
+        return self.layout.fill_row(input_data, out=np.empty((1, self.n_features), dtype=np.float64))
+
+    def transform_frame(self, df):
+        """DataFrame counterpart of encode: features in schema order, filled (and clipped and scaled)"""
+        if self.pipeline is not None:
+            return self.pipeline.transform_frame(df)
+        return df.reindex(columns=self.feature_names).fillna(self.defaults)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'version': SCHEMA_VERSION,
+            'features': [
+                {'name': name, 'dtype': self.dtypes[name], 'default': self.defaults[name]}
+                for name in self.feature_names
+            ],
+            'derived_features': self.derived_features
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FeatureSchema":
+        if data.get('version') != SCHEMA_VERSION:
+            raise ValueError(f"Unsupported feature schema version: {data.get('version')}")
+        features = data['features']
+        return cls(
+            [f['name'] for f in features],
+            dtypes={f['name']: f['dtype'] for f in features},
+            defaults={f['name']: f['default'] for f in features},
+            derived_features=data.get('derived_features')
+        )
+
+    def save(self, path: Path) -> Path:
+        """Write the schema as JSON"""
+        path = Path(path)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        logger.info(f"Feature schema saved to {path}")
+        return path
+
+    @classmethod
+    def load(cls, path: Path) -> "FeatureSchema":
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def for_artifact(cls, artifact_path: Path) -> "FeatureSchema":
+        """Load the schema shipped inside an artifact version or saved next to the artifact, or the default one
+
+        The artifact's preprocessing pipeline, if it has one, is attached.
+        """
+        artifact_path = Path(artifact_path)
+        schema_path = artifact_path.parent / SCHEMA_FILENAME
+        if artifact_path.is_dir():
+            try:
+                version_schema = resolve_version_dir(artifact_path) / SCHEMA_FILENAME
+                if version_schema.exists():
+                    schema_path = version_schema
+            except FileNotFoundError:
+                pass
+        if schema_path.exists():
+            logger.info(f"Feature schema loaded from {schema_path}")
+            schema = cls.load(schema_path)
+        else:
+            logger.info(f"No feature schema at {schema_path}, using default schema")
+            schema = cls.default()
+        pipeline = PreprocessingPipeline.for_artifact(artifact_path)
+        return schema.with_pipeline(pipeline) if pipeline is not None else schema
+
+
+DEFAULT_FEATURE_SCHEMA = FeatureSchema.default()
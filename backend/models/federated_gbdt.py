@@ -0,0 +1,343 @@
+# backend/models/federated_gbdt.py
+"""
+Federated Histogram Gradient Boosting
+
+Horizontal federated training of a binary GBDT: every client keeps its
+rows local and only ships aggregates to the server.
+
+1. Binning: clients send per-feature quantile summaries; the server merges
+   them into global bin edges and broadcasts them.
+2. Each boosting round grows one tree leaf-wise. For every leaf the server
+   wants to split, clients send (gradient, hessian, count) histograms of
+   their rows in that leaf, packed to the bins each feature actually has;
+   the server sums them, picks the best split and broadcasts it. Only the
+   smaller child's histogram is requested, the sibling is the parent minus
+   that child.
+3. The server broadcasts leaf values; clients update their raw scores.
+
+Summed histograms equal the histograms of the pooled data, so the trees
+are the ones a centralized histogram GBDT would grow on the same bins.
+The result is a TreeEnsemble, served like any exported LightGBM model.
+
+The server talks to its clients through a client group: ``LocalClients``
+runs them one after another in this process; any object with the same
+``call`` method (e.g. clients hosted in worker processes) can stand in.
+"""
+
+import logging
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from models.tree_ensemble import MISSING_NONE, TreeEnsemble
+
+logger = logging.getLogger(__name__)
+
+# Quantile points per feature each client sends for binning
+QUANTILE_SUMMARY_SIZE = 256
+
+# Bytes of one broadcast split decision: leaf, feature, bin, left id, right id
+SPLIT_MESSAGE_BYTES = 5 * 8
+
+
+def packed_bin_index(edges: List[np.ndarray], n_bins: int) -> np.ndarray:
+    """Positions of the existing bins in a (n_features * n_bins) histogram"""
+    return np.concatenate([f * n_bins + np.arange(len(feature_edges) + 1) for f, feature_edges in enumerate(edges)])
+
+
+class FederatedClient:
+    """One participant: holds its rows and answers the server's requests"""
+
+    def __init__(self, X: np.ndarray, y: np.ndarray):
+        self.X = np.asarray(X, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.n_rows, self.n_features = self.X.shape
+        self.bins: Optional[np.ndarray] = None
+        self.n_bins = 0
+        self._packed_bins: Optional[np.ndarray] = None
+        self.raw = np.zeros(self.n_rows)
+        self._grad = self._hess = None
+        self._rows: Dict[int, np.ndarray] = {}
+
+    def label_stats(self) -> np.ndarray:
+        """(positives, rows), for the initial score"""
+        return np.array([self.y.sum(), self.n_rows])
+
+    def quantile_summary(self, n_quantiles: int = QUANTILE_SUMMARY_SIZE) -> np.ndarray:
+        """Per-feature quantiles of the local rows, shape (n_features, n_quantiles)"""
+        return np.quantile(self.X, np.linspace(0.0, 1.0, n_quantiles), axis=0).T
+
+    def set_bin_edges(self, edges: List[np.ndarray], init_score: float):
+        """Bin local rows with the global edges (bin b holds edges[b-1] < x <= edges[b])"""
+        self.bins = np.empty(self.X.shape, dtype=np.uint8)
+        for f, feature_edges in enumerate(edges):
+            self.bins[:, f] = np.searchsorted(feature_edges, self.X[:, f], side='left')
+        self.n_bins = max(len(feature_edges) for feature_edges in edges) + 1
+        self._packed_bins = packed_bin_index(edges, self.n_bins)
+        self.raw[:] = init_score
+
+    def start_tree(self, root: int):
+        """Gradients of the logistic loss at the current scores; all rows start at the root"""
+        p = 1.0 / (1.0 + np.exp(-self.raw))
+        self._grad = p - self.y
+        self._hess = p * (1.0 - p)
+        self._rows = {root: np.arange(self.n_rows)}
+
+    def histogram(self, leaf: int) -> np.ndarray:
+        """(gradient, hessian, count) sums per feature and bin for the rows in a leaf
+
+        Packed: only the bins each feature has, concatenated, shape (n_packed_bins, 3).
+        """
+        n_bins = self.n_bins
+        rows = self._rows[leaf]
+        # One bincount over all features: feature f's bins are offset by f * n_bins
+        index = (self.bins[rows].astype(np.intp) + np.arange(self.n_features) * n_bins).ravel()
+        size = self.n_features * n_bins
+        grad = np.repeat(self._grad[rows], self.n_features)
+        hess = np.repeat(self._hess[rows], self.n_features)
+        hist = np.stack([
+            np.bincount(index, weights=grad, minlength=size),
+            np.bincount(index, weights=hess, minlength=size),
+            np.bincount(index, minlength=size).astype(np.float64),
+        ], axis=-1)
+        return hist[self._packed_bins]
+
+    def apply_split(self, leaf: int, feature: int, bin_index: int, left: int, right: int):
+        rows = self._rows.pop(leaf)
+        goes_left = self.bins[rows, feature] <= bin_index
+        self._rows[left] = rows[goes_left]
+        self._rows[right] = rows[~goes_left]
+
+    def finish_tree(self, leaf_values: Dict[int, float]):
+        for leaf, rows in self._rows.items():
+            self.raw[rows] += leaf_values[leaf]
+        self._rows = {}
+
+
+class LocalClients:
+    """Client group whose clients run in this process, one after another"""
+
+    def __init__(self, clients: Sequence[FederatedClient]):
+        self.clients = list(clients)
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    def call(self, method: str, *args) -> List[Any]:
+        """Ask every client to run a FederatedClient method; their answers in client order"""
+        return [getattr(client, method)(*args) for client in self.clients]
+
+
+class FederatedHistogramGBDT:
+    """Server side of federated histogram GBDT training
+
+    Hyperparameters follow LightGBM's names and defaults where they exist.
+    ``history`` records wall time and bytes exchanged for every round;
+    round 0 is the binning/initialization exchange.
+    """
+
+    def __init__(self, n_estimators: int = 100, learning_rate: float = 0.05, num_leaves: int = 31,
+                 max_bins: int = 64, min_child_samples: int = 20, min_child_weight: float = 1e-3,
+                 reg_lambda: float = 0.0, min_split_gain: float = 0.0):
+        if not 2 <= max_bins <= 256:
+            raise ValueError("max_bins must be between 2 and 256")
+        self.n_estimators = n_estimators
+        self.learning_rate = learning_rate
+        self.num_leaves = num_leaves
+        self.max_bins = max_bins
+        self.min_child_samples = min_child_samples
+        self.min_child_weight = min_child_weight
+        self.reg_lambda = reg_lambda
+        self.min_split_gain = min_split_gain
+        self.bin_edges: List[np.ndarray] = []
+        self.init_score = 0.0
+        self.history: List[Dict[str, Any]] = []
+
+    # ------------------------------------------------------------------
+    # Setup round
+    # ------------------------------------------------------------------
+
+    def merge_bin_edges(self, summaries: List[np.ndarray], weights: Sequence[float]) -> List[np.ndarray]:
+        """Global bin edges from the clients' quantile summaries, weighted by client size"""
+        n_features = summaries[0].shape[0]
+        edges = []
+        for f in range(n_features):
+            points = np.concatenate([summary[f] for summary in summaries])
+            point_weights = np.concatenate([np.full(summary.shape[1], w / summary.shape[1])
+                                            for summary, w in zip(summaries, weights)])
+            distinct = np.unique(points)
+            if len(distinct) < self.max_bins:
+                # Few distinct values: one bin per value
+                edges.append(distinct[:-1])
+                continue
+            order = np.argsort(points, kind='stable')
+            cumulative = np.cumsum(point_weights[order])
+            targets = np.linspace(0.0, cumulative[-1], self.max_bins + 1)[1:-1]
+            cuts = points[order][np.searchsorted(cumulative, targets)]
+            edges.append(np.unique(cuts))
+        return edges
+
+    # ------------------------------------------------------------------
+    # Split finding
+    # ------------------------------------------------------------------
+
+    def _leaf_value(self, grad: float, hess: float) -> float:
+        return -grad / (hess + self.reg_lambda) * self.learning_rate
+
+    def best_split(self, hist: np.ndarray) -> Optional[Tuple[float, int, int]]:
+        """(gain, feature, bin) of the best split of a leaf's histogram, or None"""
+        left = np.cumsum(hist, axis=1)[:, :-1]
+        total = hist[0].sum(axis=0)
+        right = total - left
+        g_l, h_l, c_l = left[..., 0], left[..., 1], left[..., 2]
+        g_r, h_r, c_r = right[..., 0], right[..., 1], right[..., 2]
+
+        valid = (c_l >= self.min_child_samples) & (c_r >= self.min_child_samples) \
+            & (h_l >= self.min_child_weight) & (h_r >= self.min_child_weight) & self._valid_bins
+        if not valid.any():
+            return None
+        lam = self.reg_lambda
+        # Invalid bins (e.g. empty ones with reg_lambda=0) can divide 0 by 0; they are masked out below
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gain = g_l ** 2 / (h_l + lam) + g_r ** 2 / (h_r + lam) - total[0] ** 2 / (total[1] + lam)
+        gain = np.where(valid, gain, -np.inf)
+        feature, bin_index = np.unravel_index(np.argmax(gain), gain.shape)
+        if gain[feature, bin_index] <= self.min_split_gain:
+            return None
+        return float(gain[feature, bin_index]), int(feature), int(bin_index)
+
+    # ------------------------------------------------------------------
+    # Training
+    # ------------------------------------------------------------------
+
+    def fit(self, clients: Union[Sequence[FederatedClient], LocalClients], feature_names: Sequence[str],
+            bin_edges: Optional[List[np.ndarray]] = None) -> TreeEnsemble:
+        """Train over the clients (a list or a client group) and return the global model"""
+        start = time.perf_counter()
+        bytes_up = bytes_down = 0
+        if not hasattr(clients, 'call'):
+            clients = LocalClients(clients)
+
+        label_stats = clients.call('label_stats')
+        bytes_up += sum(stats.nbytes for stats in label_stats)
+        positives, n_rows = np.sum(label_stats, axis=0)
+        rate = np.clip(positives / n_rows, 1e-15, 1 - 1e-15)
+        # LightGBM's boost_from_average: start from the pooled log-odds
+        self.init_score = float(np.log(rate / (1.0 - rate)))
+
+        if bin_edges is None:
+            summaries = clients.call('quantile_summary')
+            bytes_up += sum(summary.nbytes for summary in summaries)
+            bin_edges = self.merge_bin_edges(summaries, [stats[1] for stats in label_stats])
+        self.bin_edges = [np.asarray(edges, dtype=np.float64) for edges in bin_edges]
+        self.n_bins = max(len(edges) for edges in self.bin_edges) + 1
+        self._packed_bins = packed_bin_index(self.bin_edges, self.n_bins)
+        # A split after bin b needs an edge to use as threshold
+        self._valid_bins = np.arange(self.n_bins - 1) < np.array([len(e) for e in self.bin_edges])[:, np.newaxis]
+        clients.call('set_bin_edges', self.bin_edges, self.init_score)
+        bytes_down += len(clients) * (sum(edges.nbytes for edges in self.bin_edges) + 8)
+        self.history = [{"round": 0, "seconds": time.perf_counter() - start,
+                         "bytes_up": bytes_up, "bytes_down": bytes_down, "leaves": 0}]
+
+        trees = []
+        for round_index in range(1, self.n_estimators + 1):
+            round_start = time.perf_counter()
+            tree, bytes_up, bytes_down = self._grow_tree(clients, first=round_index == 1)
+            trees.append(tree)
+            self.history.append({"round": round_index, "seconds": time.perf_counter() - round_start,
+                                 "bytes_up": bytes_up, "bytes_down": bytes_down,
+                                 "leaves": sum(1 for node in tree.values() if node['feature'] < 0)})
+
+        ensemble = self._to_ensemble(trees, feature_names)
+        logger.info(f"Federated GBDT trained over {len(clients)} clients in {time.perf_counter() - start:.2f}s: "
+                    f"{ensemble.n_trees} trees, {self.bytes_exchanged() / 1e6:.2f} MB exchanged")
+        return ensemble
+
+    def _request_histogram(self, clients: LocalClients, leaf: int) -> Tuple[np.ndarray, int]:
+        """Sum of the clients' packed histograms, unpacked to (n_features, n_bins, 3); and bytes received"""
+        packed = clients.call('histogram', leaf)
+        hist = np.zeros((len(self.bin_edges) * self.n_bins, 3))
+        hist[self._packed_bins] = np.sum(packed, axis=0)
+        return hist.reshape(len(self.bin_edges), self.n_bins, 3), sum(part.nbytes for part in packed)
+
+    def _grow_tree(self, clients: LocalClients, first: bool) -> Tuple[Dict[int, Dict[str, Any]], int, int]:
+        """One boosting round; returns (nodes by id, bytes up, bytes down)"""
+        clients.call('start_tree', 0)
+        root_hist, bytes_up = self._request_histogram(clients, 0)
+        bytes_down = 0
+
+        nodes: Dict[int, Dict[str, Any]] = {}
+        hists = {0: root_hist}
+        candidates = {0: self.best_split(root_hist)}
+        n_leaves = 1
+        next_id = 1
+        while n_leaves < self.num_leaves:
+            splittable = {leaf: split for leaf, split in candidates.items() if split is not None}
+            if not splittable:
+                break
+            leaf = max(splittable, key=lambda node: splittable[node][0])
+            _, feature, bin_index = candidates.pop(leaf)
+            left, right = next_id, next_id + 1
+            next_id += 2
+            clients.call('apply_split', leaf, feature, bin_index, left, right)
+            bytes_down += len(clients) * SPLIT_MESSAGE_BYTES
+
+            parent = hists.pop(leaf)
+            left_count = parent[feature, :bin_index + 1, 2].sum()
+            small, large = (left, right) if left_count <= parent[0, :, 2].sum() - left_count else (right, left)
+            hists[small], sent = self._request_histogram(clients, small)
+            hists[large] = parent - hists[small]
+            bytes_up += sent
+            candidates[left] = self.best_split(hists[left])
+            candidates[right] = self.best_split(hists[right])
+
+            nodes[leaf] = self._node(parent, feature, self.bin_edges[feature][bin_index], left, right)
+            n_leaves += 1
+
+        leaf_values = {}
+        for leaf, hist in hists.items():
+            nodes[leaf] = self._node(hist)
+            leaf_values[leaf] = nodes[leaf]['value']
+        clients.call('finish_tree', leaf_values)
+        bytes_down += len(clients) * len(leaf_values) * 16
+
+        if first:
+            # Like LightGBM, the initial score is folded into the first tree
+            for node in nodes.values():
+                if node['feature'] < 0:
+                    node['value'] += self.init_score
+        return nodes, bytes_up, bytes_down
+
+    def _node(self, hist: np.ndarray, feature: int = -1, threshold: float = 0.0,
+              left: int = -1, right: int = -1) -> Dict[str, Any]:
+        grad, hess, count = hist[0].sum(axis=0)
+        return {'feature': feature, 'threshold': float(threshold), 'left': left, 'right': right,
+                'value': self._leaf_value(grad, hess), 'cover': float(count)}
+
+    def _to_ensemble(self, trees: List[Dict[int, Dict[str, Any]]], feature_names: Sequence[str]) -> TreeEnsemble:
+        """Flatten trees into TreeEnsemble's preorder node arrays"""
+        columns: Dict[str, List] = {name: [] for name in
+                                    ('feature', 'threshold', 'left', 'right', 'default_left',
+                                     'missing_type', 'value', 'cover')}
+        tree_offsets = []
+
+        def add_node(nodes: Dict[int, Dict[str, Any]], node_id: int) -> int:
+            node = nodes[node_id]
+            index = len(columns['feature'])
+            for name in ('feature', 'threshold', 'left', 'right', 'value', 'cover'):
+                columns[name].append(node[name])
+            columns['default_left'].append(True)
+            columns['missing_type'].append(MISSING_NONE)
+            if node['feature'] >= 0:
+                columns['left'][index] = add_node(nodes, node['left'])
+                columns['right'][index] = add_node(nodes, node['right'])
+            return index
+
+        for nodes in trees:
+            tree_offsets.append(len(columns['feature']))
+            add_node(nodes, 0)
+        return TreeEnsemble(feature_names, np.array(tree_offsets), columns)
+
+    def bytes_exchanged(self) -> int:
+        return sum(entry['bytes_up'] + entry['bytes_down'] for entry in self.history)
@@ -14,14 +14,17 @@ from typing import Optional, Dict, Any, List
 from sklearn.base import BaseEstimator
 import lightgbm as lgb
 
+from models.feature_schema import FeatureSchema, DEFAULT_FEATURE_SCHEMA
+
 logger = logging.getLogger(__name__)
 
 class ModelManager:
     """Utility class for managing ML models and their operations"""
     
-    def __init__(self, models_dir: str = "trained_models"):
+    def __init__(self, models_dir: str = "trained_models", schema: FeatureSchema = DEFAULT_FEATURE_SCHEMA):
         self.models_dir = Path(models_dir)
         self.models_dir.mkdir(exist_ok=True)
+        self.schema = schema
         
     def save_model(self, model: BaseEstimator, model_name: str) -> str:
         """Save a trained model to disk"""
@@ -63,33 +66,19 @@ class ModelManager:
     
     def prepare_model_features(self, data: Dict[str, Any]) -> pd.DataFrame:
         """Prepare input data for model prediction"""
-        # Define expected features (should match training data)
-        expected_features = [
-            'person_income', 'person_emp_length', 'loan_amnt', 'loan_int_rate', 
-            'loan_percent_income', 'cb_person_cred_hist_length', 'age', 
-            'estimated_monthly_income', 'monthly_airtime_spend', 'monthly_data_usage_gb',
-            'avg_calls_per_day', 'avg_sms_per_day', 'digital_wallet_usage',
-            'monthly_digital_transactions', 'avg_transaction_amount', 
-            'social_media_activity_score', 'mobile_banking_user',
-            'digital_engagement_score', 'financial_inclusion_score',
-            'electricity_bill_avg', 'water_bill_avg', 'gas_bill_avg',
-            'total_utility_expense', 'utility_to_income_ratio', 
-            'on_time_payments_12m', 'late_payments_12m', 'credit_risk_score'
-        ]
-        
         # Create DataFrame with expected features
         df = pd.DataFrame([data])
         
         # Add missing features with default values
-        for feature in expected_features:
+        for feature in self.schema.feature_names:
             if feature not in df.columns:
-                df[feature] = 0
+                df[feature] = self.schema.defaults[feature]
         
         # Select only expected features in correct order
-        df = df[expected_features]
+        df = df[self.schema.feature_names]
         
         # Handle missing values
-        df = df.fillna(0)
+        df = df.fillna(self.schema.defaults)
         
         return df
     
@@ -0,0 +1,184 @@
+# backend/models/model_artifact.py
+"""
+Versioned Model Artifacts
+
+Pickle-free on-disk format for serving models. Each version is a directory
+holding one ``.npy`` file per array plus a JSON manifest:
+
+    trained_models/artifacts/
+        LATEST                          name of the version to serve
+        20261017T014000Z-3f2a9c1e/
+            manifest.json               format, metadata, dtype/shape/sha256 per array
+            feature.npy
+            threshold.npy
+            ...
+
+Arrays are opened with ``np.load(mmap_mode='r')``: loading only parses the
+.npy headers, and every process that opens the same version shares a
+single page-cache copy instead of holding private unpickled objects.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_FORMAT_VERSION = 1
+MANIFEST_FILENAME = "manifest.json"
+LATEST_FILENAME = "LATEST"
+# Artifact root written by training next to the legacy pickles
+MODEL_ARTIFACTS_DIRNAME = "artifacts"
+
+
+class ArtifactError(ValueError):
+    """Raised when an artifact directory is malformed or fails verification"""
+
+
+def _file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_artifact(root: Path, kind: str, arrays: Dict[str, np.ndarray], metadata: Dict[str, Any],
+                   documents: Optional[Dict[str, Any]] = None, make_latest: bool = True) -> Path:
+    """Write a new version directory under root and return its path
+
+    ``documents`` are extra JSON files (e.g. the feature schema) that ship
+    with the version. The version is staged in a hidden directory and
+    renamed into place, and LATEST is replaced atomically, so readers never
+    see a partial version.
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    staging = root / f".staging-{os.getpid()}-{datetime.now().timestamp():.6f}"
+    staging.mkdir()
+
+    try:
+        entries = {}
+        content = hashlib.sha256()
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            if array.dtype.hasobject:
+                raise ArtifactError(f"Array '{name}' has object dtype and cannot be stored without pickle")
+            file_path = staging / f"{name}.npy"
+            np.save(file_path, array, allow_pickle=False)
+            sha256 = _file_digest(file_path)
+            content.update(sha256.encode())
+            entries[name] = {
+                "file": file_path.name,
+                "dtype": array.dtype.str,
+                "shape": list(array.shape),
+                "sha256": sha256,
+            }
+
+        for filename, document in (documents or {}).items():
+            with open(staging / filename, 'w') as f:
+                json.dump(document, f, indent=2)
+            content.update(_file_digest(staging / filename).encode())
+
+        created_at = datetime.now(timezone.utc)
+        version = f"{created_at:%Y%m%dT%H%M%SZ}-{content.hexdigest()[:8]}"
+        manifest = {
+            "format_version": ARTIFACT_FORMAT_VERSION,
+            "kind": kind,
+            "version": version,
+            "created_at": created_at.isoformat(),
+            "metadata": metadata,
+            "arrays": entries,
+            "documents": sorted(documents or {}),
+        }
+        with open(staging / MANIFEST_FILENAME, 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        version_dir = root / version
+        if version_dir.exists():
+            # Same content written within the same second: keep the existing copy
+            shutil.rmtree(staging)
+        else:
+            os.replace(staging, version_dir)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    if make_latest:
+        set_latest(root, version)
+    logger.info(f"Artifact {kind} {version} written to {version_dir}")
+    return version_dir
+
+
+def set_latest(root: Path, version: str):
+    """Point root/LATEST at an existing version"""
+    root = Path(root)
+    if not (root / version / MANIFEST_FILENAME).exists():
+        raise ArtifactError(f"No artifact version {version} under {root}")
+    pointer = root / f".{LATEST_FILENAME}.{os.getpid()}"
+    pointer.write_text(version + "\n")
+    os.replace(pointer, root / LATEST_FILENAME)
+
+
+def list_versions(root: Path) -> List[str]:
+    """Versions under root, oldest first (names sort by creation time)"""
+    root = Path(root)
+    if not root.is_dir():
+        return []
+    return sorted(p.name for p in root.iterdir() if (p / MANIFEST_FILENAME).exists())
+
+
+def resolve_version_dir(path: Path) -> Path:
+    """A version directory, or the one an artifact root's LATEST points at"""
+    path = Path(path)
+    if (path / MANIFEST_FILENAME).exists():
+        return path
+    latest = path / LATEST_FILENAME
+    if latest.exists():
+        return path / latest.read_text().strip()
+    raise FileNotFoundError(f"No model artifact at {path}")
+
+
+def artifact_root_for(path: Path) -> Path:
+    """Artifact directory to serve for a configured model path
+
+    Directories are used as-is; a legacy pickle path maps to the artifact
+    root written next to it.
+    """
+    path = Path(path)
+    return path if path.is_dir() else path.parent / MODEL_ARTIFACTS_DIRNAME
+
+
+def read_artifact(path: Path, kind: str, verify: bool = False) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """Open an artifact's arrays as read-only memory maps
+
+    Returns (manifest, arrays). Dtypes and shapes are always checked against
+    the manifest; ``verify=True`` also checks every file's sha256.
+    """
+    version_dir = resolve_version_dir(path)
+    with open(version_dir / MANIFEST_FILENAME) as f:
+        manifest = json.load(f)
+
+    if manifest.get("format_version") != ARTIFACT_FORMAT_VERSION:
+        raise ArtifactError(f"Unsupported artifact format {manifest.get('format_version')} in {version_dir}")
+    if manifest.get("kind") != kind:
+        raise ArtifactError(f"Expected a {kind} artifact in {version_dir}, found {manifest.get('kind')}")
+
+    arrays = {}
+    for name, entry in manifest["arrays"].items():
+        file_path = version_dir / entry["file"]
+        if verify and _file_digest(file_path) != entry["sha256"]:
+            raise ArtifactError(f"Checksum mismatch for {file_path}")
+        array = np.load(file_path, mmap_mode='r', allow_pickle=False)
+        if array.dtype.str != entry["dtype"] or list(array.shape) != entry["shape"]:
+            raise ArtifactError(f"{file_path} does not match its manifest entry")
+        arrays[name] = array
+
+    return manifest, arrays
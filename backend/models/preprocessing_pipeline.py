@@ -0,0 +1,243 @@
+# backend/models/preprocessing_pipeline.py
+"""
+Fitted Preprocessing Pipeline
+
+The preprocessing fitted on the training data, kept as flat per-feature
+arrays: fill values (medians), clip bounds, scale parameters, plus the
+category maps of encoded columns. It ships inside every model artifact
+version, and serving applies it to the encoded feature matrix in place,
+so requests are transformed exactly like the training rows.
+"""
+
+import json
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from models.model_artifact import resolve_version_dir
+
+if TYPE_CHECKING:
+    from models.quantile_sketch import StreamingStatistics
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_FILENAME = "preprocessing.json"
+PIPELINE_VERSION = 1
+
+# Tukey fences: values beyond IQR_MULTIPLIER * IQR outside the quartiles are capped
+IQR_MULTIPLIER = 1.5
+
+
+def iqr_bounds(q1: np.ndarray, q3: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Lower and upper clip bounds from the first and third quartiles"""
+    iqr = q3 - q1
+    return q1 - IQR_MULTIPLIER * iqr, q3 + IQR_MULTIPLIER * iqr
+
+
+class PreprocessingPipeline:
+    """Fill, clip and scale a fixed-order feature matrix in one pass
+
+    Features without clipping have bounds of -inf/inf; features without
+    scaling have offset 0 and scale 1. ``category_maps`` holds the sorted
+    classes of each encoded column (code = position in the list).
+    """
+
+    def __init__(self, feature_names: Sequence[str], fill_values: Sequence[float],
+                 clip_lower: Optional[Sequence[float]] = None, clip_upper: Optional[Sequence[float]] = None,
+                 offset: Optional[Sequence[float]] = None, scale: Optional[Sequence[float]] = None,
+                 category_maps: Optional[Dict[str, List[str]]] = None):
+        self.feature_names: List[str] = list(feature_names)
+        n_features = len(self.feature_names)
+
+        def vector(values, default):
+            array = np.full(n_features, default, dtype=np.float64) if values is None else \
+                np.asarray(values, dtype=np.float64).copy()
+            if array.shape != (n_features,):
+                raise ValueError(f"Expected {n_features} values per feature, got shape {array.shape}")
+            return array
+
+        self.fill_values = vector(fill_values, 0.0)
+        self.clip_lower = vector(clip_lower, -np.inf)
+        self.clip_upper = vector(clip_upper, np.inf)
+        self.offset = vector(offset, 0.0)
+        self.scale = vector(scale, 1.0)
+        self.category_maps = {col: list(classes) for col, classes in (category_maps or {}).items()}
+
+        if np.any(self.scale == 0):
+            raise ValueError("Scale parameters must be non-zero")
+        # Skip the passes that would not change anything
+        self.clips = bool(np.isfinite(self.clip_lower).any() or np.isfinite(self.clip_upper).any())
+        self.scales = bool(np.any(self.offset != 0) or np.any(self.scale != 1))
+
+    @classmethod
+    def fit(cls, df, feature_names: Sequence[str], clip_columns: Sequence[str] = (),
+            fill_values: Optional[Dict[str, float]] = None,
+            clip_bounds: Optional[Dict[str, Tuple[float, float]]] = None,
+            scale_params: Optional[Dict[str, Tuple[float, float]]] = None,
+            category_maps: Optional[Dict[str, List[str]]] = None) -> "PreprocessingPipeline":
+        """Fit on a training frame
+
+        Medians and the IQR clip bounds of ``clip_columns`` come from one
+        quantile pass. Statistics already fitted elsewhere (e.g. by
+        DataPreprocessor.clean_data) are passed in and take precedence;
+        features missing from ``df`` fill with 0.
+        """
+        feature_names = list(feature_names)
+        fill_values = dict(fill_values or {})
+        clip_bounds = dict(clip_bounds or {})
+        to_fit = [col for col in feature_names if col in df.columns and
+                  (col not in fill_values or (col in clip_columns and col not in clip_bounds))]
+
+        if to_fit:
+            values = df[to_fit].to_numpy(dtype=np.float64)
+            with np.errstate(all='ignore'):
+                q1, median, q3 = np.nanquantile(values, [0.25, 0.5, 0.75], axis=0)
+            lower, upper = iqr_bounds(q1, q3)
+            for i, col in enumerate(to_fit):
+                fill_values.setdefault(col, median[i])
+                if col in clip_columns:
+                    clip_bounds.setdefault(col, (lower[i], upper[i]))
+
+        scale_params = scale_params or {}
+        return cls(
+            feature_names,
+            [_finite(fill_values.get(col, 0.0)) for col in feature_names],
+            [clip_bounds.get(col, (-np.inf, np.inf))[0] for col in feature_names],
+            [clip_bounds.get(col, (-np.inf, np.inf))[1] for col in feature_names],
+            [scale_params.get(col, (0.0, 1.0))[0] for col in feature_names],
+            [scale_params.get(col, (0.0, 1.0))[1] for col in feature_names],
+            category_maps
+        )
+
+    @classmethod
+    def from_statistics(cls, stats: "StreamingStatistics", feature_names: Sequence[str],
+                        clip_columns: Sequence[str] = ()) -> "PreprocessingPipeline":
+        """Fit from mergeable streaming statistics instead of a frame
+
+        Medians and IQR clip bounds come from the quantile sketches, so the
+        statistics can be gathered out of core or merged from client shards.
+        """
+        quartiles = stats.quantiles([0.25, 0.5, 0.75], feature_names)
+        fill_values, clip_lower, clip_upper = [], [], []
+        for col in feature_names:
+            q1, median, q3 = quartiles.get(col, (np.nan, np.nan, np.nan))
+            fill_values.append(_finite(median))
+            lower, upper = iqr_bounds(q1, q3) if col in clip_columns and col in quartiles else (-np.inf, np.inf)
+            clip_lower.append(lower)
+            clip_upper.append(upper)
+        return cls(feature_names, fill_values, clip_lower, clip_upper)
+
+    @property
+    def n_features(self) -> int:
+        return len(self.feature_names)
+
+    def apply(self, matrix: np.ndarray) -> np.ndarray:
+        """Transform an (n_rows, n_features) float64 matrix in place and return it
+
+        Missing values (NaN) become the fill values, then values are clipped
+        and scaled.
+        """
+        np.copyto(matrix, self.fill_values, where=np.isnan(matrix))
+        if self.clips:
+            # The raw ufuncs; np.clip's dispatch costs more than the work on a single row
+            np.maximum(matrix, self.clip_lower, out=matrix)
+            np.minimum(matrix, self.clip_upper, out=matrix)
+        if self.scales:
+            matrix -= self.offset
+            matrix /= self.scale
+        return matrix
+
+    def encode_categories(self, df):
+        """Replace mapped categorical columns with their codes
+
+        Unseen values get 0 (the first class); missing values stay NaN, so
+        ``apply`` fills them with the column's fill value.
+        """
+        import pandas as pd
+
+        encoded = df.copy()
+        for col, classes in self.category_maps.items():
+            if col in encoded.columns:
+                values = encoded[col]
+                codes = pd.Categorical(values.astype(str), categories=classes).codes.astype(np.float64)
+                codes[codes < 0] = 0
+                codes[values.isna().to_numpy()] = np.nan
+                encoded[col] = codes
+        return encoded
+
+    def transform_frame(self, df):
+        """Pipeline applied to a DataFrame: returns the features in pipeline order"""
+        import pandas as pd
+
+        if self.category_maps:
+            df = self.encode_categories(df)
+        matrix = np.full((len(df), self.n_features), np.nan)
+        for i, col in enumerate(self.feature_names):
+            if col in df.columns:
+                matrix[:, i] = df[col].to_numpy(dtype=np.float64)
+        return pd.DataFrame(self.apply(matrix), columns=self.feature_names, index=df.index)
+
+    def to_dict(self) -> Dict[str, Any]:
+        def floats(array):
+            # JSON has no infinity; unbounded clip limits are stored as null
+            return [float(x) if np.isfinite(x) else None for x in array]
+
+        return {
+            'version': PIPELINE_VERSION,
+            'feature_names': self.feature_names,
+            'fill_values': self.fill_values.tolist(),
+            'clip_lower': floats(self.clip_lower),
+            'clip_upper': floats(self.clip_upper),
+            'offset': self.offset.tolist(),
+            'scale': self.scale.tolist(),
+            'category_maps': self.category_maps
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PreprocessingPipeline":
+        if data.get('version') != PIPELINE_VERSION:
+            raise ValueError(f"Unsupported preprocessing pipeline version: {data.get('version')}")
+        return cls(
+            data['feature_names'],
+            data['fill_values'],
+            [-np.inf if x is None else x for x in data['clip_lower']],
+            [np.inf if x is None else x for x in data['clip_upper']],
+            data['offset'],
+            data['scale'],
+            data.get('category_maps')
+        )
+
+    def save(self, path: Path) -> Path:
+        """Write the pipeline as JSON"""
+        path = Path(path)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        logger.info(f"Preprocessing pipeline saved to {path}")
+        return path
+
+    @classmethod
+    def load(cls, path: Path) -> "PreprocessingPipeline":
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def for_artifact(cls, artifact_path: Path) -> Optional["PreprocessingPipeline"]:
+        """Load the pipeline shipped inside an artifact version or saved next to the artifact, if any"""
+        artifact_path = Path(artifact_path)
+        pipeline_path = artifact_path.parent / PIPELINE_FILENAME
+        if artifact_path.is_dir():
+            try:
+                pipeline_path = resolve_version_dir(artifact_path) / PIPELINE_FILENAME
+            except FileNotFoundError:
+                pass
+        if pipeline_path.exists():
+            logger.info(f"Preprocessing pipeline loaded from {pipeline_path}")
+            return cls.load(pipeline_path)
+        return None
+
+
+def _finite(value: float) -> float:
+    # All-missing training columns have a NaN median; fill those with 0
+    return float(value) if np.isfinite(value) else 0.0
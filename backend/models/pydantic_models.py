@@ -213,6 +213,9 @@ class HealthCheckResponse(BaseModel):
     status: str = Field(..., description="Service status")
     timestamp: datetime = Field(default_factory=datetime.now)
     version: str = Field(..., description="API version")
+    live: bool = Field(True, description="Process is up and serving HTTP")
+    ready: bool = Field(True, description="Models are loaded and warmed up")
+    components: Dict[str, Dict[str, Any]] = Field(default_factory=dict, description="Per-component startup status")
 
 class ErrorResponse(BaseModel):
     """Error response model"""
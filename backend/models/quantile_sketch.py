@@ -0,0 +1,218 @@
+# backend/models/quantile_sketch.py
+"""
+Mergeable Quantile Sketches
+
+KLL sketches summarize a numeric stream in bounded memory: items are kept
+in levels of sorted compactors, where an item at level h stands for 2^h
+input values, and a full level promotes every other item (random offset)
+to the level above. Quantile estimates have a rank error of about 1.7/k
+with high probability, whatever the stream length.
+
+Sketches of different shards merge by concatenating their levels, so
+clients can summarize their own data and a server can combine the
+summaries without seeing any rows. ``StreamingStatistics`` keeps one
+sketch per numeric column plus category counts, and is what out-of-core
+and federated preprocessing fit their medians and IQR bounds from.
+"""
+
+import math
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Size of the top compactor; rank error ~1.7/k (k=200: ~0.85% of rows)
+DEFAULT_SKETCH_K = 200
+
+# Lower compactors shrink geometrically by this factor
+_CAPACITY_DECAY = 2.0 / 3.0
+
+
+class KLLSketch:
+    """KLL quantile sketch over float64 values; NaN is ignored"""
+
+    def __init__(self, k: int = DEFAULT_SKETCH_K, seed: Optional[int] = None):
+        if k < 8:
+            raise ValueError("Sketch size k must be at least 8")
+        self.k = k
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * _CAPACITY_DECAY ** depth)))
+
+    def update(self, values) -> "KLLSketch":
+        """Add a batch of values"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.n += len(values)
+            self.min = min(self.min, float(values.min()))
+            self.max = max(self.max, float(values.max()))
+            self.levels[0] = np.concatenate([self.levels[0], values])
+            self._compress()
+        return self
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item stays behind, so total weight is conserved exactly
+                kept, items = (items[-1:], items[:-1]) if len(items) % 2 else (items[:0], items)
+                promoted = items[self._rng.integers(2)::2]
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                self.levels[level] = kept
+            level += 1
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """Fold another sketch (e.g. of another shard) into this one"""
+        if other.n == 0:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def quantiles(self, qs: Sequence[float]) -> np.ndarray:
+        """Estimated quantiles (NaN for an empty sketch)"""
+        qs = np.asarray(qs, dtype=np.float64)
+        if self.n == 0:
+            return np.full(qs.shape, np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items, cumulative = items[order], np.cumsum(weights[order])
+        index = np.searchsorted(cumulative, qs * cumulative[-1], side='left')
+        estimates = items[np.minimum(index, len(items) - 1)]
+        # The extremes are tracked exactly
+        estimates[qs <= 0] = self.min
+        estimates[qs >= 1] = self.max
+        return estimates
+
+    def quantile(self, q: float) -> float:
+        return float(self.quantiles([q])[0])
+
+    @property
+    def size(self) -> int:
+        """Items retained (memory is 8 bytes per item)"""
+        return sum(len(level) for level in self.levels)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'k': self.k,
+            'n': self.n,
+            'min': self.min if self.n else None,
+            'max': self.max if self.n else None,
+            'levels': [level.tolist() for level in self.levels],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], seed: Optional[int] = None) -> "KLLSketch":
+        sketch = cls(data['k'], seed)
+        sketch.n = data['n']
+        if sketch.n:
+            sketch.min, sketch.max = data['min'], data['max']
+        sketch.levels = [np.asarray(level, dtype=np.float64) for level in data['levels']] or [np.empty(0)]
+        return sketch
+
+
+class StreamingStatistics:
+    """Mergeable per-column statistics of a stream of DataFrame chunks
+
+    Numeric columns get a KLL sketch (medians, quartiles), object columns
+    a value counter (modes). Each client or shard builds its own and the
+    results are merged.
+    """
+
+    def __init__(self, k: int = DEFAULT_SKETCH_K, seed: Optional[int] = 0):
+        self.k = k
+        self.seed = seed
+        self.rows = 0
+        self.sketches: Dict[str, KLLSketch] = {}
+        self.categories: Dict[str, Counter] = {}
+
+    def _sketch(self, column: str) -> KLLSketch:
+        if column not in self.sketches:
+            seed = None if self.seed is None else self.seed + len(self.sketches)
+            self.sketches[column] = KLLSketch(self.k, seed)
+        return self.sketches[column]
+
+    def update(self, chunk) -> "StreamingStatistics":
+        """Add a DataFrame chunk"""
+        self.rows += len(chunk)
+        numeric = chunk.select_dtypes(include=[np.number])
+        values = numeric.to_numpy(dtype=np.float64)
+        for i, column in enumerate(numeric.columns):
+            self._sketch(column).update(values[:, i])
+        for column in chunk.select_dtypes(include=['object']).columns:
+            self.categories.setdefault(column, Counter()).update(chunk[column].dropna().value_counts().to_dict())
+        return self
+
+    def merge(self, other: "StreamingStatistics") -> "StreamingStatistics":
+        """Fold another shard's statistics into these"""
+        self.rows += other.rows
+        for column, sketch in other.sketches.items():
+            self._sketch(column).merge(sketch)
+        for column, counts in other.categories.items():
+            self.categories.setdefault(column, Counter()).update(counts)
+        return self
+
+    @classmethod
+    def merged(cls, shards: Sequence["StreamingStatistics"]) -> "StreamingStatistics":
+        """Statistics of the union of several shards"""
+        total = cls(shards[0].k if shards else DEFAULT_SKETCH_K)
+        for shard in shards:
+            total.merge(shard)
+        return total
+
+    def quantiles(self, qs: Sequence[float], columns: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+        """Estimated quantiles per numeric column"""
+        columns = list(self.sketches) if columns is None else columns
+        return {column: self.sketches[column].quantiles(qs) for column in columns if column in self.sketches}
+
+    def medians(self) -> Dict[str, float]:
+        """Running medians of the numeric columns"""
+        return {column: float(q[0]) for column, q in self.quantiles([0.5]).items()}
+
+    def modes(self) -> Dict[str, Any]:
+        """Most frequent value per object column (the smallest on ties, like Series.mode)"""
+        modes = {}
+        for column, counts in self.categories.items():
+            if counts:
+                top = max(counts.values())
+                modes[column] = min(value for value, count in counts.items() if count == top)
+        return modes
+
+    @property
+    def size(self) -> int:
+        """Sketch items retained across all columns"""
+        return sum(sketch.size for sketch in self.sketches.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'k': self.k,
+            'rows': self.rows,
+            'sketches': {column: sketch.to_dict() for column, sketch in self.sketches.items()},
+            'categories': {column: dict(counts) for column, counts in self.categories.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StreamingStatistics":
+        stats = cls(data['k'])
+        stats.rows = data['rows']
+        stats.sketches = {column: KLLSketch.from_dict(sketch) for column, sketch in data['sketches'].items()}
+        stats.categories = {column: Counter(counts) for column, counts in data['categories'].items()}
+        return stats
@@ -0,0 +1,341 @@
+# backend/models/tree_ensemble.py
+"""
+Flattened Tree Ensemble
+
+Compact NumPy form of a trained LightGBM booster for serving: every tree's
+nodes are stored in flat arrays (split feature, threshold, children, leaf
+values, covers) and evaluated with vectorized NumPy, so the request path
+needs neither sklearn nor the LightGBM runtime.
+
+Layout: nodes of all trees are concatenated, each tree in preorder
+(root first, left subtree before right subtree), with ``tree_offsets[t]``
+the index of tree t's root. Leaves have ``feature == -1`` and children -1.
+Ensembles are stored as versioned, memory-mapped model artifacts, and each
+version is opened once per process (``TreeEnsemble.shared``). Artifacts
+also hold the evaluator's compiled split arrays, so loading a version
+memory-maps those too instead of recomputing them.
+"""
+
+import numpy as np
+from pathlib import Path
+import logging
+import threading
+import weakref
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+from models.model_artifact import ArtifactError, read_artifact, resolve_version_dir, write_artifact
+
+logger = logging.getLogger(__name__)
+
+TREE_ENSEMBLE_KIND = "tree_ensemble"
+TREE_ENSEMBLE_VERSION = 1
+
+# LightGBM missing-value handling per split
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+MISSING_TYPES = {'None': MISSING_NONE, 'Zero': MISSING_ZERO, 'NaN': MISSING_NAN}
+
+# LightGBM treats |x| <= kZeroThreshold as zero for "Zero" missing splits
+ZERO_THRESHOLD = 1e-35
+
+# Leaf bitvectors are uint64, so trees may have at most 64 leaves
+MAX_LEAVES = 64
+
+# Rows evaluated per block; keeps the (n_splits, n_rows) temporaries cache-sized
+EVAL_BLOCK_ROWS = 64
+
+# 2 is a primitive root mod 67, so 2**k % 67 is distinct for k < 64
+_LOWEST_BIT_INDEX = np.zeros(67, dtype=np.intp)
+_LOWEST_BIT_INDEX[[pow(2, k, 67) for k in range(MAX_LEAVES)]] = np.arange(MAX_LEAVES)
+
+# Ensembles open in this process by version directory, so the prediction and explanation
+# services share one copy of the compiled arrays; entries go once no service holds them
+_shared_ensembles = weakref.WeakValueDictionary()
+_shared_lock = threading.Lock()
+
+_NODE_ARRAYS = {
+    'feature': np.int32,
+    'threshold': np.float64,
+    'left': np.int32,
+    'right': np.int32,
+    'default_left': np.bool_,
+    'missing_type': np.int8,
+    'value': np.float64,
+    'cover': np.float64,
+}
+
+# Evaluator arrays built by _compile, by artifact name and attribute; split-major,
+# stored flat and used as (n_splits, 1) columns where they broadcast against rows
+_COMPILED_ARRAYS = {
+    'split_nodes': ('split_nodes', np.intp),
+    'split_feature': ('_split_feature', np.intp),
+    'split_threshold': ('_split_threshold', np.float64),
+    'split_left_bits': ('_split_left_bits', np.uint64),
+    'split_missing_type': ('_split_missing_type', np.int8),
+    'split_default_right': ('_split_default_right', np.bool_),
+    'split_tree_starts': ('_split_tree_starts', np.intp),
+    'split_tree_leaf_offsets': ('_split_tree_leaf_offsets', np.intp),
+    'leaf_values': ('_leaf_values', np.float64),
+}
+_COMPILED_COLUMNS = {'split_threshold', 'split_left_bits', 'split_missing_type', 'split_default_right',
+                     'split_tree_leaf_offsets'}
+
+
+class TreeEnsemble:
+    """Binary-classification tree ensemble over flat node arrays"""
+
+    def __init__(self, feature_names: Sequence[str], tree_offsets: np.ndarray,
+                 nodes: Dict[str, np.ndarray], sigmoid: float = 1.0, compiled: Optional[Dict[str, Any]] = None):
+        self.feature_names = list(feature_names)
+        self.n_features = len(self.feature_names)
+        self.tree_offsets = np.asarray(tree_offsets, dtype=np.int64)
+        self.sigmoid = float(sigmoid)
+        self.artifact_version = None
+        # np.asarray keeps memory-mapped node arrays as zero-copy views
+        for name, dtype in _NODE_ARRAYS.items():
+            setattr(self, name, np.asarray(nodes[name], dtype=dtype))
+        # Compiled arrays saved with an artifact are used as loaded; anything else is compiled here
+        self._set_compiled(self._compile() if compiled is None else compiled)
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.tree_offsets)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    @property
+    def is_leaf(self) -> np.ndarray:
+        return self.feature < 0
+
+    # ------------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def from_booster(cls, booster) -> "TreeEnsemble":
+        """Flatten a trained LightGBM Booster (or LGBMClassifier)"""
+        booster = getattr(booster, 'booster_', booster)
+        return cls.from_dump(booster.dump_model())
+
+    @classmethod
+    def from_dump(cls, model_dump: Dict[str, Any]) -> "TreeEnsemble":
+        """Flatten the dict returned by ``Booster.dump_model()``"""
+        objective = model_dump.get('objective', '').split()
+        if not objective or objective[0] != 'binary' or model_dump.get('num_tree_per_iteration', 1) != 1:
+            raise ValueError(f"Only binary objectives can be flattened, got {model_dump.get('objective')!r}")
+        sigmoid = 1.0
+        for option in objective[1:]:
+            if option.startswith('sigmoid:'):
+                sigmoid = float(option.split(':', 1)[1])
+
+        nodes: Dict[str, List] = {name: [] for name in _NODE_ARRAYS}
+        tree_offsets = []
+
+        def add_node(node: Dict[str, Any]) -> int:
+            index = len(nodes['feature'])
+            if 'leaf_value' in node:
+                for name, value in (('feature', -1), ('threshold', 0.0), ('left', -1), ('right', -1),
+                                    ('default_left', True), ('missing_type', MISSING_NONE),
+                                    ('value', node['leaf_value']), ('cover', node.get('leaf_count', 0))):
+                    nodes[name].append(value)
+                return index
+
+            if node.get('decision_type', '<=') != '<=':
+                raise ValueError(f"Unsupported split type {node['decision_type']!r} (categorical splits)")
+            for name, value in (('feature', node['split_feature']), ('threshold', node['threshold']),
+                                ('left', -1), ('right', -1), ('default_left', node['default_left']),
+                                ('missing_type', MISSING_TYPES[node['missing_type']]),
+                                ('value', node.get('internal_value', 0.0)),
+                                ('cover', node.get('internal_count', 0))):
+                nodes[name].append(value)
+            nodes['left'][index] = add_node(node['left_child'])
+            nodes['right'][index] = add_node(node['right_child'])
+            return index
+
+        for tree in model_dump['tree_info']:
+            if tree.get('num_leaves', 0) > MAX_LEAVES:
+                raise ValueError(f"Trees with more than {MAX_LEAVES} leaves are not supported")
+            tree_offsets.append(len(nodes['feature']))
+            add_node(tree['tree_structure'])
+
+        return cls(model_dump['feature_names'], np.array(tree_offsets), nodes, sigmoid)
+
+    def save(self, root: Path, documents: Dict[str, Any] = None, make_latest: bool = True) -> Path:
+        """Write the ensemble as a new artifact version under root; returns the version directory"""
+        compiled = {name: getattr(self, attr).ravel() for name, (attr, _) in _COMPILED_ARRAYS.items()}
+        return write_artifact(
+            root,
+            TREE_ENSEMBLE_KIND,
+            {'tree_offsets': self.tree_offsets, **{name: getattr(self, name) for name in _NODE_ARRAYS}, **compiled},
+            {
+                'layout_version': TREE_ENSEMBLE_VERSION,
+                'feature_names': self.feature_names,
+                'sigmoid': self.sigmoid,
+                'n_trees': self.n_trees,
+                'n_nodes': self.n_nodes,
+                'bias': self._bias,
+            },
+            documents=documents,
+            make_latest=make_latest
+        )
+
+    @classmethod
+    def load(cls, path: Path, verify: bool = False) -> "TreeEnsemble":
+        """Open an artifact version (or an artifact root's LATEST)
+
+        Node and compiled arrays stay memory-mapped; versions written before
+        the compiled arrays were saved are compiled on load.
+        """
+        manifest, arrays = read_artifact(path, TREE_ENSEMBLE_KIND, verify=verify)
+        metadata = manifest['metadata']
+        if metadata.get('layout_version') != TREE_ENSEMBLE_VERSION:
+            raise ArtifactError(f"Unsupported tree ensemble layout {metadata.get('layout_version')}")
+        compiled = None
+        if 'bias' in metadata and all(name in arrays for name in _COMPILED_ARRAYS):
+            compiled = {'bias': metadata['bias'], **{name: arrays[name] for name in _COMPILED_ARRAYS}}
+        ensemble = cls(metadata['feature_names'], arrays['tree_offsets'],
+                       {name: arrays[name] for name in _NODE_ARRAYS}, metadata['sigmoid'], compiled)
+        ensemble.artifact_version = manifest['version']
+        return ensemble
+
+    @classmethod
+    def shared(cls, path: Path) -> "TreeEnsemble":
+        """This process' ensemble for an artifact version (or LATEST), loaded on first use
+
+        Callers must treat it as read-only: every service of the version holds
+        the same instance.
+        """
+        version_dir = resolve_version_dir(path).resolve()
+        with _shared_lock:
+            ensemble = _shared_ensembles.get(version_dir)
+            if ensemble is None:
+                ensemble = cls.load(version_dir)
+                _shared_ensembles[version_dir] = ensemble
+        return ensemble
+
+    # ------------------------------------------------------------------
+    # Evaluation
+    # ------------------------------------------------------------------
+
+    def _compile(self) -> Dict[str, Any]:
+        """Precompute the leaf bitvectors used by the evaluator (flat arrays by artifact name, and the bias)
+
+        Each tree's leaves are numbered left to right. A split that sends a
+        row right rules out every leaf of its left subtree, so ORing those
+        subtrees' bits over all splits a row takes to the right leaves the
+        exit leaf as the lowest unset bit (QuickScorer).
+        """
+        n_nodes = self.n_nodes
+        is_leaf = self.is_leaf
+        tree_of_node = np.repeat(np.arange(self.n_trees), np.diff(np.append(self.tree_offsets, n_nodes)))
+
+        # Leaves in preorder are already in left-to-right order within each tree
+        leaf_nodes = np.flatnonzero(is_leaf)
+        leaf_rank = np.zeros(n_nodes, dtype=np.int64)
+        leaf_rank[leaf_nodes] = np.arange(len(leaf_nodes))
+        leaf_offsets = np.searchsorted(leaf_nodes, self.tree_offsets)
+
+        # Leaf range [first, last] under each node, filled bottom-up
+        internal = np.flatnonzero(~is_leaf)
+        first_leaf = leaf_rank.copy()
+        last_leaf = leaf_rank.copy()
+        for node in internal[::-1]:
+            first_leaf[node] = first_leaf[self.left[node]]
+            last_leaf[node] = last_leaf[self.right[node]]
+
+        left = self.left[internal]
+        left_first = (first_leaf[left] - leaf_offsets[tree_of_node[internal]]).astype(np.uint64)
+        left_size = (last_leaf[left] - first_leaf[left] + 1).astype(np.uint64)
+
+        # Trees made of a single leaf contribute a constant
+        split_trees = np.unique(tree_of_node[internal])
+        stump_trees = np.setdiff1d(np.arange(self.n_trees), split_trees)
+
+        # Splits are numbered in node order; the evaluator works split-major, (n_splits, n_rows)
+        return {
+            'split_nodes': internal,
+            'split_feature': self.feature[internal],
+            'split_threshold': self.threshold[internal],
+            'split_left_bits': ((np.uint64(1) << left_size) - np.uint64(1)) << left_first,
+            'split_missing_type': self.missing_type[internal],
+            'split_default_right': ~self.default_left[internal],
+            'split_tree_starts': np.searchsorted(internal, self.tree_offsets[split_trees]),
+            'split_tree_leaf_offsets': leaf_offsets[split_trees],
+            'leaf_values': self.value[leaf_nodes],
+            'bias': float(self.value[self.tree_offsets[stump_trees]].sum()),
+        }
+
+    def _set_compiled(self, compiled: Dict[str, Any]):
+        # np.asarray and the column views keep memory-mapped arrays zero-copy
+        for name, (attr, dtype) in _COMPILED_ARRAYS.items():
+            array = np.asarray(compiled[name], dtype=dtype)
+            setattr(self, attr, array[:, np.newaxis] if name in _COMPILED_COLUMNS else array)
+        self._bias = float(compiled['bias'])
+        self._has_missing_splits = bool(np.any(self._split_missing_type != MISSING_NONE))
+
+    def _check_input(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got shape {X.shape}")
+        return X
+
+    def go_right(self, columns: np.ndarray, has_nan: bool) -> np.ndarray:
+        """Decision of every split for a (n_features, n_rows) block, shape (n_splits, n_rows)"""
+        values = columns.take(self._split_feature, axis=0)
+        decisions = values > self._split_threshold
+        if not has_nan and not self._has_missing_splits:
+            return decisions
+
+        nan_values = np.isnan(values)
+        # LightGBM scores NaN as 0.0 unless the split routes NaN explicitly
+        decisions |= nan_values & (0.0 > self._split_threshold)
+        if self._has_missing_splits:
+            missing = ((self._split_missing_type == MISSING_ZERO) & ((np.abs(values) <= ZERO_THRESHOLD) | nan_values)) \
+                | ((self._split_missing_type == MISSING_NAN) & nan_values)
+            decisions = np.where(missing, self._split_default_right, decisions)
+        return decisions
+
+    def _exit_leaves(self, columns: np.ndarray, has_nan: bool) -> np.ndarray:
+        """Leaf reached in each tree with splits, shape (n_split_trees, n_rows)"""
+        go_right = self.go_right(columns, has_nan)
+        ruled_out = np.bitwise_or.reduceat(self._split_left_bits * go_right, self._split_tree_starts, axis=0)
+        exit_bit = (ruled_out + np.uint64(1)) & ~ruled_out
+        return self._split_tree_leaf_offsets + _LOWEST_BIT_INDEX[exit_bit % np.uint64(67)]
+
+    def column_blocks(self, X: np.ndarray) -> List[Tuple[np.ndarray, bool]]:
+        """Split rows into (n_features, n_rows) blocks small enough to keep temporaries in cache
+
+        Each block comes with a flag telling whether the input has any NaN.
+        """
+        X = self._check_input(X)
+        has_nan = bool(np.isnan(X).any())
+        columns = X.T
+        return [(columns[:, start:start + EVAL_BLOCK_ROWS], has_nan)
+                for start in range(0, max(len(X), 1), EVAL_BLOCK_ROWS)]
+
+    def leaf_indices(self, X: np.ndarray) -> np.ndarray:
+        """Leaf (index into the flat leaf list) reached in each tree with splits, shape (n_rows, n_split_trees)"""
+        return np.concatenate([self._exit_leaves(columns, has_nan).T for columns, has_nan in self.column_blocks(X)])
+
+    def predict_raw(self, X: np.ndarray) -> np.ndarray:
+        """Raw score (log-odds) for each row"""
+        if not len(self.split_nodes):
+            # Every tree is a single leaf (e.g. federated clients with little data): a constant score
+            return np.full(len(self._check_input(X)), self._bias)
+        # Accumulate trees in order (like LightGBM) so a row scores identically in any batch size;
+        # sum() switches between pairwise and sequential order depending on the array shape
+        blocks = [self._leaf_values[self._exit_leaves(columns, has_nan)].cumsum(axis=0)[-1]
+                  for columns, has_nan in self.column_blocks(X)]
+        raw = blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
+        return raw + self._bias
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Probability of the positive class for each row"""
+        return 1.0 / (1.0 + np.exp(-self.sigmoid * self.predict_raw(X)))
+
+    def feature_importance(self) -> np.ndarray:
+        """Number of splits on each feature (LightGBM's "split" importance)"""
+        return np.bincount(self.feature[self.feature >= 0], minlength=self.n_features)
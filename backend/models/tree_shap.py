@@ -0,0 +1,241 @@
+# backend/models/tree_shap.py
+"""
+Native TreeSHAP
+
+Path-dependent TreeSHAP (the algorithm behind ``shap.TreeExplainer`` and
+LightGBM's ``pred_contrib``) evaluated directly on a TreeEnsemble, so the
+serving process does not need the ``shap`` package.
+
+Each leaf is treated as a small game over the d distinct features on its
+root-to-leaf path. For feature k on the path, z_k is the fraction of
+training rows that follow the path's splits on k (product of cover
+ratios) and o_k is 1 when the explained row follows them. Writing the
+Shapley weights s! (d-1-s)! / d! as Beta integrals, feature j gets
+
+    leaf_value * (o_j - z_j) * integral_0^1 prod_{k != j} (z_k + (o_k - z_k) t) dt
+
+The integrand is a polynomial of degree d - 1, so Gauss-Legendre
+quadrature with ceil(d / 2) nodes is exact (as in Linear TreeSHAP).
+Leaves are grouped by padded path length and each group is a few array
+operations, vectorized over leaves, quadrature nodes and rows.
+"""
+
+import numpy as np
+import logging
+import math
+import threading
+from typing import Dict, List, Sequence
+
+from models.tree_ensemble import TreeEnsemble, MISSING_NONE
+
+logger = logging.getLogger(__name__)
+
+# Paths are padded up to one of these lengths with null features (z = o = 1),
+# which leaves every Shapley value unchanged; fewer groups means fewer array ops
+PATH_LENGTH_BUCKETS = (2, 4, 6, 8, 12, 16, 24, 32, 48, 64)
+
+
+def quadrature(length: int):
+    """Gauss-Legendre nodes and weights on [0, 1], exact for degree < length"""
+    nodes, weights = np.polynomial.legendre.leggauss(max(1, (length + 1) // 2))
+    return (nodes + 1.0) / 2.0, weights / 2.0
+
+
+class _Workspace:
+    """Per-thread scratch arrays, reused across calls
+
+    TreeSHAP temporaries are several MB per block; allocating them fresh on
+    every call costs more in page faults than the arithmetic itself.
+    """
+
+    def __init__(self):
+        self._buffers: Dict[tuple, np.ndarray] = {}
+
+    def get(self, key: tuple, shape: tuple, dtype=np.float64) -> np.ndarray:
+        size = math.prod(shape)
+        buffer = self._buffers.get(key)
+        if buffer is None or buffer.size < size:
+            buffer = self._buffers[key] = np.empty(size, dtype=dtype)
+        return buffer[:size].reshape(shape)
+
+
+class _PathGroup:
+    """Leaves whose paths are padded to the same number of features"""
+
+    def __init__(self, length: int, leaf_values: List[float], slot_features: List[List[int]],
+                 slot_z: List[List[float]], slot_index: List[List[int]]):
+        self.length = length
+        self.n_leaves = len(leaf_values)
+        # Slot arrays are (length, n_leaves): slot k of every leaf is one row
+        z = np.array(slot_z).T
+        self.slot_index = np.array(slot_index).T
+        self.slot_z = z[..., np.newaxis]
+        self.leaf_values = np.array(leaf_values)[:, np.newaxis]
+
+        # The integrand factor is z (1 - t) + o t at each quadrature node t, (length, n_nodes, n_leaves, 1)
+        t, self.quadrature_weights = quadrature(length)
+        self.n_nodes = len(t)
+        self.nodes = t[:, np.newaxis, np.newaxis]
+        self.factor_not_followed = (z[:, np.newaxis] * (1.0 - t)[:, np.newaxis])[..., np.newaxis]
+
+        # Real (slot, leaf) entries sorted by feature, so each feature's sum is one contiguous segment
+        features = np.array(slot_features).T.ravel()
+        self.slot_order = np.flatnonzero(features >= 0)
+        self.slot_order = self.slot_order[np.argsort(features[self.slot_order], kind='stable')]
+        self.segment_features, self.segment_starts = np.unique(features[self.slot_order], return_index=True)
+
+    def add_contributions(self, follows_by_slot: np.ndarray, shap_values: np.ndarray, workspace: _Workspace):
+        """Add this group's SHAP values into shap_values, shape (n_rows, n_features)"""
+        d, m, n_leaves, n_rows = self.length, self.n_nodes, self.n_leaves, follows_by_slot.shape[1]
+        key = self.length
+        follows = np.take(follows_by_slot, self.slot_index, axis=0,
+                          out=workspace.get((key, 'follows'), (d, n_leaves, n_rows), bool))
+        factors = workspace.get((key, 'factors'), (d, m, n_leaves, n_rows))
+        np.multiply(follows[:, np.newaxis], self.nodes, out=factors)
+        factors += self.factor_not_followed
+
+        # Weighted product over all path features, then divide out feature j (factors are > 0 inside (0, 1))
+        products = np.multiply(factors[0], self.quadrature_weights[:, np.newaxis, np.newaxis],
+                               out=workspace.get((key, 'products'), (m, n_leaves, n_rows)))
+        for k in range(1, d):
+            products *= factors[k]
+        ratios = np.divide(products, factors, out=factors)
+        integrals = workspace.get((key, 'integrals'), (d, n_leaves, n_rows))
+        np.copyto(integrals, ratios[:, 0])
+        for i in range(1, m):
+            integrals += ratios[:, i]
+
+        # leaf_value * (o_j - z_j) * integral
+        per_slot = np.subtract(follows, self.slot_z, out=workspace.get((key, 'per_slot'), (d, n_leaves, n_rows)))
+        per_slot *= self.leaf_values
+        per_slot *= integrals
+
+        # Reduce each row over its own contiguous slots: the summation order then doesn't
+        # depend on the batch size, so a row explains identically alone or in a batch
+        by_feature = np.ascontiguousarray(per_slot.reshape(-1, n_rows).take(self.slot_order, axis=0).T)
+        shap_values[:, self.segment_features] += np.add.reduceat(by_feature, self.segment_starts, axis=1)
+
+
+class TreeShapExplainer:
+    """Exact path-dependent SHAP values (log-odds) for a TreeEnsemble"""
+
+    def __init__(self, ensemble: TreeEnsemble, length_buckets: Sequence[int] = PATH_LENGTH_BUCKETS):
+        self.ensemble = ensemble
+        self.feature_names = ensemble.feature_names
+        self._local = threading.local()
+        self._compile(sorted(length_buckets))
+
+    def _compile(self, length_buckets: List[int]):
+        ensemble = self.ensemble
+        split_position = np.full(ensemble.n_nodes, -1, dtype=np.intp)
+        split_position[ensemble.split_nodes] = np.arange(len(ensemble.split_nodes))
+
+        # Path edges (split, direction) stored slot by slot; a slot is one feature of one leaf's path
+        edge_split: List[int] = []
+        edge_right: List[bool] = []
+        slot_starts: List[int] = []
+        # Without missing-value routing, a slot's splits reduce to lo < x <= hi on its feature
+        slot_feature: List[int] = []
+        slot_bounds: List[tuple] = []
+        groups = {}
+        expected_value = 0.0
+
+        for root in ensemble.tree_offsets.tolist():
+            stack = [(root, [])]
+            while stack:
+                node, path = stack.pop()
+                if ensemble.feature[node] >= 0:
+                    for child, right in ((ensemble.left[node], False), (ensemble.right[node], True)):
+                        ratio = ensemble.cover[child] / ensemble.cover[node]
+                        stack.append((child, path + [(int(ensemble.feature[node]), node, right, ratio)]))
+                    continue
+
+                leaf_value = float(ensemble.value[node])
+                expected_value += leaf_value * float(np.prod([ratio for *_, ratio in path]))
+                if not path:
+                    continue
+
+                features = list(dict.fromkeys(feature for feature, *_ in path))
+                length = next((b for b in length_buckets if b >= len(features)), len(features))
+                slot_z, slot_index = [], []
+                for feature in features:
+                    slot_index.append(len(slot_starts))
+                    slot_starts.append(len(edge_split))
+                    slot_feature.append(feature)
+                    z, lo, hi = 1.0, -np.inf, np.inf
+                    for edge_feature, split_node, right, ratio in path:
+                        if edge_feature == feature:
+                            edge_split.append(split_position[split_node])
+                            edge_right.append(right)
+                            z *= ratio
+                            if right:
+                                lo = max(lo, ensemble.threshold[split_node])
+                            else:
+                                hi = min(hi, ensemble.threshold[split_node])
+                    slot_z.append(z)
+                    slot_bounds.append((lo, hi))
+
+                padding = length - len(features)
+                group = groups.setdefault(length, ([], [], [], []))
+                group[0].append(leaf_value)
+                group[1].append(features + [-1] * padding)
+                group[2].append(slot_z + [1.0] * padding)
+                # Padding slots read the always-followed row appended after the real slots
+                group[3].append(slot_index + [-1] * padding)
+
+        self.expected_value = expected_value
+        self._edge_split = np.array(edge_split, dtype=np.intp)
+        self._edge_right = np.array(edge_right, dtype=bool)[:, np.newaxis]
+        self._slot_starts = np.array(slot_starts, dtype=np.intp)
+        self._slot_feature = np.array(slot_feature, dtype=np.intp)
+        self._slot_lower = np.array([lo for lo, _ in slot_bounds])[:, np.newaxis]
+        self._slot_upper = np.array([hi for _, hi in slot_bounds])[:, np.newaxis]
+        self._use_intervals = not np.any(ensemble.missing_type[ensemble.split_nodes] != MISSING_NONE)
+        self._groups = []
+        for length in sorted(groups):
+            leaf_values, slot_features, slot_z, slot_index = groups[length]
+            slot_index = [[len(slot_starts) if i < 0 else i for i in slots] for slots in slot_index]
+            self._groups.append(_PathGroup(length, leaf_values, slot_features, slot_z, slot_index))
+        logger.debug(f"TreeSHAP compiled: {len(slot_starts)} path slots in {len(self._groups)} groups")
+
+    def _workspace(self) -> _Workspace:
+        workspace = getattr(self._local, "workspace", None)
+        if workspace is None:
+            workspace = self._local.workspace = _Workspace()
+        return workspace
+
+    def _follows_by_slot(self, columns: np.ndarray, has_nan: bool, workspace: _Workspace) -> np.ndarray:
+        """Whether each row takes every split of each path slot, (n_slots + 1, n_rows)
+
+        The extra last row is always True and backs the padding slots.
+        """
+        n_slots, n_rows = len(self._slot_starts), columns.shape[1]
+        follows = workspace.get(('slots', 'follows'), (n_slots + 1, n_rows), bool)
+        follows[-1] = True
+        if self._use_intervals:
+            if has_nan:
+                # Splits without missing-value routing score NaN as 0.0
+                columns = np.where(np.isnan(columns), 0.0, columns)
+            values = np.take(columns, self._slot_feature, axis=0,
+                             out=workspace.get(('slots', 'values'), (n_slots, n_rows)))
+            above = np.greater(values, self._slot_lower, out=workspace.get(('slots', 'above'), (n_slots, n_rows), bool))
+            np.less_equal(values, self._slot_upper, out=follows[:-1])
+            follows[:-1] &= above
+        else:
+            edge_taken = self.ensemble.go_right(columns, has_nan).take(self._edge_split, axis=0) == self._edge_right
+            np.logical_and.reduceat(edge_taken, self._slot_starts, axis=0, out=follows[:-1])
+        return follows
+
+    def _block_shap_values(self, columns: np.ndarray, has_nan: bool) -> np.ndarray:
+        workspace = self._workspace()
+        follows_by_slot = self._follows_by_slot(columns, has_nan, workspace)
+        shap_values = np.zeros((columns.shape[1], self.ensemble.n_features))
+        for group in self._groups:
+            group.add_contributions(follows_by_slot, shap_values, workspace)
+        return shap_values
+
+    def shap_values(self, X: np.ndarray) -> np.ndarray:
+        """SHAP matrix (rows x features); each row sums to predict_raw minus expected_value"""
+        blocks = [self._block_shap_values(columns, has_nan)
+                  for columns, has_nan in self.ensemble.column_blocks(X)]
+        return blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
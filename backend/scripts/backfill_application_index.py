@@ -0,0 +1,32 @@
+# backend/scripts/backfill_application_index.py
+"""
+Application Index Backfill Script
+
+Writes an applications_index/{application_id} pointer for every
+application stored before the index existed, so /explain lookups no
+longer need to fall back to a collection-group query.
+"""
+
+import logging
+import sys
+from pathlib import Path
+
+# Add backend to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.firebase_service import FirebaseService
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Main execution function"""
+    firebase_service = FirebaseService()
+    written = firebase_service.backfill_application_index()
+    logger.info(f"Backfill complete: {written} application index entries written")
+
+
+if __name__ == "__main__":
+    main()
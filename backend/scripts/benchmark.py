@@ -0,0 +1,607 @@
+# backend/scripts/benchmark.py
+"""
+Serving and Training Microbenchmarks
+
+Run from the backend directory, e.g.:
+    python scripts/benchmark.py feature_layout
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, Any, List
+
+import pandas as pd
+
+# Add backend to path for imports
+backend_path = Path(__file__).parent.parent
+sys.path.append(str(backend_path))
+
+SAMPLE_DATA_PATH = backend_path / "data" / "processed_data.csv"
+
+
+def load_sample_requests(n: int) -> List[Dict[str, Any]]:
+    """Load n request dicts from the sample dataset (repeating rows as needed)"""
+    df = pd.read_csv(SAMPLE_DATA_PATH)
+    records = df.to_dict(orient="records")
+    return [records[i % len(records)] for i in range(n)]
+
+
+def time_call(fn: Callable[[], Any], repeats: int) -> Dict[str, float]:
+    """Time repeated calls of fn and return latency stats in microseconds"""
+    fn()  # warm-up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    return {
+        "mean_us": statistics.fmean(timings),
+        "p50_us": timings[len(timings) // 2],
+        "p99_us": timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+    }
+
+
+def print_results(title: str, results: Dict[str, Dict[str, float]]):
+    """Print a small latency table"""
+    print(f"\n{title}")
+    print("-" * 64)
+    for name, stats in results.items():
+        print(f"{name:<32} mean {stats['mean_us']:>10.1f}us  p50 {stats['p50_us']:>10.1f}us  p99 {stats['p99_us']:>10.1f}us")
+
+
+def bench_feature_layout(args):
+    """Single-row feature assembly: DataFrame path vs compiled FeatureLayout"""
+    from services.prediction_service import PredictionService
+
+    import joblib
+
+    model_path = backend_path / "trained_models" / "global_credit_model.pkl"
+    service = PredictionService(str(model_path))
+    sklearn_model = joblib.load(model_path)
+    request = load_sample_requests(1)[0]
+
+    def dataframe_path():
+        df = service.prepare_input_data(request)
+        sklearn_model.predict_proba(df)
+        sklearn_model.predict(df)
+
+    results = {
+        "prepare_input_data (pandas)": time_call(lambda: service.prepare_input_data(request), args.repeats),
+        "FeatureLayout.fill_row": time_call(lambda: service.feature_layout.fill_row(request), args.repeats),
+        "end-to-end DataFrame + sklearn": time_call(dataframe_path, args.repeats),
+        "end-to-end predict()": time_call(lambda: service.predict(request), args.repeats),
+    }
+    print_results("Single-row feature assembly", results)
+
+
+def bench_predict_batch(args):
+    """Batch scoring throughput: per-row predict loop vs vectorized predict_batch"""
+    from services.prediction_service import PredictionService
+
+    service = PredictionService(str(backend_path / "trained_models" / "global_credit_model.pkl"))
+    requests = load_sample_requests(args.rows)
+
+    results = {
+        f"predict loop ({args.rows} rows)": time_call(lambda: [service.predict(r) for r in requests], 3),
+        f"predict_batch ({args.rows} rows)": time_call(lambda: service.predict_batch(requests), 3),
+    }
+    print_results("Batch scoring", results)
+
+
+def bench_tree_ensemble(args):
+    """Model evaluation: sklearn wrapper and LightGBM booster vs the flattened TreeEnsemble"""
+    import joblib
+    from models.tree_ensemble import TreeEnsemble
+
+    model_path = backend_path / "trained_models" / "global_credit_model.pkl"
+    sklearn_model = joblib.load(model_path)
+    booster = sklearn_model.booster_
+    ensemble = TreeEnsemble.load(backend_path / "trained_models" / "artifacts")
+
+    frame = pd.DataFrame(load_sample_requests(args.rows))[ensemble.feature_names]
+    matrix = frame.to_numpy(dtype="float64")
+    row, row_frame = matrix[:1], frame.head(1)
+
+    results = {
+        "1 row  LGBMClassifier.predict_proba": time_call(lambda: sklearn_model.predict_proba(row_frame), args.repeats),
+        "1 row  Booster.predict": time_call(lambda: booster.predict(row), args.repeats),
+        "1 row  TreeEnsemble.predict": time_call(lambda: ensemble.predict(row), args.repeats),
+        f"{args.rows} rows Booster.predict": time_call(lambda: booster.predict(matrix), 5),
+        f"{args.rows} rows TreeEnsemble.predict": time_call(lambda: ensemble.predict(matrix), 5),
+    }
+    print_results("Model evaluation", results)
+    print(f"max |p_ensemble - p_booster| = {abs(ensemble.predict(matrix) - booster.predict(matrix)).max():.2e}")
+
+
+def bench_firestore_concurrency(args):
+    """Concurrent Firestore reads from async handlers: inline sync client vs thread-pool offload"""
+    import asyncio
+    from unittest.mock import Mock, patch
+    from services.firebase_service import FirebaseService, AsyncFirebaseService
+
+    latency = args.latency_ms / 1000
+
+    # In-memory fake whose document reads take one simulated round trip
+    def slow_get():
+        time.sleep(latency)
+        doc = Mock()
+        doc.exists = True
+        doc.to_dict.return_value = {"user_id": "user_1"}
+        return doc
+
+    db = Mock()
+    db.collection.return_value.document.return_value.get.side_effect = slow_get
+    with patch('services.firebase_service.get_firestore', return_value=db):
+        sync_service = FirebaseService()
+    async_service = AsyncFirebaseService(sync_service, max_workers=args.workers)
+
+    async def inline_handler():
+        return sync_service.get_user("user_1")
+
+    async def run(handler_factory):
+        start = time.perf_counter()
+        await asyncio.gather(*(handler_factory() for _ in range(args.concurrency)))
+        return time.perf_counter() - start
+
+    inline_s = asyncio.run(run(inline_handler))
+    offloaded_s = asyncio.run(run(lambda: async_service.get_user("user_1")))
+    async_service.shutdown()
+
+    print(f"\n{args.concurrency} concurrent reads, {args.latency_ms}ms simulated round trip, {args.workers} I/O threads")
+    print("-" * 64)
+    print(f"{'sync client on event loop':<32} {inline_s * 1000:>10.1f}ms  {args.concurrency / inline_s:>10.1f} req/s")
+    print(f"{'AsyncFirebaseService':<32} {offloaded_s * 1000:>10.1f}ms  {args.concurrency / offloaded_s:>10.1f} req/s")
+
+
+def bench_micro_batching(args):
+    """Concurrent /applications/ scoring: one pool call per request vs PredictionBatcher"""
+    import asyncio
+    from services.prediction_service import PredictionService
+    from services.inference_pool import InferencePool
+    from services.prediction_batcher import PredictionBatcher
+
+    service = PredictionService(str(backend_path / "trained_models" / "global_credit_model.pkl"))
+    rows = [service.schema.encode(r) for r in load_sample_requests(args.rows)]
+
+    async def closed_loop(score_one):
+        """args.concurrency clients, each sending requests back to back"""
+        latencies = []
+        next_row = iter(range(len(rows)))
+
+        async def client():
+            for i in next_row:
+                start = time.perf_counter()
+                await score_one(rows[i])
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        return len(rows) / elapsed, latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000
+
+    def run_case(max_batch_size=None, max_wait_ms=None):
+        pool = InferencePool(mode="thread", max_workers=args.workers, max_queue=args.concurrency,
+                             resolver=lambda name, version: service)
+        if max_batch_size is None:
+            score_one = lambda features: pool.run("prediction", "predict_encoded", features)
+        else:
+            batcher = PredictionBatcher(
+                lambda matrix: pool.run("prediction", "predict_encoded_batch", matrix),
+                max_batch_size=max_batch_size, max_wait_ms=max_wait_ms
+            )
+            score_one = batcher.submit
+        result = asyncio.run(closed_loop(score_one))
+        pool.shutdown()
+        return result
+
+    print(f"\n{args.rows} requests from {args.concurrency} concurrent clients, {args.workers} inference threads")
+    print("-" * 64)
+    cases = [("unbatched", None, None)] + [
+        (f"batch<= {size}, wait {wait}ms", size, wait) for size, wait in [(16, 1.0), (64, 2.0), (256, 5.0)]
+    ]
+    for name, size, wait in cases:
+        throughput, p50, p99 = run_case(size, wait)
+        print(f"{name:<32} {throughput:>10.0f} req/s  p50 {p50:>8.2f}ms  p99 {p99:>8.2f}ms")
+
+
+def bench_tree_shap(args):
+    """SHAP values: pickled shap.TreeExplainer vs native TreeShapExplainer"""
+    import joblib
+    from models.tree_ensemble import TreeEnsemble
+    from models.tree_shap import TreeShapExplainer
+
+    reference = joblib.load(backend_path / "trained_models" / "shap_explainer.pkl")
+    explainer = TreeShapExplainer(TreeEnsemble.load(backend_path / "trained_models" / "artifacts"))
+
+    matrix = pd.DataFrame(load_sample_requests(args.rows))[explainer.feature_names].to_numpy(dtype="float64")
+    row = matrix[:1]
+
+    results = {
+        "1 row  shap.TreeExplainer": time_call(lambda: reference.shap_values(row), args.repeats),
+        "1 row  TreeShapExplainer": time_call(lambda: explainer.shap_values(row), args.repeats),
+        f"{args.rows} rows shap.TreeExplainer": time_call(lambda: reference.shap_values(matrix), 3),
+        f"{args.rows} rows TreeShapExplainer": time_call(lambda: explainer.shap_values(matrix), 3),
+    }
+    print_results("SHAP values", results)
+    print(f"max |phi_native - phi_shap| = {abs(explainer.shap_values(matrix) - reference.shap_values(matrix)).max():.2e}")
+
+
+def bench_explain_batch(args):
+    """Batch explanations: explain_prediction loop vs single-SHAP-call explain_batch"""
+    from services.explainability_service import ExplainabilityService
+
+    service = ExplainabilityService(str(backend_path / "trained_models" / "shap_explainer.pkl"))
+    requests = load_sample_requests(args.rows)
+
+    results = {
+        f"explain_prediction loop ({args.rows})": time_call(lambda: [service.explain_prediction(r) for r in requests], 3),
+        f"explain_batch ({args.rows})": time_call(lambda: service.explain_batch(requests), 3),
+    }
+    print_results("Batch explanations (top 10)", results)
+
+
+def bench_client_training(args):
+    """Federated client training: sequential fits vs shared-memory process pool"""
+    import os
+    import numpy as np
+    from scripts.train_model import FederatedLearningSimulator
+
+    df = pd.read_csv(SAMPLE_DATA_PATH)
+    df['target'] = df['target'].map({0.0: 0, 0.21: 0, 1.0: 1})
+    df = df.dropna(subset=['target']).astype({'target': int})
+    df = df.sample(n=args.rows, replace=True, random_state=42).reset_index(drop=True)
+    client_datasets = [df.iloc[rows] for rows in np.array_split(np.arange(len(df)), args.clients)]
+
+    n_workers = min(args.workers, os.cpu_count() or 1)
+    timings = {}
+    simulator = FederatedLearningSimulator(str(SAMPLE_DATA_PATH), args.clients, client_workers=n_workers)
+    for name, train in [("sequential", simulator.train_client_models_sequential),
+                        (f"process pool ({n_workers} workers)", simulator.train_client_models_parallel)]:
+        start = time.perf_counter()
+        train(client_datasets)
+        timings[name] = time.perf_counter() - start
+
+    print(f"\nClient training ({args.clients} clients, {args.rows} rows, {os.cpu_count()} cores)")
+    print("-" * 64)
+    sequential = timings["sequential"]
+    for name, seconds in timings.items():
+        print(f"{name:<32} {seconds:>10.2f}s  speedup {sequential / seconds:>6.2f}x")
+
+
+def bench_federated_training(args):
+    """Global model: centralized LightGBM vs federated histogram GBDT over client updates"""
+    import numpy as np
+    from lightgbm import LGBMClassifier
+    from sklearn.metrics import roc_auc_score
+    from sklearn.model_selection import train_test_split
+    from models.federated_gbdt import FederatedClient, FederatedHistogramGBDT
+    from scripts.train_model import FederatedLearningSimulator
+
+    df = pd.read_csv(SAMPLE_DATA_PATH)
+    df['target'] = df['target'].map({0.0: 0, 0.21: 0, 1.0: 1})
+    df = df.dropna(subset=['target']).astype({'target': int})
+    simulator = FederatedLearningSimulator(str(SAMPLE_DATA_PATH))
+    X, y = simulator.prepare_features_and_target(df)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X.to_numpy(dtype=np.float64), y.to_numpy(), test_size=0.2, random_state=42, stratify=y
+    )
+    # Resample only the training rows up to --rows, so no test row is seen in training
+    rows = np.random.default_rng(42).choice(len(X_train), size=max(args.rows, len(X_train)), replace=True)
+    X_train, y_train = X_train[rows], y_train[rows]
+
+    print(f"\nGlobal model training ({len(X_train)} train rows, {len(X_test)} test rows)")
+    print("-" * 96)
+    print(f"{'method':<32} {'train':>8} {'AUC':>8} {'rounds':>7} {'KB up/round':>12} {'KB down/round':>14} {'total MB':>9}")
+
+    start = time.perf_counter()
+    central = LGBMClassifier(**simulator.model_params).fit(X_train, y_train)
+    seconds = time.perf_counter() - start
+    auc = roc_auc_score(y_test, central.predict_proba(X_test)[:, 1])
+    print(f"{'centralized LightGBM':<32} {seconds:>7.2f}s {auc:>8.4f} {'-':>7} {'-':>12} {'-':>14} {'-':>9}")
+
+    for n_clients in sorted({1, 5, args.clients}):
+        parts = np.array_split(np.arange(len(X_train)), n_clients)
+        clients = [FederatedClient(X_train[rows], y_train[rows]) for rows in parts]
+        server = FederatedHistogramGBDT(**simulator.federated_params)
+        start = time.perf_counter()
+        model = server.fit(clients, simulator.schema.feature_names)
+        seconds = time.perf_counter() - start
+        auc = roc_auc_score(y_test, model.predict(X_test))
+        rounds = server.history[1:]
+        up = statistics.fmean(r['bytes_up'] for r in rounds) / 1e3
+        down = statistics.fmean(r['bytes_down'] for r in rounds) / 1e3
+        print(f"{f'federated GBDT ({n_clients} clients)':<32} {seconds:>7.2f}s {auc:>8.4f} {len(rounds):>7} "
+              f"{up:>12.1f} {down:>14.2f} {server.bytes_exchanged() / 1e6:>9.1f}")
+
+
+def bench_data_formats(args):
+    """Processed-data storage: CSV vs Parquet vs Arrow IPC (size, full read, 27-feature projection)"""
+    import tempfile
+    from models.feature_schema import DEFAULT_FEATURE_SCHEMA
+    from scripts.data_ingestion import FORMAT_EXTENSIONS, read_table, write_table
+
+    df = pd.read_csv(SAMPLE_DATA_PATH)
+    df = df.sample(n=args.rows, replace=True, random_state=42).reset_index(drop=True)
+    features = list(DEFAULT_FEATURE_SCHEMA.feature_names)
+    repeats = max(1, min(args.repeats, 5))
+
+    print(f"\nData formats ({args.rows} rows x {len(df.columns)} columns, {len(features)}-feature projection)")
+    print("-" * 72)
+    print(f"{'format':<10} {'size MB':>9} {'write':>9} {'full read':>11} {'projected read':>16}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for file_format, extension in FORMAT_EXTENSIONS.items():
+            path = str(Path(tmp) / f"processed_data{extension}")
+            start = time.perf_counter()
+            write_table(df, path)
+            write_s = time.perf_counter() - start
+            full = time_call(lambda: read_table(path), repeats)
+            projected = time_call(lambda: read_table(path, features), repeats)
+            print(f"{file_format:<10} {Path(path).stat().st_size / 1e6:>9.1f} {write_s:>8.2f}s "
+                  f"{full['mean_us'] / 1e3:>9.1f}ms {projected['mean_us'] / 1e3:>14.1f}ms")
+
+
+def _synthetic_raw_data(n_rows: int, seed: int = 42) -> pd.DataFrame:
+    """Raw-looking applications: sample numeric columns with 5% missing values plus string categories"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    sample = pd.read_csv(SAMPLE_DATA_PATH)
+    numeric = ['person_income', 'loan_amnt', 'loan_int_rate', 'person_emp_length', 'age', 'loan_percent_income']
+    rows = rng.integers(0, len(sample), n_rows)
+    df = pd.DataFrame({col: sample[col].to_numpy(dtype=np.float64)[rows] for col in numeric})
+    # Jitter so resampled rows are not duplicates
+    df['loan_amnt'] += rng.random(n_rows)
+    for col in numeric:
+        df.loc[rng.random(n_rows) < 0.05, col] = np.nan
+    categories = {
+        'person_home_ownership': np.array(['RENT', 'OWN', 'MORTGAGE', 'OTHER'], dtype=object),
+        'loan_intent': np.array(['EDUCATION', 'MEDICAL', 'VENTURE', 'PERSONAL', 'HOMEIMPROVEMENT',
+                                 'DEBTCONSOLIDATION'], dtype=object),
+        'region': np.array([f'region_{i}' for i in range(40)], dtype=object),
+    }
+    for col, values in categories.items():
+        df[col] = values[rng.integers(0, len(values), n_rows)]
+        df.loc[rng.random(n_rows) < 0.02, col] = None
+    return df
+
+
+def _legacy_clean_data(df: pd.DataFrame) -> pd.DataFrame:
+    """Per-column clean_data as it was before vectorization (reference timing)"""
+    import numpy as np
+
+    clean_df = df.copy()
+    for col in clean_df.select_dtypes(include=[np.number]).columns:
+        if clean_df[col].isnull().any():
+            clean_df[col] = clean_df[col].fillna(clean_df[col].median())
+    for col in clean_df.select_dtypes(include=['object']).columns:
+        if clean_df[col].isnull().any():
+            mode = clean_df[col].mode()
+            clean_df[col] = clean_df[col].fillna(mode.iloc[0] if not mode.empty else 'Unknown')
+    clean_df.drop_duplicates(inplace=True)
+    for col in ['person_income', 'loan_amnt', 'loan_int_rate']:
+        q1, q3 = clean_df[col].quantile(0.25), clean_df[col].quantile(0.75)
+        clean_df[col] = np.clip(clean_df[col], q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1))
+    return clean_df
+
+
+def _legacy_encode_unseen(df: pd.DataFrame, encoders: Dict[str, Any]) -> pd.DataFrame:
+    """Per-row encoding of columns with unseen categories, as it was before vectorization"""
+    encoded_df = df.copy()
+    for col, encoder in encoders.items():
+        known_values = set(encoder.classes_)
+        encoded_df[col] = encoded_df[col].map(
+            lambda x: 0 if x not in known_values else encoder.transform([x])[0]
+        )
+    return encoded_df
+
+
+def bench_preprocessing(args):
+    """DataPreprocessor.clean_data / encode_categorical_features: per-column loops vs vectorized passes"""
+    from scripts.data_preprocessing import DataPreprocessor
+
+    df = _synthetic_raw_data(args.rows)
+    # The per-row legacy encoder runs about 10^5 rows/s, so it is timed on a slice
+    legacy_rows = min(args.rows, 100_000)
+    timings = {}
+
+    def timed(name: str, n_rows: int, fn: Callable[[], Any]):
+        start = time.perf_counter()
+        result = fn()
+        timings[name] = (n_rows, time.perf_counter() - start)
+        return result
+
+    timed("clean_data (per-column)", args.rows, lambda: _legacy_clean_data(df))
+    clean_df = timed("clean_data (vectorized)", args.rows, lambda: DataPreprocessor().clean_data(df))
+
+    preprocessor = DataPreprocessor()
+    timed("encode fit (vectorized)", len(clean_df), lambda: preprocessor.encode_categorical_features(clean_df))
+    # Serving-time data where one region was never seen in training
+    unseen = clean_df.copy()
+    unseen.loc[unseen.index[::10], 'region'] = 'region_new'
+    encoders = {col: preprocessor.encoders[col] for col in ['person_home_ownership', 'loan_intent', 'region']}
+    timed("encode unseen (per-row)", legacy_rows, lambda: _legacy_encode_unseen(unseen.iloc[:legacy_rows], encoders))
+    timed("encode unseen (vectorized)", len(unseen), lambda: preprocessor.encode_categorical_features(unseen))
+
+    print(f"\nPreprocessing ({args.rows} rows x {len(df.columns)} columns)")
+    print("-" * 72)
+    for name, (n_rows, seconds) in timings.items():
+        print(f"{name:<32} {n_rows:>10} rows {seconds:>9.2f}s {n_rows / seconds / 1e6:>8.2f}M rows/s")
+
+
+def bench_quantile_sketch(args):
+    """clean_data statistics: exact full-frame quantiles vs merged per-shard KLL sketches"""
+    import numpy as np
+    from models.preprocessing_pipeline import iqr_bounds
+    from models.quantile_sketch import StreamingStatistics
+    from scripts.data_preprocessing import OUTLIER_COLUMNS
+
+    df = _synthetic_raw_data(args.rows)
+    columns = [col for col in OUTLIER_COLUMNS if col in df.columns]
+    qs = [0.25, 0.5, 0.75]
+
+    start = time.perf_counter()
+    exact = np.nanquantile(df[columns].to_numpy(dtype=np.float64), qs, axis=0)
+    exact_s = time.perf_counter() - start
+
+    # Each client sketches its shard in 100k-row chunks; the server merges the sketches
+    start = time.perf_counter()
+    shards = []
+    for rows in np.array_split(np.arange(len(df)), args.clients):
+        stats = StreamingStatistics()
+        for begin in range(0, len(rows), 100_000):
+            stats.update(df.iloc[rows[begin:begin + 100_000]][columns])
+        shards.append(stats)
+    merged = StreamingStatistics.merged(shards)
+    sketch_s = time.perf_counter() - start
+    estimates = merged.quantiles(qs, columns)
+
+    print(f"\nIQR statistics ({args.rows} rows, {args.clients} shards, "
+          f"exact {exact_s:.2f}s, sketches {sketch_s:.2f}s, {merged.size * 8 / 1e3:.1f} KB merged)")
+    print("-" * 96)
+    print(f"{'column':<16} {'quantile':>8} {'exact':>14} {'sketch':>14} {'rank error':>11} {'clip bound':>14} {'sketch bound':>14}")
+    for i, col in enumerate(columns):
+        values = np.sort(df[col].dropna().to_numpy())
+        exact_upper = iqr_bounds(exact[0, i], exact[2, i])[1]
+        sketch_upper = iqr_bounds(estimates[col][0], estimates[col][2])[1]
+        for j, q in enumerate(qs):
+            # Distance from q to the rank interval of the estimate (ties make it an interval)
+            low = np.searchsorted(values, estimates[col][j], side='left') / len(values)
+            high = np.searchsorted(values, estimates[col][j], side='right') / len(values)
+            rank_error = max(low - q, q - high, 0.0)
+            bounds = f"{exact_upper:>14.2f} {sketch_upper:>14.2f}" if j == 2 else ""
+            print(f"{col if j == 0 else '':<16} {q:>8.2f} {exact[j, i]:>14.2f} {estimates[col][j]:>14.2f} "
+                  f"{rank_error:>10.3%} {bounds}")
+
+
+def bench_dedup(args):
+    """Duplicate rows: DataFrame.drop_duplicates on the full frame vs a streaming 64-bit row-hash set"""
+    import numpy as np
+    from scripts.data_ingestion import StreamingDeduplicator
+
+    rng = np.random.default_rng(42)
+    sample = pd.read_csv(SAMPLE_DATA_PATH)
+    n_unique = int(args.rows * 0.9)
+    unique = sample.iloc[rng.integers(0, len(sample), n_unique)].reset_index(drop=True)
+    # Jitter so only the re-inserted 10% are duplicates
+    unique['loan_amnt'] += rng.random(n_unique)
+    df = pd.concat([unique, unique.iloc[rng.integers(0, n_unique, args.rows - n_unique)]])
+    df = df.iloc[rng.permutation(len(df))].reset_index(drop=True)
+
+    start = time.perf_counter()
+    full = df.drop_duplicates()
+    full_s = time.perf_counter() - start
+
+    deduplicator = StreamingDeduplicator()
+    start = time.perf_counter()
+    kept = sum(len(deduplicator.drop_duplicates(df.iloc[begin:begin + 100_000]))
+               for begin in range(0, len(df), 100_000))
+    stream_s = time.perf_counter() - start
+    assert kept == len(full)
+
+    print(f"\nDeduplication ({args.rows} rows x {len(df.columns)} columns, {args.rows - len(full)} duplicates)")
+    print("-" * 72)
+    print(f"{'drop_duplicates (full frame)':<32} {full_s:>8.2f}s {args.rows / full_s / 1e6:>6.2f}M rows/s "
+          f"{df.memory_usage(deep=True).sum() / 1e6:>9.1f} MB frame")
+    print(f"{'row-hash set (100k chunks)':<32} {stream_s:>8.2f}s {args.rows / stream_s / 1e6:>6.2f}M rows/s "
+          f"{deduplicator.seen.nbytes / 1e6:>9.1f} MB hashes")
+
+    # Repeated column blocks in the sample (not whole-row duplicates)
+    blocks = {
+        'telecom': ['mobile_tenure_months', 'monthly_airtime_spend', 'monthly_data_usage_gb', 'avg_calls_per_day',
+                    'avg_sms_per_day', 'avg_call_duration_mins', 'network_stability_score'],
+        'utility': ['electricity_bill_avg', 'water_bill_avg', 'gas_bill_avg', 'total_utility_expense'],
+        'all columns': None,
+    }
+    print(f"\nRepeated blocks in {SAMPLE_DATA_PATH.name} ({len(sample)} rows)")
+    for name, columns in blocks.items():
+        print(f"{name:<16} {int(StreamingDeduplicator(columns).duplicated(sample).sum()):>8} repeats")
+
+
+def bench_client_partitioning(args):
+    """Client split: full shuffle + copied slices + sequential writes vs key-hash index views + pooled writes"""
+    import tempfile
+    import numpy as np
+    from scripts.client_partitioning import PARTITION_SCHEMES, partition_clients, write_shards
+    from scripts.data_ingestion import shard_path, write_table
+
+    rng = np.random.default_rng(42)
+    sample = pd.read_csv(SAMPLE_DATA_PATH)
+    df = sample.iloc[rng.integers(0, len(sample), args.rows)].reset_index(drop=True)
+    df['person_id'] = np.arange(args.rows)
+    df['target'] = df['target'].map({0.0: 0, 0.21: 0, 1.0: 1})
+
+    def shuffle_split():
+        shuffled = df.sample(frac=1, random_state=42).reset_index(drop=True)
+        return [shuffled.iloc[rows].copy() for rows in np.array_split(np.arange(len(shuffled)), args.clients)]
+
+    def hash_split(scheme):
+        return partition_clients(df, args.clients, scheme).frames(df)
+
+    print(f"\nClient partitioning ({args.rows} rows x {len(df.columns)} columns, {args.clients} clients)")
+    print("-" * 72)
+    cases = {"shuffle + array_split + copy": shuffle_split}
+    cases.update({f"hash {scheme}": (lambda scheme=scheme: hash_split(scheme)) for scheme in PARTITION_SCHEMES})
+    for name, split in cases.items():
+        start = time.perf_counter()
+        frames = split()
+        seconds = time.perf_counter() - start
+        sizes = [len(frame) for frame in frames]
+        print(f"{name:<32} {seconds:>8.3f}s   client rows {min(sizes)}-{max(sizes)}")
+
+    frames = hash_split("iid")
+    with tempfile.TemporaryDirectory() as tmp:
+        for file_format in ("parquet", "csv"):
+            start = time.perf_counter()
+            for i, frame in enumerate(frames):
+                write_table(frame, str(shard_path(tmp, i + 1, file_format)))
+            sequential_s = time.perf_counter() - start
+            start = time.perf_counter()
+            write_shards(frames, tmp, file_format, max_workers=args.workers)
+            pooled_s = time.perf_counter() - start
+            print(f"write {file_format:<8} sequential {sequential_s:>7.2f}s   "
+                  f"{args.workers} writer threads {pooled_s:>7.2f}s")
+
+
+BENCHMARKS = {
+    "feature_layout": bench_feature_layout,
+    "predict_batch": bench_predict_batch,
+    "tree_ensemble": bench_tree_ensemble,
+    "firestore_concurrency": bench_firestore_concurrency,
+    "micro_batching": bench_micro_batching,
+    "explain_batch": bench_explain_batch,
+    "tree_shap": bench_tree_shap,
+    "client_training": bench_client_training,
+    "federated_training": bench_federated_training,
+    "data_formats": bench_data_formats,
+    "preprocessing": bench_preprocessing,
+    "quantile_sketch": bench_quantile_sketch,
+    "dedup": bench_dedup,
+    "client_partitioning": bench_client_partitioning,
+}
+
+
+def main():
+    """Main execution function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--repeats", type=int, default=2000, help="Timed repetitions per case")
+    parser.add_argument("--rows", type=int, default=10000, help="Rows for batch benchmarks")
+    parser.add_argument("--concurrency", type=int, default=200, help="Concurrent requests for I/O benchmarks")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Simulated Firestore round trip")
+    parser.add_argument("--workers", type=int, default=16, help="Worker threads for pooled benchmarks")
+    parser.add_argument("--clients", type=int, default=24, help="Simulated federated clients")
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    main()
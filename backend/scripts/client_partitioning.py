@@ -0,0 +1,153 @@
+# backend/scripts/client_partitioning.py
+"""
+Deterministic Client Partitioning
+
+Assigns every row of a dataset to a simulated federated client from a
+keyed hash of its identifier (person_id, else customer_id), so a person
+always lands on one client and the split is reproducible without
+shuffling the frame. Three schemes:
+    iid             clients of about equal size with the overall label mix
+    label_skew      per-label client shares drawn from Dirichlet(alpha), so
+                    each client sees a different label mix
+    quantity_skew   client sizes drawn from Dirichlet(alpha)
+Smaller alpha means more skew. Partitions are index arrays (views into
+one sorted row order); each client frame is a single gather from the
+source frame, and shards are written by a thread pool.
+"""
+
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Add backend to path for imports when run as a script
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.data_ingestion import key_hashes, row_hashes, shard_path, write_table
+
+logger = logging.getLogger(__name__)
+
+PARTITION_SCHEMES = ("iid", "label_skew", "quantity_skew")
+
+# Dirichlet concentration of the skewed schemes
+DEFAULT_ALPHA = 0.5
+
+# Identifier columns that keep an entity on one client, in order of preference
+# (customer_id is a shared placeholder on part of processed_data.csv)
+PARTITION_KEYS = ('person_id', 'customer_id')
+
+
+def default_key_column(columns: Sequence[str]) -> Optional[str]:
+    """The identifier to partition on: person_id, else customer_id, else None (hash the whole row)"""
+    return next((col for col in PARTITION_KEYS if col in columns), None)
+
+
+class ClientPartition:
+    """Row positions of every client, as views into one stable sort of the assignment
+
+    ``indices(i)`` shares memory with ``order``; rows keep their original
+    order within a client.
+    """
+
+    def __init__(self, clients: np.ndarray, n_clients: int):
+        self.clients = clients
+        self.n_clients = n_clients
+        self.order = np.argsort(clients, kind='stable')
+        self.bounds = np.searchsorted(clients[self.order], np.arange(n_clients + 1))
+
+    @property
+    def sizes(self) -> List[int]:
+        return np.diff(self.bounds).tolist()
+
+    def indices(self, i: int) -> np.ndarray:
+        """Row positions of client i (a zero-copy view)"""
+        return self.order[self.bounds[i]:self.bounds[i + 1]]
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        return (self.indices(i) for i in range(self.n_clients))
+
+    def frame(self, df: pd.DataFrame, i: int) -> pd.DataFrame:
+        """Client i's rows of df (one gather, no shuffled copy of the whole frame)"""
+        return df.take(self.indices(i))
+
+    def frames(self, df: pd.DataFrame) -> List[pd.DataFrame]:
+        return [self.frame(df, i) for i in range(self.n_clients)]
+
+
+def _unit_interval(hashes: np.ndarray) -> np.ndarray:
+    # Top 53 bits of the hash as a uniform float in [0, 1)
+    return (hashes >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
+
+def partition_clients(df: pd.DataFrame, n_clients: int, scheme: str = "iid", key_column: Optional[str] = None,
+                      label_column: str = 'target', alpha: float = DEFAULT_ALPHA, seed: int = 42) -> ClientPartition:
+    """Assign each row to a client from the hash of its key column
+
+    ``key_column`` defaults to person_id or customer_id, whichever is
+    present, else the whole row is hashed. IID assignment is hash mod
+    n_clients, the same as the streaming split (stream_partition_csv). The
+    skewed schemes cut the unit interval into Dirichlet-drawn client shares
+    (per label for label_skew) and place each key by its hash; a key whose
+    rows carry different labels follows the lowest of them. Rows without a
+    key keep their own label, and a missing label is a class of its own,
+    so every row gets a client. The result depends only on the rows, the seed and
+    alpha.
+    """
+    if scheme not in PARTITION_SCHEMES:
+        raise ValueError(f"Unknown partition scheme {scheme!r}, expected one of {PARTITION_SCHEMES}")
+    if n_clients < 1:
+        raise ValueError("n_clients must be at least 1")
+    if key_column is None:
+        key_column = default_key_column(df.columns)
+    hashes = key_hashes(df, key_column, seed) if key_column is not None else row_hashes(df, seed=seed)
+
+    if scheme == "iid":
+        clients = (hashes % np.uint64(n_clients)).astype(np.intp)
+    else:
+        rng = np.random.default_rng(seed)
+        position = _unit_interval(hashes)
+        if scheme == "quantity_skew":
+            shares = np.cumsum(rng.dirichlet(np.full(n_clients, alpha)))
+            clients = np.searchsorted(shares, position, side='right')
+        else:
+            if label_column not in df.columns:
+                raise ValueError(f"Label column '{label_column}' not found for label-skewed partitioning")
+            labels = df[label_column]
+            if key_column is not None:
+                keys = df[key_column]
+                labels = labels.groupby(keys.to_numpy(), sort=False).transform('min').where(keys.notna(), labels)
+            codes, classes = pd.factorize(labels, sort=True, use_na_sentinel=False)
+            # One row of cumulative client shares per label
+            shares = np.cumsum(rng.dirichlet(np.full(n_clients, alpha), size=len(classes)), axis=1)
+            clients = np.full(len(df), -1, dtype=np.intp)
+            for code in range(len(classes)):
+                rows = codes == code
+                clients[rows] = np.searchsorted(shares[code], position[rows], side='right')
+            if (clients < 0).any():
+                raise RuntimeError(f"{int((clients < 0).sum())} rows were not assigned a client")
+        # Guard against the cumulative shares summing to just under 1
+        clients = np.minimum(clients, n_clients - 1).astype(np.intp)
+
+    partition = ClientPartition(clients, n_clients)
+    logger.info(f"Partitioned {len(df)} rows into {n_clients} clients ({scheme}, key: {key_column or 'row'}): "
+                f"{partition.sizes}")
+    return partition
+
+
+def write_shards(client_frames: Sequence[pd.DataFrame], output_dir: str, file_format: str = 'csv',
+                 max_workers: int = 4) -> List[str]:
+    """Write each client's frame to its shard file, several shards at a time
+
+    Parquet and Arrow encoding release the GIL, so the writes overlap;
+    CSV formatting overlaps only partly.
+    """
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    paths = [str(shard_path(output_dir, i + 1, file_format)) for i in range(len(client_frames))]
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="shard-writer") as executor:
+        list(executor.map(write_table, client_frames, paths))
+    logger.info(f"Wrote {len(paths)} client shards to {output_dir}")
+    return paths
@@ -0,0 +1,458 @@
+# backend/scripts/data_ingestion.py
+"""
+Chunked Data Ingestion
+
+Streams large extracts in fixed-size chunks, so memory stays bounded by
+one chunk (and the columns actually used) instead of the whole file.
+``stream_partition_csv`` splits a dataset into client shards in a single
+pass: each row goes to the client picked by a hash of its key column (or
+of the whole row), and every shard is appended to as chunks arrive.
+With ``dedup`` it also drops repeated rows on the way, remembering only a
+64-bit hash of every distinct row seen so far (``StreamingDeduplicator``).
+
+Three on-disk formats, picked by file extension:
+    .csv                  text; processed data is parsed with declared
+                          dtypes, other files with inferred ones
+    .parquet              columnar and compressed; column projection skips
+                          unread columns entirely
+    .arrow / .feather     Arrow IPC, uncompressed and memory-mapped
+Parquet and Arrow need pyarrow, which is imported only when used.
+"""
+
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Rows per chunk; a 53-column chunk of processed data is about 40 MB
+DEFAULT_CHUNK_ROWS = 100_000
+
+# Leading CSV rows inspected to tell processed data from raw extracts
+DTYPE_SAMPLE_ROWS = 1_000
+
+# On-disk formats by file extension
+FORMAT_EXTENSIONS = {'csv': '.csv', 'parquet': '.parquet', 'arrow': '.arrow'}
+_EXTENSION_FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.pq': 'parquet', '.arrow': 'arrow', '.feather': 'arrow'}
+
+# Columns of processed_data.csv that hold identifiers or encoded categories;
+# every other column is a float measure
+ID_COLUMNS = ('person_id', 'customer_id')
+CODE_COLUMNS = (
+    'person_home_ownership', 'loan_intent', 'loan_grade', 'cb_person_default_on_file', 'gender',
+    'education_level', 'location_type', 'employment_type', 'employment_status', 'income_level',
+    'region', 'payment_method', 'credit_risk_category',
+)
+# Every column of processed_data.csv; raw extracts use the same names with text categories
+PROCESSED_DATA_COLUMNS = frozenset(ID_COLUMNS + CODE_COLUMNS + (
+    'person_income', 'person_emp_length', 'loan_amnt', 'loan_int_rate', 'loan_percent_income',
+    'cb_person_cred_hist_length', 'age', 'estimated_monthly_income', 'mobile_tenure_months',
+    'monthly_airtime_spend', 'monthly_data_usage_gb', 'avg_calls_per_day', 'avg_sms_per_day',
+    'avg_call_duration_mins', 'network_stability_score', 'digital_wallet_usage', 'monthly_digital_transactions',
+    'avg_transaction_amount', 'online_purchases_per_month', 'avg_online_spend', 'social_media_activity_score',
+    'social_network_size', 'mobile_banking_user', 'digital_loan_history', 'digital_engagement_score',
+    'financial_inclusion_score', 'monthly_income', 'electricity_bill_avg', 'water_bill_avg', 'gas_bill_avg',
+    'total_utility_expense', 'utility_to_income_ratio', 'on_time_payments_12m', 'late_payments_12m',
+    'avg_delay_days', 'disconnection_count', 'credit_risk_score', 'target',
+))
+
+
+def processed_data_dtypes(columns: Sequence[str]) -> Dict[str, str]:
+    """Declared dtypes for processed-data columns
+
+    Declaring them skips per-chunk type inference and keeps every chunk's
+    dtypes identical. Identifiers are nullable, so a missing ID stays
+    missing instead of failing the parse.
+    """
+    dtypes = {}
+    for column in columns:
+        if column in ID_COLUMNS:
+            dtypes[column] = 'Int64'
+        elif column in CODE_COLUMNS:
+            dtypes[column] = 'int32'
+        else:
+            dtypes[column] = 'float64'
+    return dtypes
+
+
+def csv_columns(path: str) -> List[str]:
+    """Header of a CSV file"""
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def csv_dtypes(path: str, columns: Sequence[str]) -> Dict[str, str]:
+    """Dtypes to parse a CSV's columns with, judged from its first rows
+
+    Processed data (only processed-data columns, all numeric and no missing
+    category codes) gets ``processed_data_dtypes``. Anything else, e.g. a
+    raw extract with text categories, is left to pandas' inference, except
+    that numeric identifiers are read as nullable Int64: a chunk with a
+    missing ID would otherwise turn its IDs into floats, which hash
+    differently.
+    """
+    sample = pd.read_csv(path, usecols=list(columns), nrows=DTYPE_SAMPLE_ROWS)
+    numeric = {column: pd.api.types.is_numeric_dtype(sample[column]) for column in columns}
+    codes = [column for column in columns if column in CODE_COLUMNS]
+    if all(column in PROCESSED_DATA_COLUMNS and numeric[column] for column in columns) and \
+            not sample[codes].isna().any().any():
+        return processed_data_dtypes(columns)
+    return {column: 'Int64' for column in columns if column in ID_COLUMNS and numeric[column]}
+
+
+def read_csv_chunks(path: str, chunk_rows: int = DEFAULT_CHUNK_ROWS, columns: Optional[Sequence[str]] = None,
+                    dtypes: Optional[Dict[str, str]] = None) -> Iterator[pd.DataFrame]:
+    """Iterate over a CSV file in chunks, reading only ``columns`` (default: all)
+
+    ``dtypes`` defaults to ``csv_dtypes``: declared for processed data,
+    inferred otherwise.
+    """
+    if not Path(path).exists():
+        raise FileNotFoundError(f"Data file not found: {path}")
+    selected = list(columns) if columns is not None else csv_columns(path)
+    if dtypes is None:
+        dtypes = csv_dtypes(path, selected)
+    reader = pd.read_csv(path, usecols=selected, dtype={c: t for c, t in dtypes.items() if c in selected},
+                         chunksize=chunk_rows)
+    with reader:
+        for chunk in reader:
+            # usecols keeps file order; return the requested order
+            yield chunk[selected] if columns is not None else chunk
+
+
+def read_csv_projected(path: str, columns: Sequence[str], chunk_rows: int = DEFAULT_CHUNK_ROWS) -> pd.DataFrame:
+    """Load only ``columns`` of a CSV file, chunk by chunk"""
+    return pd.concat(read_csv_chunks(path, chunk_rows, columns), ignore_index=True)
+
+
+def data_format(path: str) -> str:
+    """'csv', 'parquet' or 'arrow', from the file extension"""
+    suffix = Path(path).suffix.lower()
+    if suffix not in _EXTENSION_FORMATS:
+        raise ValueError(f"Unsupported data file type {suffix!r}: expected one of {sorted(_EXTENSION_FORMATS)}")
+    return _EXTENSION_FORMATS[suffix]
+
+
+def _open_arrow(path: str):
+    import pyarrow as pa
+    return pa.ipc.open_file(pa.memory_map(str(path), 'r'))
+
+
+def table_columns(path: str) -> List[str]:
+    """Column names of a data file in any supported format"""
+    file_format = data_format(path)
+    if file_format == 'csv':
+        return csv_columns(path)
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        return list(pq.ParquetFile(path).schema_arrow.names)
+    return list(_open_arrow(path).schema.names)
+
+
+def iter_table_chunks(path: str, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                      columns: Optional[Sequence[str]] = None) -> Iterator[pd.DataFrame]:
+    """Iterate over a data file in chunks of at most chunk_rows rows, reading only ``columns``"""
+    if not Path(path).exists():
+        raise FileNotFoundError(f"Data file not found: {path}")
+    file_format = data_format(path)
+    if file_format == 'csv':
+        yield from read_csv_chunks(path, chunk_rows, columns)
+    elif file_format == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    else:
+        reader = _open_arrow(path)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if columns is not None:
+                batch = batch.select(list(columns))
+            for start in range(0, batch.num_rows, chunk_rows):
+                yield batch.slice(start, chunk_rows).to_pandas()
+
+
+def read_table(path: str, columns: Optional[Sequence[str]] = None,
+               chunk_rows: int = DEFAULT_CHUNK_ROWS) -> pd.DataFrame:
+    """Load a data file, reading only ``columns`` (default: all)
+
+    CSV is parsed chunk by chunk; Parquet reads just the projected column
+    chunks; Arrow IPC is memory-mapped and converted without a parse step.
+    """
+    if not Path(path).exists():
+        raise FileNotFoundError(f"Data file not found: {path}")
+    file_format = data_format(path)
+    if file_format == 'csv':
+        return pd.concat(read_csv_chunks(path, chunk_rows, columns), ignore_index=True)
+    if file_format == 'parquet':
+        return pd.read_parquet(path, columns=list(columns) if columns is not None else None)
+    table = _open_arrow(path).read_all()
+    if columns is not None:
+        table = table.select(list(columns))
+    return table.to_pandas(split_blocks=True)
+
+
+def write_table(df: pd.DataFrame, path: str):
+    """Write a frame in the format given by the file extension"""
+    file_format = data_format(path)
+    if file_format == 'csv':
+        df.to_csv(path, index=False)
+    elif file_format == 'parquet':
+        df.to_parquet(path, index=False)
+    else:
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        # Uncompressed, so readers can memory-map the columns
+        feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), str(path),
+                              compression='uncompressed')
+
+
+class TableAppender:
+    """Appends chunks to one data file, in any supported format"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.format = data_format(str(path))
+        self.rows = 0
+        self._writer: Any = None
+        self._schema = None
+        # Start empty so reruns don't append to old output
+        self.path.unlink(missing_ok=True)
+
+    def append(self, chunk: pd.DataFrame):
+        if self.format == 'csv':
+            chunk.to_csv(self.path, mode='a', header=self.rows == 0, index=False)
+        else:
+            import pyarrow as pa
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._writer is None:
+                self._schema = table.schema
+                if self.format == 'parquet':
+                    import pyarrow.parquet as pq
+                    self._writer = pq.ParquetWriter(str(self.path), self._schema)
+                else:
+                    self._writer = pa.ipc.new_file(str(self.path), self._schema)
+            self._writer.write_table(table.cast(self._schema))
+        self.rows += len(chunk)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def _hash_key(seed: int) -> str:
+    # hash_pandas_object takes a 16-character key
+    return f"kredai{seed:010d}"[-16:]
+
+
+def row_hashes(chunk: pd.DataFrame, columns: Optional[Sequence[str]] = None, seed: int = 42) -> np.ndarray:
+    """Keyed 64-bit hash of every row (of ``columns``, default all), independent of the index"""
+    values = chunk[list(columns)] if columns is not None else chunk
+    return pd.util.hash_pandas_object(values, index=False, hash_key=_hash_key(seed)).to_numpy()
+
+
+def key_hashes(chunk: pd.DataFrame, key_column: str, seed: int = 42) -> np.ndarray:
+    """Keyed 64-bit hash of one identifier column"""
+    return pd.util.hash_pandas_object(chunk[key_column], index=False, hash_key=_hash_key(seed)).to_numpy()
+
+
+def hash_partition(chunk: pd.DataFrame, num_clients: int, key_column: Optional[str] = None,
+                   seed: int = 42, hashes: Optional[np.ndarray] = None) -> np.ndarray:
+    """Client index for every row, from a keyed hash of its key column (or the whole row)
+
+    The assignment depends only on the row's content and the seed, never on
+    its position, so it is identical for any chunking of the file. Row
+    hashes already computed with the same seed (e.g. for deduplication) can
+    be passed in when partitioning by the whole row.
+    """
+    if key_column is not None:
+        hashes = key_hashes(chunk, key_column, seed)
+    elif hashes is None:
+        hashes = row_hashes(chunk, seed=seed)
+    return (hashes % np.uint64(num_clients)).astype(np.intp)
+
+
+class RowHashSet:
+    """Exact set of 64-bit hashes, stored as a few sorted uint64 runs
+
+    Takes 8 bytes per distinct hash, against ~60 in a Python set of ints.
+    Each batch becomes a new run, merged into the run before it once it
+    grows to half that run's size, so there are O(log n) runs and a
+    membership test is a binary search per run.
+    """
+
+    def __init__(self):
+        self._runs: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return sum(len(run) for run in self._runs)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(run.nbytes for run in self._runs)
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        """Membership mask for an array of hashes"""
+        if not self._runs:
+            return np.zeros(len(hashes), dtype=bool)
+        # Sorted keys make searchsorted walk each run forward instead of probing it at random
+        order = np.argsort(hashes)
+        keys = hashes[order]
+        found_sorted = np.zeros(len(keys), dtype=bool)
+        for run in self._runs:
+            index = np.searchsorted(run, keys)
+            index[index == len(run)] = 0
+            found_sorted |= run[index] == keys
+        found = np.empty(len(hashes), dtype=bool)
+        found[order] = found_sorted
+        return found
+
+    def add_new(self, hashes: np.ndarray) -> np.ndarray:
+        """Insert a batch; True where a hash was not seen before (first occurrence within the batch)"""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        # pandas' hash table finds first occurrences without sorting the batch
+        new = ~pd.Series(hashes, copy=False).duplicated().to_numpy()
+        first = np.flatnonzero(new)
+        seen = self.contains(hashes[first])
+        new[first[seen]] = False
+        if not seen.all():
+            self._runs.append(np.sort(hashes[first[~seen]]))
+            while len(self._runs) > 1 and len(self._runs[-2]) <= 2 * len(self._runs[-1]):
+                last = self._runs.pop()
+                # A stable (merge) sort of two sorted runs is a linear merge
+                self._runs[-1] = np.sort(np.concatenate([self._runs[-1], last]), kind="stable")
+        return new
+
+
+class StreamingDeduplicator:
+    """Drops rows already seen in this or any earlier chunk
+
+    Only the 64-bit hash of each distinct row is kept (8 bytes per row), not
+    the rows. Two different rows share a hash with probability ~2^-64 per
+    pair: about 3e-6 for any collision among ten million distinct rows.
+    ``columns`` restricts the comparison, like drop_duplicates(subset=...).
+    """
+
+    def __init__(self, columns: Optional[Sequence[str]] = None, seed: int = 42):
+        self.columns = list(columns) if columns is not None else None
+        self.seed = seed
+        self.seen = RowHashSet()
+        self.rows = 0
+        self.duplicates = 0
+
+    def hashes(self, chunk: pd.DataFrame) -> np.ndarray:
+        return row_hashes(chunk, self.columns, self.seed)
+
+    def duplicated(self, chunk: pd.DataFrame, hashes: Optional[np.ndarray] = None) -> np.ndarray:
+        """Duplicate mask for a chunk, recording its rows as seen"""
+        if hashes is None:
+            hashes = self.hashes(chunk)
+        duplicated = ~self.seen.add_new(hashes)
+        self.rows += len(chunk)
+        self.duplicates += int(duplicated.sum())
+        return duplicated
+
+    def drop_duplicates(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        duplicated = self.duplicated(chunk)
+        return chunk[~duplicated] if duplicated.any() else chunk
+
+
+def shard_path(output_dir: str, client_id: int, file_format: str = 'csv') -> Path:
+    """Path of a client's shard: client_<id>.<ext>"""
+    return Path(output_dir) / f"client_{client_id}{FORMAT_EXTENSIONS[file_format]}"
+
+
+class ShardWriter:
+    """Appends rows to one file per client (CSV, Parquet or Arrow)
+
+    Keeps per-shard row counts, dropped duplicates and target distributions
+    as it goes.
+    """
+
+    def __init__(self, output_dir: str, num_clients: int, target_column: str = 'target',
+                 file_format: str = 'csv'):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.num_clients = num_clients
+        self.target_column = target_column
+        self.paths = [shard_path(output_dir, i + 1, file_format) for i in range(num_clients)]
+        self.rows = [0] * num_clients
+        self.duplicates = [0] * num_clients
+        self.targets = [Counter() for _ in range(num_clients)]
+        self._appenders = [TableAppender(path) for path in self.paths]
+
+    def write(self, chunk: pd.DataFrame, clients: np.ndarray):
+        """Append each client's rows of the chunk to its shard"""
+        # One stable sort groups the chunk by client instead of a boolean mask per client
+        order = np.argsort(clients, kind='stable')
+        bounds = np.searchsorted(clients[order], np.arange(self.num_clients + 1))
+        for client, (start, end) in enumerate(zip(bounds, bounds[1:])):
+            if start == end:
+                continue
+            rows = chunk.iloc[order[start:end]]
+            self._appenders[client].append(rows)
+            self.rows[client] += end - start
+            if self.target_column in rows.columns:
+                self.targets[client].update(rows[self.target_column].value_counts().to_dict())
+
+    def count_duplicates(self, clients: np.ndarray):
+        """Record dropped duplicate rows against the clients they hash to"""
+        for client, count in enumerate(np.bincount(clients, minlength=self.num_clients)):
+            self.duplicates[client] += int(count)
+
+    def close(self):
+        for appender in self._appenders:
+            appender.close()
+
+    def __enter__(self) -> "ShardWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def summary(self) -> List[Dict]:
+        return [
+            {"client_id": i + 1, "path": str(path), "rows": rows, "duplicates_dropped": duplicates,
+             "target_distribution": dict(targets)}
+            for i, (path, rows, duplicates, targets) in enumerate(zip(self.paths, self.rows, self.duplicates,
+                                                                       self.targets))
+        ]
+
+
+def stream_partition_csv(input_csv: str, output_dir: str, num_clients: int, key_column: Optional[str] = None,
+                         chunk_rows: int = DEFAULT_CHUNK_ROWS, seed: int = 42,
+                         output_format: str = 'csv', dedup: bool = False,
+                         dedup_columns: Optional[Sequence[str]] = None) -> List[Dict]:
+    """Hash-partition a data file into client shards in one pass with bounded memory
+
+    The input may be any supported format; shards are written as
+    ``output_format``. With ``dedup``, rows repeated anywhere earlier in the
+    file (compared on ``dedup_columns``, default all) are dropped and counted
+    against the shard they would have gone to. Returns the per-client
+    summary (path, rows, duplicates dropped, target distribution).
+    """
+    total_rows = 0
+    deduplicator = StreamingDeduplicator(dedup_columns, seed) if dedup else None
+    with ShardWriter(output_dir, num_clients, file_format=output_format) as writer:
+        for chunk in iter_table_chunks(input_csv, chunk_rows):
+            total_rows += len(chunk)
+            if deduplicator is None:
+                writer.write(chunk, hash_partition(chunk, num_clients, key_column, seed))
+                continue
+            hashes = deduplicator.hashes(chunk)
+            # Whole-row hashes double as the partition hashes
+            clients = hash_partition(chunk, num_clients, key_column, seed,
+                                     hashes if dedup_columns is None else None)
+            duplicated = deduplicator.duplicated(chunk, hashes)
+            if duplicated.any():
+                writer.count_duplicates(clients[duplicated])
+                chunk, clients = chunk[~duplicated], clients[~duplicated]
+            writer.write(chunk, clients)
+    logger.info(f"Partitioned {total_rows} rows from {input_csv} into {num_clients} shards in {output_dir}")
+    if deduplicator is not None:
+        logger.info(f"Dropped {deduplicator.duplicates} duplicate rows "
+                    f"({deduplicator.seen.nbytes / 1e6:.1f} MB of row hashes)")
+    return writer.summary()
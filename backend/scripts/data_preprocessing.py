@@ -7,14 +7,27 @@ Contains functions for data cleaning, feature engineering, and preparation.
 
 import pandas as pd
 import numpy as np
+import sys
 from pathlib import Path
 import logging
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.model_selection import train_test_split
 
+# Add backend to path for imports when run as a script
+sys.path.append(str(Path(__file__).parent.parent))
+
+from models.preprocessing_pipeline import PreprocessingPipeline, iqr_bounds
+from models.quantile_sketch import DEFAULT_SKETCH_K, KLLSketch, StreamingStatistics
+from scripts.data_ingestion import (
+    DEFAULT_CHUNK_ROWS, StreamingDeduplicator, iter_table_chunks, read_table, write_table
+)
+
 logger = logging.getLogger(__name__)
 
+# Numeric fields whose outliers clean_data caps with the IQR rule
+OUTLIER_COLUMNS = ['person_income', 'loan_amnt', 'loan_int_rate']
+
 class DataPreprocessor:
     """Main class for data preprocessing operations"""
     
@@ -22,72 +35,173 @@ class DataPreprocessor:
         self.scalers = {}
         self.encoders = {}
         self.feature_columns = []
-        
-    def load_data(self, file_path: str) -> pd.DataFrame:
-        """Load data from CSV file"""
+        # Statistics fitted by clean_data, exported with the pipeline
+        self.fill_values = {}
+        self.clip_bounds = {}
+        
+    def load_data(self, file_path: str, columns: Optional[List[str]] = None,
+                  chunk_rows: Optional[int] = None) -> pd.DataFrame:
+        """Load data from a CSV, Parquet or Arrow file (by extension)
+        
+        Only ``columns`` (default: all) are read; Parquet and Arrow skip the
+        other columns on disk. With ``chunk_rows`` the file is streamed in
+        chunks (processed-data CSVs with declared dtypes, see
+        ``processed_data_dtypes``).
+        """
         try:
             path = Path(file_path)
             if not path.exists():
                 raise FileNotFoundError(f"Data file not found: {file_path}")
             
-            df = pd.read_csv(file_path)
+            if chunk_rows:
+                df = pd.concat(self.iter_chunks(file_path, chunk_rows, columns), ignore_index=True)
+            elif path.suffix.lower() == '.csv':
+                df = pd.read_csv(file_path, usecols=columns)
+            else:
+                df = read_table(file_path, columns)
             logger.info(f"Loaded data: {len(df)} rows, {len(df.columns)} columns from {file_path}")
             return df
         except Exception as e:
             logger.error(f"Error loading data: {str(e)}")
             raise
     
-    def clean_data(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Clean the dataset by handling missing values and outliers"""
+    def iter_chunks(self, file_path: str, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                    columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """Stream a CSV, Parquet or Arrow file in chunks of chunk_rows rows"""
+        return iter_table_chunks(file_path, chunk_rows, columns)
+    
+    def clean_data(self, df: pd.DataFrame, use_fitted: bool = False,
+                   deduplicator: Optional[StreamingDeduplicator] = None) -> pd.DataFrame:
+        """Clean the dataset by handling missing values and outliers
+        
+        Medians come from one pass over the raw numeric columns
+        with missing values, and each categorical column is factorized once
+        (its codes give both the missing rows and the mode). The IQR
+        quartiles of the outlier columns are taken after filling and
+        deduplication, from one more quantile pass. With
+        ``use_fitted`` the fill values and outlier bounds set by
+        fit_statistics are used instead, so chunks of a larger dataset are
+        cleaned consistently (see clean_chunks). Duplicate rows are found
+        by 64-bit row hash; a shared ``deduplicator`` also drops rows seen
+        in earlier chunks.
+        """
         logger.info("Starting data cleaning...")
         
         # Create a copy to avoid modifying original
         clean_df = df.copy()
         
         # Handle missing values
-        numeric_columns = clean_df.select_dtypes(include=[np.number]).columns
+        numeric_columns = list(clean_df.select_dtypes(include=[np.number]).columns)
         categorical_columns = clean_df.select_dtypes(include=['object']).columns
+        outlier_columns = [col for col in OUTLIER_COLUMNS if col in numeric_columns]
+        
+        numeric_values = clean_df[numeric_columns].to_numpy(dtype=np.float64)
+        missing = np.isnan(numeric_values).any(axis=0)
+        if not use_fitted and missing.any():
+            # Medians of all columns with missing values in a single pass
+            medians = np.nanmedian(numeric_values[:, missing], axis=0)
+            for col, median in zip(np.asarray(numeric_columns)[missing], medians):
+                self.fill_values[col] = float(median)
         
         # Fill numeric missing values with median
-        for col in numeric_columns:
-            if clean_df[col].isnull().any():
-                median_val = clean_df[col].median()
-                clean_df[col].fillna(median_val, inplace=True)
+        for col, values, has_missing in zip(numeric_columns, numeric_values.T, missing):
+            if has_missing:
+                median_val = self.fill_values[col]
+                clean_df[col] = np.where(np.isnan(values), median_val, values)
                 logger.info(f"Filled {col} missing values with median: {median_val}")
         
         # Fill categorical missing values with mode
         for col in categorical_columns:
-            if clean_df[col].isnull().any():
-                mode_val = clean_df[col].mode().iloc[0] if not clean_df[col].mode().empty else 'Unknown'
-                clean_df[col].fillna(mode_val, inplace=True)
+            codes, uniques = pd.factorize(clean_df[col])
+            if codes.min(initial=0) < 0:
+                if use_fitted:
+                    mode_val = self.fill_values.get(col, 'Unknown')
+                else:
+                    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+                    # Smallest of the most frequent values, as Series.mode() orders them
+                    mode_val = min(uniques[counts == counts.max()]) if len(uniques) else 'Unknown'
+                    self.fill_values[col] = mode_val
+                clean_df[col] = np.where(codes < 0, mode_val, clean_df[col].to_numpy(dtype=object))
                 logger.info(f"Filled {col} missing values with mode: {mode_val}")
         
         # Remove duplicates
-        initial_rows = len(clean_df)
-        clean_df.drop_duplicates(inplace=True)
-        removed_duplicates = initial_rows - len(clean_df)
+        if deduplicator is None:
+            deduplicator = StreamingDeduplicator()
+        duplicated = deduplicator.duplicated(clean_df)
+        removed_duplicates = int(duplicated.sum())
         if removed_duplicates > 0:
+            clean_df = clean_df[~duplicated]
             logger.info(f"Removed {removed_duplicates} duplicate rows")
         
-        # Handle outliers using IQR method for key numeric fields
-        outlier_columns = ['person_income', 'loan_amnt', 'loan_int_rate']
-        for col in outlier_columns:
-            if col in clean_df.columns:
-                Q1 = clean_df[col].quantile(0.25)
-                Q3 = clean_df[col].quantile(0.75)
-                IQR = Q3 - Q1
-                lower_bound = Q1 - 1.5 * IQR
-                upper_bound = Q3 + 1.5 * IQR
-                
-                outliers_count = ((clean_df[col] < lower_bound) | (clean_df[col] > upper_bound)).sum()
-                if outliers_count > 0:
-                    # Cap outliers instead of removing them
-                    clean_df[col] = np.clip(clean_df[col], lower_bound, upper_bound)
-                    logger.info(f"Capped {outliers_count} outliers in {col}")
+        # Cap outliers (IQR method) instead of removing them; quartiles of the filled, deduplicated rows
+        if not use_fitted and outlier_columns:
+            q1, q3 = np.quantile(clean_df[outlier_columns].to_numpy(dtype=np.float64), [0.25, 0.75], axis=0)
+            lower, upper = iqr_bounds(q1, q3)
+            for i, col in enumerate(outlier_columns):
+                self.clip_bounds[col] = (float(lower[i]), float(upper[i]))
+        outlier_columns = [col for col in outlier_columns if col in self.clip_bounds]
+        if outlier_columns:
+            lower_bound = pd.Series({col: self.clip_bounds[col][0] for col in outlier_columns})
+            upper_bound = pd.Series({col: self.clip_bounds[col][1] for col in outlier_columns})
+            values = clean_df[outlier_columns]
+            outliers_count = (values.lt(lower_bound) | values.gt(upper_bound)).sum()
+            clean_df[outlier_columns] = values.clip(lower_bound, upper_bound, axis=1)
+            for col, count in outliers_count[outliers_count > 0].items():
+                logger.info(f"Capped {count} outliers in {col}")
         
         logger.info(f"Data cleaning completed. Final shape: {clean_df.shape}")
         return clean_df
     
+    def collect_statistics(self, chunks: Iterable[pd.DataFrame], k: int = DEFAULT_SKETCH_K) -> StreamingStatistics:
+        """One pass over a stream of chunks: mergeable quantile sketches and category counts
+        
+        Run per shard (or per client); the results merge with
+        StreamingStatistics.merged and are passed to fit_statistics.
+        """
+        stats = StreamingStatistics(k)
+        for chunk in chunks:
+            stats.update(chunk)
+        return stats
+    
+    def fit_statistics(self, stats: StreamingStatistics):
+        """Set fill values (running medians and modes) and outlier bounds from streaming statistics
+        
+        As in clean_data, outlier quartiles are those of the filled column:
+        the missing rows enter the sketch as copies of the median. Unlike
+        clean_data, duplicates are not excluded.
+        """
+        quartiles = stats.quantiles([0.25, 0.5, 0.75])
+        for col, (q1, median, q3) in quartiles.items():
+            self.fill_values[col] = float(median)
+            if col in OUTLIER_COLUMNS:
+                sketch = stats.sketches[col]
+                n_missing = stats.rows - sketch.n
+                if n_missing > 0 and np.isfinite(median):
+                    filled = KLLSketch.from_dict(sketch.to_dict(), seed=0)
+                    for start in range(0, n_missing, DEFAULT_CHUNK_ROWS):
+                        filled.update(np.full(min(DEFAULT_CHUNK_ROWS, n_missing - start), median))
+                    q1, q3 = filled.quantiles([0.25, 0.75])
+                lower, upper = iqr_bounds(q1, q3)
+                self.clip_bounds[col] = (float(lower), float(upper))
+        self.fill_values.update(stats.modes())
+        logger.info(f"Fitted cleaning statistics from {stats.rows} rows ({stats.size} sketch items)")
+    
+    def clean_chunks(self, chunks: Iterable[pd.DataFrame], stats: Optional[StreamingStatistics] = None
+                     ) -> Iterator[pd.DataFrame]:
+        """Clean a chunked dataset out of core with statistics fitted on the whole stream
+        
+        ``stats`` (e.g. merged client sketches) is applied first if given.
+        Duplicates are dropped across the whole stream, keeping one 64-bit
+        hash per distinct row.
+        """
+        if stats is not None:
+            self.fit_statistics(stats)
+        deduplicator = StreamingDeduplicator()
+        for chunk in chunks:
+            yield self.clean_data(chunk, use_fitted=True, deduplicator=deduplicator)
+        if deduplicator.duplicates:
+            logger.info(f"Removed {deduplicator.duplicates} duplicate rows of {deduplicator.rows}")
+    
     def engineer_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """Create new features from existing data"""
         logger.info("Starting feature engineering...")
@@ -142,31 +256,33 @@ class DataPreprocessor:
         return feature_df
     
     def encode_categorical_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Encode categorical variables"""
+        """Encode categorical variables
+        
+        Codes match ``LabelEncoder`` (sorted classes). Fitted columns are
+        mapped through categorical codes in one pass; unseen categories get
+        code 0 (the first class).
+        """
         logger.info("Encoding categorical features...")
         
         encoded_df = df.copy()
         categorical_columns = encoded_df.select_dtypes(include=['object']).columns
         
         for col in categorical_columns:
+            values = encoded_df[col].astype(str)
             if col not in self.encoders:
+                codes, classes = pd.factorize(values, sort=True)
                 self.encoders[col] = LabelEncoder()
-                encoded_df[col] = self.encoders[col].fit_transform(encoded_df[col].astype(str))
-                logger.info(f"Encoded {col}: {len(self.encoders[col].classes_)} unique values")
+                self.encoders[col].classes_ = np.asarray(classes, dtype=object)
+                encoded_df[col] = codes
+                logger.info(f"Encoded {col}: {len(classes)} unique values")
             else:
-                # Handle unseen categories
-                unique_values = encoded_df[col].unique()
-                known_values = set(self.encoders[col].classes_)
-                new_values = set(unique_values) - known_values
-                
-                if new_values:
-                    logger.warning(f"New categories found in {col}: {new_values}")
+                codes = pd.Categorical(values, categories=self.encoders[col].classes_).codes.astype(np.int64)
+                unseen = codes < 0
+                if unseen.any():
+                    logger.warning(f"New categories found in {col}: {set(values[unseen].unique())}")
                     # Assign new categories to a default value (first class)
-                    encoded_df[col] = encoded_df[col].map(
-                        lambda x: 0 if x not in known_values else self.encoders[col].transform([x])[0]
-                    )
-                else:
-                    encoded_df[col] = self.encoders[col].transform(encoded_df[col].astype(str))
+                    codes[unseen] = 0
+                encoded_df[col] = codes
         
         return encoded_df
     
@@ -207,6 +323,28 @@ class DataPreprocessor:
         
         return X, y
     
+    def export_pipeline(self, df: pd.DataFrame, feature_columns: Optional[List[str]] = None) -> PreprocessingPipeline:
+        """Fitted preprocessing as a saveable pipeline for serving
+        
+        Uses the fill values and clip bounds from clean_data, the scalers and
+        the category maps of the encoders; the medians of features clean_data
+        did not fill are computed from ``df`` (the encoded, unscaled frame).
+        """
+        category_maps = {col: [str(c) for c in encoder.classes_] for col, encoder in self.encoders.items()}
+        # Categorical fills (modes) are stored as their codes
+        fill_values = {
+            col: category_maps[col].index(str(value)) if col in category_maps else value
+            for col, value in self.fill_values.items()
+        }
+        return PreprocessingPipeline.fit(
+            df, feature_columns or self.feature_columns,
+            clip_columns=list(self.clip_bounds),
+            fill_values=fill_values,
+            clip_bounds=self.clip_bounds,
+            scale_params={col: (float(scaler.mean_[0]), float(scaler.scale_[0])) for col, scaler in self.scalers.items()},
+            category_maps=category_maps
+        )
+    
     def split_data(self, X: pd.DataFrame, y: pd.Series, 
                    test_size: float = 0.2, random_state: int = 42) -> Tuple[pd.DataFrame, pd.DataFrame, pd.Series, pd.Series]:
         """Split data into training and testing sets"""
@@ -241,9 +379,9 @@ def load_and_preprocess_data(file_path: str, target_column: str = 'target') -> T
     return X, y
 
 def save_processed_data(df: pd.DataFrame, output_path: str):
-    """Save processed data to CSV"""
+    """Save processed data as CSV, Parquet or Arrow (by extension)"""
     try:
-        df.to_csv(output_path, index=False)
+        write_table(df, output_path)
         logger.info(f"Processed data saved to: {output_path}")
     except Exception as e:
         logger.error(f"Error saving processed data: {str(e)}")
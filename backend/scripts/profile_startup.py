@@ -0,0 +1,118 @@
+# backend/scripts/profile_startup.py
+"""
+API Cold-Start Profile
+
+Reports where import time goes for ``main`` (via ``python -X importtime``)
+and how long a fresh uvicorn process takes until /health/live and
+/health/ready answer. Run from the backend directory:
+    python scripts/profile_startup.py imports
+    python scripts/profile_startup.py serve --port 8765
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+backend_path = Path(__file__).parent.parent
+
+# Packages that the serving process should not import at startup
+HEAVY_PACKAGES = ("pandas", "sklearn", "lightgbm", "shap", "joblib", "firebase_admin", "google")
+
+
+def import_profile(module: str = "main") -> List[Tuple[str, int, int]]:
+    """(module, self_us, cumulative_us) for every module imported by ``import <module>``"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-W", "ignore", "-c", f"import {module}"],
+        cwd=backend_path, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def report_imports(args):
+    rows = import_profile(args.module)
+    total_us = max(cumulative for _, _, cumulative in rows)
+
+    by_package: Dict[str, int] = defaultdict(int)
+    for name, self_us, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+
+    print(f"\nimport {args.module}: {total_us / 1e6:.3f}s, {len(rows)} modules")
+    print("-" * 64)
+    print(f"{'top-level package':<32} {'self time':>12} {'share':>8}")
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:<32} {self_us / 1000:>10.1f}ms {self_us / total_us:>8.1%}")
+
+    heavy = sorted({name.split(".")[0] for name, _, _ in rows} & set(HEAVY_PACKAGES))
+    print(f"\nheavy packages imported at startup: {', '.join(heavy) if heavy else 'none'}")
+
+
+def wait_for(url: str, deadline: float) -> float:
+    """Poll url until it answers 200; return the time it did"""
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter()
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f"{url} did not answer in time")
+
+
+def report_serve(args):
+    base_url = f"http://127.0.0.1:{args.port}"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-W", "ignore", "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=backend_path
+    )
+    try:
+        deadline = start + args.timeout
+        live = wait_for(f"{base_url}/health/live", deadline)
+        ready = wait_for(f"{base_url}/health/ready", deadline)
+        with urllib.request.urlopen(f"{base_url}/health/ready", timeout=1) as response:
+            state = response.read().decode()
+    finally:
+        server.terminate()
+        server.wait()
+
+    print("\nCold start (process spawn until probe answers 200)")
+    print("-" * 64)
+    print(f"{'/health/live':<32} {(live - start) * 1000:>10.0f}ms")
+    print(f"{'/health/ready':<32} {(ready - start) * 1000:>10.0f}ms")
+    print(state)
+
+
+def main():
+    """Main execution function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    imports = subparsers.add_parser("imports", help="Import-time breakdown by top-level package")
+    imports.add_argument("--module", default="main")
+    imports.add_argument("--top", type=int, default=15)
+    imports.set_defaults(func=report_imports)
+
+    serve = subparsers.add_parser("serve", help="Time until liveness and readiness probes answer")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--timeout", type=float, default=60.0)
+    serve.set_defaults(func=report_serve)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
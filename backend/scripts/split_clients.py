@@ -7,11 +7,19 @@ to simulate a federated learning environment.
 """
 
 import pandas as pd
-import numpy as np
 import os
+import sys
 from pathlib import Path
 import logging
-from typing import List
+from typing import List, Optional
+
+# Add backend to path for imports when run as a script
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.client_partitioning import DEFAULT_ALPHA, partition_clients, write_shards
+from scripts.data_ingestion import (
+    DEFAULT_CHUNK_ROWS, StreamingDeduplicator, TableAppender, iter_table_chunks, shard_path, stream_partition_csv
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -21,19 +29,37 @@ def split_data_for_clients(
     input_csv: str,
     output_dir: str,
     num_clients: int = 5,
-    random_state: int = 42
+    random_state: int = 42,
+    chunk_rows: Optional[int] = None,
+    key_column: Optional[str] = None,
+    output_format: str = 'csv',
+    dedup: bool = False,
+    scheme: str = 'iid',
+    alpha: float = DEFAULT_ALPHA
 ) -> List[str]:
     """
     Split the main dataset into client datasets for federated learning simulation.
 
     Args:
-        input_csv: Full path to the main processed dataset.
+        input_csv: Full path to the main processed dataset (CSV, Parquet or Arrow).
         output_dir: Full path to save client datasets.
         num_clients: Number of clients to simulate.
         random_state: Random seed for reproducibility.
+        chunk_rows: Stream the file in chunks of this many rows and hash-partition
+            them (bounded memory, for extracts larger than RAM) instead of
+            loading the whole frame; IID split only.
+        key_column: Column hashed to pick a row's client (e.g. customer_id keeps a
+            customer on one client); default person_id or customer_id when
+            loading the whole frame, the whole row when streaming.
+        output_format: File format of the client datasets: 'csv', 'parquet' or 'arrow'.
+        dedup: Drop repeated rows, by 64-bit row hash; in streaming mode the
+            duplicates are counted per client shard.
+        scheme: 'iid', 'label_skew' (Dirichlet label mix per client) or
+            'quantity_skew' (Dirichlet client sizes).
+        alpha: Dirichlet concentration of the skewed schemes (smaller: more skew).
 
     Returns:
-        List of paths to created client dataset CSVs.
+        List of paths to created client dataset files.
     """
     try:
         # Check if input file exists
@@ -44,37 +70,48 @@ def split_data_for_clients(
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
 
+        if chunk_rows:
+            if scheme != 'iid':
+                raise ValueError(f"Streaming split supports only the iid scheme, got {scheme!r}")
+            logger.info(f"Streaming {input_csv} in chunks of {chunk_rows} rows")
+            shards = stream_partition_csv(input_csv, output_dir, num_clients, key_column, chunk_rows, random_state,
+                                          output_format, dedup)
+            for shard in shards:
+                logger.info(f"✅ Client {shard['client_id']}: {shard['rows']} rows saved -> {shard['path']}")
+                if dedup:
+                    logger.info(f"   🧹 Duplicates dropped: {shard['duplicates_dropped']}")
+                logger.info(f"   🎯 Target distribution: {shard['target_distribution']}")
+            return [shard['path'] for shard in shards]
+
         logger.info(f"Loading dataset from {input_csv}")
-        df = pd.read_csv(input_csv)
+        df = pd.concat(iter_table_chunks(input_csv), ignore_index=True)
         logger.info(f"📊 Loaded dataset: {len(df)} rows, {len(df.columns)} columns.")
 
-        # Shuffle data
-        df_shuffled = df.sample(frac=1, random_state=random_state).reset_index(drop=True)
-        logger.info("🔀 Shuffled dataset for random distribution.")
+        if dedup:
+            deduplicator = StreamingDeduplicator(seed=random_state)
+            df = deduplicator.drop_duplicates(df)
+            logger.info(f"🧹 Dropped {deduplicator.duplicates} duplicate rows.")
 
-        # Split into N parts
-        client_files = []
-        client_datasets = np.array_split(df_shuffled, num_clients)
-
-        for i, client_df in enumerate(client_datasets, 1):
-            client_filename = f"client_{i}.csv"
-            client_filepath = output_path / client_filename
-            client_df.to_csv(client_filepath, index=False)
+        # Assign rows by key hash and gather each client's rows once
+        partition = partition_clients(df, num_clients, scheme, key_column, alpha=alpha, seed=random_state)
+        client_datasets = partition.frames(df)
+        logger.info(f"🔀 Partitioned dataset ({scheme}).")
 
+        client_files = write_shards(client_datasets, output_dir, output_format)
+        for i, (client_df, client_filepath) in enumerate(zip(client_datasets, client_files), 1):
             logger.info(f"✅ Client {i}: {len(client_df)} rows saved -> {client_filepath}")
             if 'target' in client_df.columns:
                 logger.info(f"   🎯 Target distribution: {client_df['target'].value_counts().to_dict()}")
 
-            client_files.append(str(client_filepath))
-
-        print_split_summary(df, client_datasets, output_dir)
+        print_split_summary(df, client_datasets, output_dir, output_format)
         return client_files
 
     except Exception as e:
         logger.error(f"❌ Error splitting data: {str(e)}")
         raise
 
-def print_split_summary(original_df: pd.DataFrame, client_datasets: List[pd.DataFrame], output_dir: str):
+def print_split_summary(original_df: pd.DataFrame, client_datasets: List[pd.DataFrame], output_dir: str,
+                        output_format: str = 'csv'):
     """Prints a summary of the client split results."""
     print("\n" + "="*60)
     print("📈 CLIENT DATA SPLITTING SUMMARY")
@@ -98,24 +135,24 @@ def print_split_summary(original_df: pd.DataFrame, client_datasets: List[pd.Data
 
     print("📂 Files Created:")
     for i in range(len(client_datasets)):
-        print(f"  - client_{i+1}.csv")
+        print(f"  - {shard_path(output_dir, i + 1, output_format).name}")
 
     print("="*60 + "\n")
 
-def validate_client_data(output_dir: str, num_clients: int) -> bool:
-    """Validates that each client CSV file was created successfully."""
+def validate_client_data(output_dir: str, num_clients: int, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                         file_format: str = 'csv') -> bool:
+    """Validates that each client file was created successfully."""
     try:
-        output_path = Path(output_dir)
         total_rows = 0
 
         for i in range(1, num_clients + 1):
-            filepath = output_path / f"client_{i}.csv"
+            filepath = shard_path(output_dir, i, file_format)
             if not filepath.exists():
                 logger.error(f"❌ Missing file: {filepath}")
                 return False
-            df = pd.read_csv(filepath)
-            logger.info(f"✅ Client {i} file valid with {len(df)} rows.")
-            total_rows += len(df)
+            rows = sum(len(chunk) for chunk in iter_table_chunks(str(filepath), chunk_rows))
+            logger.info(f"✅ Client {i} file valid with {rows} rows.")
+            total_rows += rows
 
         logger.info(f"✅ All client files present. Total rows in split: {total_rows}")
         return True
@@ -124,26 +161,30 @@ def validate_client_data(output_dir: str, num_clients: int) -> bool:
         logger.error(f"❌ Error validating client data: {str(e)}")
         return False
 
-def merge_client_data(client_dir: str, output_file: str, num_clients: int) -> int:
-    """Merges client CSVs back into a single file to verify."""
-    try:
-        client_path = Path(client_dir)
-        combined = []
+def merge_client_data(client_dir: str, output_file: str, num_clients: int,
+                      chunk_rows: int = DEFAULT_CHUNK_ROWS, file_format: str = 'csv') -> int:
+    """Merges client files back into a single file to verify (streamed chunk by chunk).
 
-        for i in range(1, num_clients + 1):
-            file = client_path / f"client_{i}.csv"
-            if file.exists():
-                df = pd.read_csv(file)
-                combined.append(df)
-
-        if combined:
-            merged_df = pd.concat(combined, ignore_index=True)
-            merged_df.to_csv(output_file, index=False)
-            logger.info(f"🧩 Merged file created: {output_file} with {len(merged_df)} rows.")
-            return len(merged_df)
+    The merged file's format follows its extension.
+    """
+    try:
+        merged = TableAppender(Path(output_file))
+
+        try:
+            for i in range(1, num_clients + 1):
+                file = shard_path(client_dir, i, file_format)
+                if file.exists():
+                    for chunk in iter_table_chunks(str(file), chunk_rows):
+                        merged.append(chunk)
+        finally:
+            merged.close()
+        merged_rows = merged.rows
+
+        if merged_rows:
+            logger.info(f"🧩 Merged file created: {output_file} with {merged_rows} rows.")
         else:
             logger.warning("⚠️ No files found to merge.")
-            return 0
+        return merged_rows
 
     except Exception as e:
         logger.error(f"❌ Error merging client data: {str(e)}")
@@ -155,6 +196,16 @@ if __name__ == "__main__":
     INPUT_CSV = r"F:\Atharva\flutter_projects\kredai\backend\data\processed_data.csv"
     OUTPUT_DIR = r"F:\Atharva\flutter_projects\kredai\backend\data\client_data"
     NUM_CLIENTS = 5
+    # Set to stream large extracts in chunks and hash-partition them (e.g. 100_000 rows, "customer_id")
+    CHUNK_ROWS = None
+    KEY_COLUMN = None
+    # Client file format: "csv", "parquet" or "arrow"
+    OUTPUT_FORMAT = "csv"
+    # Drop repeated rows while splitting
+    DEDUP = False
+    # Client split: "iid", "label_skew" or "quantity_skew" (Dirichlet, smaller alpha = more skew)
+    SCHEME = "iid"
+    ALPHA = 0.5
 
     print("🚀 Starting Client Data Split Script")
     print(f"👉 Input File: {INPUT_CSV}")
@@ -163,14 +214,17 @@ if __name__ == "__main__":
     print("--------------------------------------------------")
 
     try:
-        client_files = split_data_for_clients(INPUT_CSV, OUTPUT_DIR, NUM_CLIENTS)
+        client_files = split_data_for_clients(INPUT_CSV, OUTPUT_DIR, NUM_CLIENTS,
+                                              chunk_rows=CHUNK_ROWS, key_column=KEY_COLUMN,
+                                              output_format=OUTPUT_FORMAT, dedup=DEDUP,
+                                              scheme=SCHEME, alpha=ALPHA)
 
-        if validate_client_data(OUTPUT_DIR, NUM_CLIENTS):
+        if validate_client_data(OUTPUT_DIR, NUM_CLIENTS, file_format=OUTPUT_FORMAT):
             print("✅ All client files created and validated successfully.")
 
             # Merge (Optional)
             VERIFICATION_FILE = os.path.join(str(Path(OUTPUT_DIR).parent), "merged_output.csv")
-            merged_rows = merge_client_data(OUTPUT_DIR, VERIFICATION_FILE, NUM_CLIENTS)
+            merged_rows = merge_client_data(OUTPUT_DIR, VERIFICATION_FILE, NUM_CLIENTS, file_format=OUTPUT_FORMAT)
             print(f"🔄 Merged check complete. Total rows: {merged_rows}")
 
         else:
@@ -5,33 +5,274 @@ Federated Learning Simulation and Model Training Script
 This script simulates a federated learning environment by:
 1. Loading the main processed dataset
 2. Partitioning data into virtual "client" datasets
-3. Training local models on each client's data
-4. Aggregating insights into a global model
-5. Creating and saving SHAP explainer for interpretability
+3. Aggregating client histogram updates into a global model (federated
+   histogram GBDT), or, as a baseline, training local models on each
+   client's data and retraining on the pooled data
+4. Creating and saving SHAP explainer for interpretability
 """
 
+import argparse
+import multiprocessing
 import pandas as pd
 import numpy as np
 import os
+import sys
 import joblib
 from pathlib import Path
 import logging
-from typing import List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
 from lightgbm import LGBMClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, classification_report, roc_auc_score
 import shap
 
+# Add backend to path for imports when run as a script
+sys.path.append(str(Path(__file__).parent.parent))
+
+from models.federated_gbdt import FederatedClient, FederatedHistogramGBDT
+from scripts.client_partitioning import DEFAULT_ALPHA, PARTITION_SCHEMES, partition_clients, write_shards
+from scripts.data_preprocessing import OUTLIER_COLUMNS
+from scripts.data_ingestion import (
+    DEFAULT_CHUNK_ROWS, FORMAT_EXTENSIONS, ID_COLUMNS, iter_table_chunks, table_columns
+)
+from models.feature_schema import DEFAULT_FEATURE_SCHEMA, SCHEMA_FILENAME
+from models.model_artifact import MODEL_ARTIFACTS_DIRNAME
+from models.preprocessing_pipeline import PIPELINE_FILENAME, PreprocessingPipeline
+from models.quantile_sketch import StreamingStatistics
+from models.tree_ensemble import TreeEnsemble
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+AGGREGATION_MODES = ("histogram", "centralized")
+# How preprocessing statistics are fitted: exact quantiles of the pooled data,
+# or quantile sketches computed by each client and merged
+PREPROCESSING_STATS = ("exact", "sketch")
+
+DEFAULT_DATA_PATH = r"F:\Atharva\flutter_projects\kredai\backend\data\processed_data.csv"
+
+
+def stratify_labels(y):
+    """Labels to stratify a split by, or None when a class has too few rows (skewed clients)"""
+    return y if np.unique(y, return_counts=True)[1].min(initial=len(y)) >= 2 else None
+
+
+def fit_client_model(X_client, y_client, model_params: dict, feature_names: Optional[List[str]] = None) -> Tuple[LGBMClassifier, dict]:
+    """Fit one client's local model on a train split and evaluate it on the held-out rows"""
+    # Split client data for local validation
+    X_train, X_val, y_train, y_val = train_test_split(
+        X_client, y_client, test_size=0.2, random_state=42, stratify=stratify_labels(y_client)
+    )
+    
+    # Train local model
+    client_model = LGBMClassifier(**model_params)
+    client_model.fit(X_train, y_train, feature_name=feature_names or 'auto')
+    
+    # Evaluate local model
+    y_pred = client_model.predict(X_val)
+    y_prob = client_model.predict_proba(X_val)[:, 1]
+    
+    return client_model, {
+        'accuracy': accuracy_score(y_val, y_pred),
+        # AUC is undefined when a label-skewed client holds out a single class
+        'auc': roc_auc_score(y_val, y_prob) if len(np.unique(y_val)) > 1 else float('nan'),
+        'train_samples': len(X_train),
+        'val_samples': len(X_val)
+    }
+
+
+class SharedClientData:
+    """All clients' features and targets in one shared-memory block
+    
+    Rows are stacked client after client as float64 with the target in the
+    last column; ``client(i)`` returns zero-copy views of one client's rows.
+    """
+    
+    def __init__(self, shm: shared_memory.SharedMemory, offsets: List[int], n_features: int):
+        self.shm = shm
+        self.offsets = offsets
+        self.matrix = np.ndarray((offsets[-1], n_features + 1), dtype=np.float64, buffer=shm.buf)
+    
+    @classmethod
+    def create(cls, blocks: List[Tuple[np.ndarray, np.ndarray]]) -> "SharedClientData":
+        offsets = [0]
+        for X, _ in blocks:
+            offsets.append(offsets[-1] + len(X))
+        n_features = blocks[0][0].shape[1]
+        shm = shared_memory.SharedMemory(create=True, size=max(1, offsets[-1] * (n_features + 1) * 8))
+        shared = cls(shm, offsets, n_features)
+        for (X, y), start, end in zip(blocks, offsets, offsets[1:]):
+            shared.matrix[start:end, :-1] = X
+            shared.matrix[start:end, -1] = y
+        return shared
+    
+    @classmethod
+    def attach(cls, spec: Tuple[str, List[int], int]) -> "SharedClientData":
+        name, offsets, n_features = spec
+        return cls(shared_memory.SharedMemory(name=name), offsets, n_features)
+    
+    def spec(self) -> Tuple[str, List[int], int]:
+        """What a worker process needs to attach"""
+        return self.shm.name, self.offsets, self.matrix.shape[1] - 1
+    
+    def client(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        rows = self.matrix[self.offsets[i]:self.offsets[i + 1]]
+        return rows[:, :-1], rows[:, -1].astype(np.int64)
+    
+    def close(self):
+        self.matrix = None
+        self.shm.close()
+    
+    def unlink(self):
+        self.shm.unlink()
+
+
+# Shared client data attached once per training worker process
+_worker_client_data: Optional[SharedClientData] = None
+
+
+def _attach_client_data(spec: Tuple[str, List[int], int]):
+    global _worker_client_data
+    _worker_client_data = SharedClientData.attach(spec)
+
+
+def _fit_shared_client(i: int, model_params: dict, feature_names: List[str]) -> Tuple[LGBMClassifier, dict]:
+    X_client, y_client = _worker_client_data.client(i)
+    return fit_client_model(X_client, y_client, model_params, feature_names)
+
+
+def _serve_federated_clients(conn, spec: Tuple[str, List[int], int], indices: List[int]):
+    """Worker process: host federated clients on views of the shared rows and answer the server's calls"""
+    data = SharedClientData.attach(spec)
+    clients = [FederatedClient(*data.client(i)) for i in indices]
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            method, args = message
+            try:
+                conn.send((True, [getattr(client, method)(*args) for client in clients]))
+            except Exception as e:
+                conn.send((False, e))
+    finally:
+        # The clients' row views must go before the shared block is closed
+        del clients
+        data.close()
+        conn.close()
+
+
+class ClientProcessGroup:
+    """Federated clients hosted in worker processes, a client group for FederatedHistogramGBDT
+    
+    Client rows are written once into a SharedClientData block; each worker
+    builds FederatedClients on views of its clients' rows and keeps their
+    scores and leaf rows between calls. ``call`` sends a request to every
+    worker before collecting any answer, so the clients' histograms and
+    score updates are computed concurrently.
+    """
+    
+    def __init__(self, blocks: List[Tuple[np.ndarray, np.ndarray]], n_workers: int):
+        self.n_clients = len(blocks)
+        n_workers = max(1, min(n_workers, self.n_clients))
+        self._assignments = [list(range(w, self.n_clients, n_workers)) for w in range(n_workers)]
+        self._connections = []
+        self._processes = []
+        self.shared = SharedClientData.create(blocks)
+        # Spawned like the client-model workers: forking after LightGBM's OpenMP pool started can hang
+        context = multiprocessing.get_context("spawn")
+        try:
+            for indices in self._assignments:
+                parent_conn, child_conn = context.Pipe()
+                process = context.Process(target=_serve_federated_clients,
+                                          args=(child_conn, self.shared.spec(), indices), daemon=True)
+                process.start()
+                child_conn.close()
+                self._connections.append(parent_conn)
+                self._processes.append(process)
+        except BaseException:
+            self.close()
+            raise
+    
+    def __len__(self) -> int:
+        return self.n_clients
+    
+    def call(self, method: str, *args) -> list:
+        """Ask every client to run a FederatedClient method; their answers in client order"""
+        for conn in self._connections:
+            conn.send((method, args))
+        answers = [None] * self.n_clients
+        error = None
+        # Drain every worker before raising, so the pipes stay in step
+        for conn, indices in zip(self._connections, self._assignments):
+            ok, result = conn.recv()
+            if not ok:
+                error = error or result
+                continue
+            for i, answer in zip(indices, result):
+                answers[i] = answer
+        if error is not None:
+            raise error
+        return answers
+    
+    def close(self):
+        for conn in self._connections:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for process in self._processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        for conn in self._connections:
+            conn.close()
+        self._connections, self._processes = [], []
+        self.shared.close()
+        self.shared.unlink()
+    
+    def __enter__(self) -> "ClientProcessGroup":
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
 class FederatedLearningSimulator:
-    def __init__(self, data_path: str = r"F:\Atharva\flutter_projects\kredai\backend\data\processed_data.csv", n_clients: int = 5):
+    def __init__(self, data_path: str = DEFAULT_DATA_PATH, n_clients: int = 5,
+                 models_dir: str = "trained_models", n_jobs: int = -1, client_workers: int = 0,
+                 aggregation: str = "histogram", client_format: str = "csv",
+                 preprocessing_stats: str = "exact", partition_scheme: str = "iid",
+                 partition_alpha: float = DEFAULT_ALPHA):
+        if aggregation not in AGGREGATION_MODES:
+            raise ValueError(f"Unknown aggregation {aggregation!r}, expected one of {AGGREGATION_MODES}")
+        if preprocessing_stats not in PREPROCESSING_STATS:
+            raise ValueError(f"Unknown preprocessing statistics {preprocessing_stats!r}, "
+                             f"expected one of {PREPROCESSING_STATS}")
+        if partition_scheme not in PARTITION_SCHEMES:
+            raise ValueError(f"Unknown partition scheme {partition_scheme!r}, expected one of {PARTITION_SCHEMES}")
+        if client_format not in FORMAT_EXTENSIONS:
+            raise ValueError(f"Unknown client data format {client_format!r}, expected one of {tuple(FORMAT_EXTENSIONS)}")
         self.data_path = data_path
         self.n_clients = n_clients
-        self.models_dir = Path("trained_models")
-        self.models_dir.mkdir(exist_ok=True)
+        # Processes running clients concurrently, for local models (centralized baseline) and for
+        # histogram and score updates (federated training); 0 or 1: one client after another
+        self.client_workers = client_workers
+        # "histogram": global model built from client histogram updates; "centralized": pooled-data baseline
+        self.aggregation = aggregation
+        # File format of the saved client partitions (csv, parquet or arrow)
+        self.client_format = client_format
+        # "exact": pipeline statistics from the pooled data; "sketch": merged client quantile sketches
+        self.preprocessing_stats = preprocessing_stats
+        # How rows are spread over clients ("iid", "label_skew", "quantity_skew") and the Dirichlet skew
+        self.partition_scheme = partition_scheme
+        self.partition_alpha = partition_alpha
+        self.models_dir = Path(models_dir)
+        self.models_dir.mkdir(parents=True, exist_ok=True)
+        self.schema = DEFAULT_FEATURE_SCHEMA
         
         # Model configuration
         self.model_params = {
@@ -44,7 +285,17 @@ class FederatedLearningSimulator:
             'bagging_fraction': 0.8,
             'bagging_freq': 5,
             'verbose': 0,
-            'random_state': 42
+            'random_state': 42,
+            'n_jobs': n_jobs
+        }
+        
+        # Federated histogram GBDT configuration (LightGBM defaults for the shared settings)
+        self.federated_params = {
+            'n_estimators': 100,
+            'learning_rate': self.model_params['learning_rate'],
+            'num_leaves': self.model_params['num_leaves'],
+            'max_bins': 64,
+            'min_child_samples': 20
         }
         
     def load_and_prepare_data(self) -> pd.DataFrame:
@@ -54,77 +305,87 @@ class FederatedLearningSimulator:
         if not os.path.exists(self.data_path):
             raise FileNotFoundError(f"Dataset not found at {self.data_path}")
     
-        df = pd.read_csv(self.data_path)
-        logger.info(f"Loaded dataset with {len(df)} records and {len(df.columns)} columns")
-
-        # 🎯 Map 0.0 or 0.21 → class 0, 1.0 → class 1
-        df['target'] = df['target'].map({0.0: 0, 0.21: 0, 1.0: 1})
-        df.dropna(subset=['target'], inplace=True)  # In case target mapping fails
-        df['target'] = df['target'].astype(int)
-
         # ✅ Target column check (informational, can be kept)
-        if 'target' not in df.columns:
+        header = table_columns(self.data_path)
+        if 'target' not in header:
             raise ValueError("Target column 'target' not found in dataset")
+        
+        # Stream only the identifiers, model features and target (CSV, Parquet or Arrow)
+        columns = [col for col in header if col in ID_COLUMNS or col in self.schema.feature_names] + ['target']
+        chunks = []
+        for chunk in iter_table_chunks(self.data_path, DEFAULT_CHUNK_ROWS, columns):
+            # 🎯 Map 0.0 or 0.21 → class 0, 1.0 → class 1
+            chunk['target'] = chunk['target'].map({0.0: 0, 0.21: 0, 1.0: 1})
+            chunks.append(chunk.dropna(subset=['target']))  # In case target mapping fails
+        df = pd.concat(chunks, ignore_index=True)
+        df['target'] = df['target'].astype(int)
+        logger.info(f"Loaded dataset with {len(df)} records and {len(df.columns)} of {len(header)} columns")
 
         return df
     
     def partition_data_for_clients(self, df: pd.DataFrame) -> List[pd.DataFrame]:
-        """Partition dataset into client datasets for federated simulation"""
-        logger.info(f"Partitioning data into {self.n_clients} client datasets")
+        """Partition dataset into client datasets for federated simulation
         
-        # Shuffle data for random distribution
-        df_shuffled = df.sample(frac=1, random_state=42).reset_index(drop=True)
+        Rows are assigned by a hash of person_id (or customer_id), so the
+        split is deterministic and keeps a person on one client; each
+        client's rows are gathered once, without shuffling the full frame.
+        """
+        logger.info(f"Partitioning data into {self.n_clients} client datasets ({self.partition_scheme})")
         
-        # Create client partitions
-        client_datasets = []
-        partition_size = len(df_shuffled) // self.n_clients
+        partition = partition_clients(df, self.n_clients, self.partition_scheme, alpha=self.partition_alpha, seed=42)
+        client_datasets = partition.frames(df)
         
-        for i in range(self.n_clients):
-            start_idx = i * partition_size
-            if i == self.n_clients - 1:  # Last client gets remaining data
-                end_idx = len(df_shuffled)
-            else:
-                end_idx = (i + 1) * partition_size
-                
-            client_data = df_shuffled.iloc[start_idx:end_idx].copy()
-            client_datasets.append(client_data)
-            
-            # Save client data
-            client_dir = Path("data/client_data")
-            client_dir.mkdir(exist_ok=True)
-            client_data.to_csv(client_dir / f"client_{i+1}.csv", index=False)
-            
+        # Save client data
+        write_shards(client_datasets, "data/client_data", self.client_format)
+        for i, client_data in enumerate(client_datasets):
             logger.info(f"Client {i+1}: {len(client_data)} records")
             
         return client_datasets
     
+    def fit_preprocessing(self, df: pd.DataFrame,
+                          client_datasets: Optional[List[pd.DataFrame]] = None) -> PreprocessingPipeline:
+        """Fit the preprocessing pipeline (medians, IQR clip bounds) that training and serving share
+        
+        In "sketch" mode every client summarizes its own rows in quantile
+        sketches and only the merged sketches are used, as a federated
+        deployment would.
+        """
+        if self.preprocessing_stats == "sketch" and client_datasets:
+            features = [col for col in self.schema.feature_names if col in df.columns]
+            shards = [StreamingStatistics().update(client_data[features]) for client_data in client_datasets]
+            stats = StreamingStatistics.merged(shards)
+            pipeline = PreprocessingPipeline.from_statistics(stats, self.schema.feature_names, OUTLIER_COLUMNS)
+            logger.info(f"Preprocessing pipeline fitted from {len(shards)} client sketches "
+                        f"({stats.size} items for {stats.rows} records)")
+        else:
+            pipeline = PreprocessingPipeline.fit(df, self.schema.feature_names, clip_columns=OUTLIER_COLUMNS)
+            logger.info(f"Preprocessing pipeline fitted on {len(df)} records "
+                        f"({len([c for c in OUTLIER_COLUMNS if c in df.columns])} clipped features)")
+        self.schema = self.schema.with_pipeline(pipeline)
+        return pipeline
+    
     def prepare_features_and_target(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Series]:
-        """Prepare features and target variable"""
-        # Select relevant features for credit risk modeling
-        feature_cols = [
-            'person_income', 'person_emp_length', 'loan_amnt', 'loan_int_rate', 
-            'loan_percent_income', 'cb_person_cred_hist_length', 'age', 
-            'estimated_monthly_income', 'monthly_airtime_spend', 'monthly_data_usage_gb',
-            'avg_calls_per_day', 'avg_sms_per_day', 'digital_wallet_usage',
-            'monthly_digital_transactions', 'avg_transaction_amount', 
-            'social_media_activity_score', 'mobile_banking_user',
-            'digital_engagement_score', 'financial_inclusion_score',
-            'electricity_bill_avg', 'water_bill_avg', 'gas_bill_avg',
-            'total_utility_expense', 'utility_to_income_ratio', 
-            'on_time_payments_12m', 'late_payments_12m', 'credit_risk_score'
-        ]
-        
-        # Filter available features
-        available_features = [col for col in feature_cols if col in df.columns]
+        """Prepare features and target variable
+        
+        Features go through the schema's preprocessing pipeline once it is
+        fitted, exactly as requests do at serving time.
+        """
+        available_features = [col for col in self.schema.feature_names if col in df.columns]
         logger.info(f"Using {len(available_features)} features for training")
         
-        X = df[available_features].fillna(0)  # Simple imputation for demo
+        X = self.schema.transform_frame(df)
         y = df['target']
         
         return X, y
     
     def train_client_models(self, client_datasets: List[pd.DataFrame]) -> List[LGBMClassifier]:
         """Train local models for each client"""
+        if self.client_workers > 1:
+            return self.train_client_models_parallel(client_datasets)
+        return self.train_client_models_sequential(client_datasets)
+    
+    def train_client_models_sequential(self, client_datasets: List[pd.DataFrame]) -> List[LGBMClassifier]:
+        """Train the client models one after another in this process"""
         logger.info("Training local models for each client")
         
         client_models = []
@@ -136,42 +397,120 @@ class FederatedLearningSimulator:
             # Prepare client data
             X_client, y_client = self.prepare_features_and_target(client_data)
             
-            # Split client data for local validation
-            X_train, X_val, y_train, y_val = train_test_split(
-                X_client, y_client, test_size=0.2, random_state=42, stratify=y_client
-            )
-            
-            # Train local model
-            client_model = LGBMClassifier(**self.model_params)
-            client_model.fit(X_train, y_train)
-            
-            # Evaluate local model
-            y_pred = client_model.predict(X_val)
-            y_prob = client_model.predict_proba(X_val)[:, 1]
-            
-            accuracy = accuracy_score(y_val, y_pred)
-            auc = roc_auc_score(y_val, y_prob)
-            
-            client_performances.append({
-                'client_id': i+1,
-                'accuracy': accuracy,
-                'auc': auc,
-                'train_samples': len(X_train),
-                'val_samples': len(X_val)
-            })
+            client_model, performance = fit_client_model(X_client, y_client, self.model_params)
+            performance['client_id'] = i+1
             
+            client_performances.append(performance)
+            client_models.append(client_model)
+            logger.info(f"Client {i+1} - Accuracy: {performance['accuracy']:.4f}, AUC: {performance['auc']:.4f}")
+        
+        self.log_client_performance(client_performances)
+        
+        return client_models
+    
+    def train_client_models_parallel(self, client_datasets: List[pd.DataFrame]) -> List[LGBMClassifier]:
+        """Train the client models concurrently in a process pool
+        
+        Client features and targets are written once into a shared-memory
+        block; workers fit on views of their client's rows instead of
+        receiving a pickled copy, and each fit is limited to its share of
+        the cores so concurrent clients don't oversubscribe the machine.
+        """
+        n_workers = min(self.client_workers, len(client_datasets))
+        n_cpus = self.model_params['n_jobs'] if self.model_params['n_jobs'] > 0 else os.cpu_count() or 1
+        params = dict(self.model_params, n_jobs=max(1, n_cpus // n_workers))
+        logger.info(f"Training {len(client_datasets)} client models on {n_workers} workers "
+                    f"({params['n_jobs']} threads each)")
+        
+        blocks = [self.prepare_features_and_target(client_data) for client_data in client_datasets]
+        feature_names = list(blocks[0][0].columns)
+        shared = SharedClientData.create([(X.to_numpy(dtype=np.float64), y.to_numpy()) for X, y in blocks])
+        
+        try:
+            # Spawned workers: forking a process that has already run LightGBM's OpenMP pool can hang
+            with ProcessPoolExecutor(
+                max_workers=n_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_attach_client_data,
+                initargs=(shared.spec(),)
+            ) as executor:
+                results = list(executor.map(
+                    _fit_shared_client, range(len(client_datasets)), repeat(params), repeat(feature_names)
+                ))
+        finally:
+            shared.close()
+            shared.unlink()
+        
+        client_models = []
+        client_performances = []
+        for i, (client_model, performance) in enumerate(results):
+            performance['client_id'] = i+1
+            client_performances.append(performance)
             client_models.append(client_model)
-            logger.info(f"Client {i+1} - Accuracy: {accuracy:.4f}, AUC: {auc:.4f}")
+            logger.info(f"Client {i+1} - Accuracy: {performance['accuracy']:.4f}, AUC: {performance['auc']:.4f}")
+        
+        self.log_client_performance(client_performances)
         
-        # Log overall client performance
+        return client_models
+    
+    def log_client_performance(self, client_performances: List[dict]):
+        """Log overall client performance"""
         avg_accuracy = np.mean([p['accuracy'] for p in client_performances])
-        avg_auc = np.mean([p['auc'] for p in client_performances])
+        avg_auc = np.nanmean([p['auc'] for p in client_performances])
         logger.info(f"Average client performance - Accuracy: {avg_accuracy:.4f}, AUC: {avg_auc:.4f}")
+    
+    def aggregate_global_model(self, client_datasets: List[pd.DataFrame]) -> TreeEnsemble:
+        """Build the global model from client updates (federated histogram GBDT)
         
-        return client_models
+        Each client holds out 20% of its rows; the global model trains on the
+        rest through per-round histogram exchanges and is evaluated on the
+        pooled held-out rows. With ``client_workers`` > 1 the clients run in
+        worker processes (ClientProcessGroup) instead of one after another.
+        """
+        logger.info(f"Aggregating global model from {len(client_datasets)} clients")
+        
+        train_blocks = []
+        X_tests, y_tests = [], []
+        for client_data in client_datasets:
+            X_client, y_client = self.prepare_features_and_target(client_data)
+            X_train, X_test, y_train, y_test = train_test_split(
+                X_client, y_client, test_size=0.2, random_state=42, stratify=stratify_labels(y_client)
+            )
+            train_blocks.append((X_train.to_numpy(dtype=np.float64), y_train.to_numpy()))
+            X_tests.append(X_test)
+            y_tests.append(y_test)
+        
+        server = FederatedHistogramGBDT(**self.federated_params)
+        feature_names = list(X_tests[0].columns)
+        if self.client_workers > 1:
+            n_workers = min(self.client_workers, len(train_blocks))
+            logger.info(f"Running {len(train_blocks)} federated clients on {n_workers} worker processes")
+            with ClientProcessGroup(train_blocks, n_workers) as clients:
+                global_model = server.fit(clients, feature_names)
+        else:
+            global_model = server.fit([FederatedClient(X, y) for X, y in train_blocks], feature_names)
+        
+        # Evaluate global model
+        X_test, y_test = pd.concat(X_tests), pd.concat(y_tests)
+        y_prob = global_model.predict(X_test.to_numpy(dtype=np.float64))
+        y_pred = (y_prob >= 0.5).astype(int)
+        
+        accuracy = accuracy_score(y_test, y_pred)
+        auc = roc_auc_score(y_test, y_prob)
+        
+        rounds = server.history[1:]
+        logger.info(f"Global model performance - Accuracy: {accuracy:.4f}, AUC: {auc:.4f}")
+        logger.info(f"Federated rounds: {len(rounds)}, "
+                    f"{np.mean([r['bytes_up'] + r['bytes_down'] for r in rounds]) / 1e3:.1f} KB exchanged per round")
+        logger.info(f"Classification Report:\n{classification_report(y_test, y_pred)}")
+        
+        return global_model
     
-    def create_global_model(self, df: pd.DataFrame) -> LGBMClassifier:
-        """Create global model using complete dataset (simulating federated aggregation)"""
+    def create_global_model(self, df: pd.DataFrame) -> Tuple[LGBMClassifier, pd.DataFrame]:
+        """Create global model using complete dataset (centralized baseline)
+        
+        Returns the model and its training features (for the SHAP explainer).
+        """
         logger.info("Creating global model from complete dataset")
         
         # Prepare full dataset
@@ -214,19 +553,40 @@ class FederatedLearningSimulator:
         
         return explainer
     
-    def save_models(self, global_model: LGBMClassifier, explainer: shap.TreeExplainer):
-        """Save trained models and explainer"""
+    def save_models(self, global_model, explainer: Optional[shap.TreeExplainer] = None):
+        """Save trained models and explainer
+        
+        A federated global model is already a TreeEnsemble and is served
+        (and explained) from its artifact only; the legacy pickles are
+        written for the centralized LightGBM baseline.
+        """
         logger.info("Saving models and explainer")
         
-        # Save global model
-        model_path = self.models_dir / "global_credit_model.pkl"
-        joblib.dump(global_model, model_path)
-        logger.info(f"Global model saved to {model_path}")
+        if isinstance(global_model, TreeEnsemble):
+            ensemble = global_model
+        else:
+            # Save global model
+            model_path = self.models_dir / "global_credit_model.pkl"
+            joblib.dump(global_model, model_path)
+            logger.info(f"Global model saved to {model_path}")
+            
+            # Save SHAP explainer
+            explainer_path = self.models_dir / "shap_explainer.pkl"
+            joblib.dump(explainer, explainer_path)
+            logger.info(f"SHAP explainer saved to {explainer_path}")
+            ensemble = TreeEnsemble.from_booster(global_model)
+        
+        # Save feature schema next to the model so serving uses the same layout
+        if ensemble.feature_names != self.schema.feature_names:
+            raise ValueError("Trained model features do not match the feature schema")
+        self.schema.save(self.models_dir / SCHEMA_FILENAME)
+        documents = {SCHEMA_FILENAME: self.schema.to_dict()}
+        if self.schema.pipeline is not None:
+            self.schema.pipeline.save(self.models_dir / PIPELINE_FILENAME)
+            documents[PIPELINE_FILENAME] = self.schema.pipeline.to_dict()
         
-        # Save SHAP explainer
-        explainer_path = self.models_dir / "shap_explainer.pkl"
-        joblib.dump(explainer, explainer_path)
-        logger.info(f"SHAP explainer saved to {explainer_path}")
+        # Export flattened trees as a new pickle-free artifact version for serving (becomes LATEST)
+        ensemble.save(self.models_dir / MODEL_ARTIFACTS_DIRNAME, documents=documents)
     
     def run_federated_simulation(self):
         """Run complete federated learning simulation"""
@@ -239,14 +599,19 @@ class FederatedLearningSimulator:
             # Partition data for clients
             client_datasets = self.partition_data_for_clients(df)
             
-            # Train client models (simulation step)
-            client_models = self.train_client_models(client_datasets)
+            # Fit the preprocessing shared with serving
+            self.fit_preprocessing(df, client_datasets)
             
-            # Create global model (practical aggregation for demo)
-            global_model, X_train = self.create_global_model(df)
-            
-            # Create SHAP explainer
-            explainer = self.create_shap_explainer(global_model, X_train)
+            if self.aggregation == "histogram":
+                # Aggregate client histogram updates into the global model
+                # (clients only compute histograms; no local LightGBM models are needed)
+                global_model = self.aggregate_global_model(client_datasets)
+                explainer = None
+            else:
+                # Train client models (simulation step), then the centralized baseline on the pooled data
+                self.train_client_models(client_datasets)
+                global_model, X_train = self.create_global_model(df)
+                explainer = self.create_shap_explainer(global_model, X_train)
             
             # Save models
             self.save_models(global_model, explainer)
@@ -260,7 +625,27 @@ class FederatedLearningSimulator:
 
 def main():
     """Main execution function"""
-    simulator = FederatedLearningSimulator()
+    parser = argparse.ArgumentParser(description="Federated learning simulation and model training")
+    parser.add_argument("--data-path", default=DEFAULT_DATA_PATH)
+    parser.add_argument("--n-clients", type=int, default=5)
+    parser.add_argument("--models-dir", default="trained_models")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="LightGBM threads (-1: all cores)")
+    parser.add_argument("--client-workers", type=int, default=0, help="Run clients (local models, or federated histogram updates) in this many processes")
+    parser.add_argument("--aggregation", choices=AGGREGATION_MODES, default="histogram",
+                        help="Build the global model from client histograms or retrain on pooled data")
+    parser.add_argument("--client-format", choices=tuple(FORMAT_EXTENSIONS), default="csv",
+                        help="File format of the saved client partitions")
+    parser.add_argument("--preprocessing-stats", choices=PREPROCESSING_STATS, default="exact",
+                        help="Fit medians and clip bounds exactly on pooled data or from merged client sketches")
+    parser.add_argument("--partition", choices=PARTITION_SCHEMES, default="iid",
+                        help="Spread rows over clients evenly, with Dirichlet label skew or with quantity skew")
+    parser.add_argument("--partition-alpha", type=float, default=DEFAULT_ALPHA,
+                        help="Dirichlet concentration of the skewed partitions (smaller: more skew)")
+    args = parser.parse_args()
+    
+    simulator = FederatedLearningSimulator(args.data_path, args.n_clients, args.models_dir, args.n_jobs,
+                                           args.client_workers, args.aggregation, args.client_format,
+                                           args.preprocessing_stats, args.partition, args.partition_alpha)
     simulator.run_federated_simulation()
 
 
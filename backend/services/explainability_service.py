@@ -5,153 +5,286 @@ Enhanced Explainability Service using SHAP with Recommendations
 Provides model explanations and personalized recommendations for credit risk predictions.
 """
 
-import joblib
-import pandas as pd
 import numpy as np
 from pathlib import Path
 import logging
-from typing import Dict, Any, List
-import shap
+from typing import TYPE_CHECKING, Dict, Any, List
+
+from models.feature_schema import FeatureSchema
+from models.model_artifact import artifact_root_for
+from models.tree_ensemble import TreeEnsemble
+from models.tree_shap import TreeShapExplainer
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 logger = logging.getLogger(__name__)
 
+# Per-feature description: (template, SHAP sign test, phrase if it holds, phrase otherwise)
+FEATURE_DESCRIPTION_TEMPLATES = {
+    'person_income': ("Your annual income of ₹{value:,.0f} {phrase} affects your risk profile", '>', 'positively', 'negatively'),
+    'loan_amnt': ("The requested loan amount of ₹{value:,.0f} {phrase} the assessed risk", '>', 'increases', 'decreases'),
+    'loan_int_rate': ("The interest rate of {value:.1f}% {phrase} risk assessment", '>', 'contributes to higher', 'helps lower'),
+    'late_payments_12m': ("Having {value:.0f} late payments in the last 12 months {phrase} your risk", '>', 'significantly increases', 'does not increase'),
+    'on_time_payments_12m': ("Your {value:.0f} on-time payments {phrase} in the assessment", '<', 'demonstrate reliability', 'are noted'),
+    'digital_engagement_score': ("Your digital engagement score of {value:.0f} {phrase} digital financial behavior", '<', 'shows good', 'indicates limited'),
+    'utility_to_income_ratio': ("Your utility-to-income ratio of {value:.3f} {phrase}", '>', 'is considered high', 'is within acceptable range'),
+    'age': ("Your age of {value:.0f} years {phrase} the risk calculation", '!=', 'is factored into', 'neutrally affects'),
+    'cb_person_cred_hist_length': ("Your credit history of {value:.1f} years {phrase} evidence of creditworthiness", '<', 'provides', 'shows limited')
+}
+DEFAULT_DESCRIPTION_TEMPLATE = ("This feature with value {value:.2f} {phrase} your risk assessment", '>', 'increases', 'decreases')
+
+SHAP_SIGN_TESTS = {
+    '>': lambda shap_value: shap_value > 0,
+    '<': lambda shap_value: shap_value < 0,
+    '!=': lambda shap_value: shap_value != 0
+}
+
+# Recommendations are only given for risk-increasing features with |SHAP| >= this
+RECOMMENDATION_MIN_IMPACT = 0.01
+
+FEATURE_RECOMMENDATIONS = {
+    'late_payments_12m': "Set up automatic payments and payment reminders to avoid future late payments",
+    'on_time_payments_12m': "Continue your excellent payment history - it's your strongest asset",
+    'utility_to_income_ratio': "Consider reducing utility costs through energy-efficient appliances or budget management",
+    'loan_int_rate': "Shop around for better interest rates or consider improving your credit score first",
+    'digital_engagement_score': "Increase your digital financial activities like mobile banking and digital payments",
+    'person_income': "Consider documenting additional income sources or pursuing income growth opportunities",
+    'loan_amnt': "Consider requesting a smaller loan amount to improve approval chances",
+    'cb_person_cred_hist_length': "Maintain your existing credit accounts to build a longer credit history",
+    'age': "Age is a natural factor - focus on other controllable aspects of your financial profile"
+}
+DEFAULT_RECOMMENDATION = "Consider improving this aspect of your financial profile"
+
 class ExplainabilityService:
     """Enhanced service for generating model explanations using SHAP with recommendations"""
     
-    def __init__(self, explainer_path: str = "trained_models/shap_explainer.pkl"):
+    def __init__(self, explainer_path: str = "trained_models/artifacts"):
         self.explainer_path = Path(explainer_path)
         self.explainer = None
+        self.schema = FeatureSchema.for_artifact(self.explainer_path)
+        self._compile_templates()
         self._load_explainer()
     
+    def _compile_templates(self):
+        """Resolve description and recommendation templates once per schema feature"""
+        def compile_description(template, sign, if_true, if_false):
+            return template.format, SHAP_SIGN_TESTS[sign], if_true, if_false
+        
+        self._default_description = compile_description(*DEFAULT_DESCRIPTION_TEMPLATE)
+        self._descriptions = {
+            feature: compile_description(*FEATURE_DESCRIPTION_TEMPLATES[feature])
+            for feature in self.schema.feature_names if feature in FEATURE_DESCRIPTION_TEMPLATES
+        }
+        self._recommendations = {
+            feature: FEATURE_RECOMMENDATIONS.get(feature, DEFAULT_RECOMMENDATION)
+            for feature in self.schema.feature_names
+        }
+    
     def _load_explainer(self):
-        """Load the SHAP explainer"""
+        """Build the native TreeSHAP explainer from the flattened model"""
         try:
-            if not self.explainer_path.exists():
+            artifact_root = artifact_root_for(self.explainer_path)
+            if artifact_root.exists():
+                # The same instance the version's PredictionService scores with
+                ensemble = TreeEnsemble.shared(artifact_root)
+            elif self.explainer_path.is_file():
+                # Older artifacts without an exported ensemble: take the model out of the pickled explainer
+                import joblib
+                ensemble = TreeEnsemble.from_booster(joblib.load(self.explainer_path).model.original_model)
+            else:
                 raise FileNotFoundError(f"SHAP explainer not found at {self.explainer_path}")
             
-            self.explainer = joblib.load(self.explainer_path)
-            logger.info(f"SHAP explainer loaded successfully from {self.explainer_path}")
+            self.explainer = TreeShapExplainer(ensemble)
+            logger.info(f"SHAP explainer built for model {ensemble.artifact_version}")
             
         except Exception as e:
             logger.error(f"Error loading SHAP explainer: {str(e)}")
             raise
     
-    def prepare_input_data(self, input_data: Dict[str, Any]) -> pd.DataFrame:
+    def prepare_input_data(self, input_data: Dict[str, Any]) -> "pd.DataFrame":
         """Prepare input data for SHAP explanation"""
-        expected_features = [
-            'person_income', 'person_emp_length', 'loan_amnt', 'loan_int_rate', 
-            'loan_percent_income', 'cb_person_cred_hist_length', 'age', 
-            'estimated_monthly_income', 'monthly_airtime_spend', 'monthly_data_usage_gb',
-            'avg_calls_per_day', 'avg_sms_per_day', 'digital_wallet_usage',
-            'monthly_digital_transactions', 'avg_transaction_amount', 
-            'social_media_activity_score', 'mobile_banking_user',
-            'digital_engagement_score', 'financial_inclusion_score',
-            'electricity_bill_avg', 'water_bill_avg', 'gas_bill_avg',
-            'total_utility_expense', 'utility_to_income_ratio', 
-            'on_time_payments_12m', 'late_payments_12m', 'credit_risk_score'
-        ]
-        
-        df = pd.DataFrame([input_data])
-        
-        for feature in expected_features:
-            if feature not in df.columns:
-                df[feature] = 0
+        # Only this DataFrame path needs pandas
+        import pandas as pd
         
-        df = df[expected_features]
-        df = df.fillna(0)
-        
-        return df
+        # Expected features in order, with the same fill/clip/scale as the encoded path
+        return self.schema.transform_frame(pd.DataFrame([input_data]))
     
     def explain_prediction(self, input_data: Dict[str, Any], top_n: int = 10) -> Dict[str, Any]:
         """Generate comprehensive SHAP explanation with recommendations"""
+        return self.explain_encoded(self.schema.encode(input_data), input_data, top_n)
+    
+    def explain_encoded(self, features: np.ndarray, input_data: Dict[str, Any], top_n: int = 10) -> Dict[str, Any]:
+        """Generate SHAP explanation for a row encoded with the feature schema"""
         try:
-            if self.explainer is None:
-                raise ValueError("SHAP explainer not loaded")
-            
-            df = self.prepare_input_data(input_data)
-            shap_values = self.explainer.shap_values(df)
-            
-            if isinstance(shap_values, list):
-                shap_values = shap_values[1]
-            
-            feature_names = df.columns.tolist()
-            
-            # Create enhanced feature contributions
-            feature_contributions = {}
-            for i, (feature, shap_value) in enumerate(zip(feature_names, shap_values[0])):
-                feature_contributions[feature] = {
-                    "shap_value": float(shap_value),
-                    "feature_value": float(df.iloc[0, i]),
-                    "impact": "increases_risk" if shap_value > 0 else "decreases_risk",
-                    "description": self._get_feature_description(feature, float(df.iloc[0, i]), float(shap_value)),
-                    "recommendation": self._get_feature_recommendation(feature, float(df.iloc[0, i]), float(shap_value))
-                }
-            
-            # Sort by absolute SHAP value and take top N
-            sorted_features = sorted(
-                feature_contributions.items(),
-                key=lambda x: abs(x[1]["shap_value"]),
-                reverse=True
-            )[:top_n]
+            shap_values = self.compute_shap_values(features)
+            return self.build_explanation(features[0], shap_values[0], self.base_value, input_data, top_n)
             
-            # Generate base explanation
-            explanation = {
-                "top_features": dict(sorted_features),
-                "base_value": float(self.explainer.expected_value[1] if isinstance(self.explainer.expected_value, list) else self.explainer.expected_value),
-                "prediction_value": float(self.explainer.expected_value[1] if isinstance(self.explainer.expected_value, list) else self.explainer.expected_value) + float(np.sum(shap_values[0])),
-                "total_shap_contribution": float(np.sum(shap_values[0]))
-            }
+        except Exception as e:
+            logger.error(f"Error generating SHAP explanation: {str(e)}")
+            raise
+    
+    @property
+    def base_value(self) -> float:
+        """Expected model output (log-odds) the SHAP values are relative to"""
+        if self.explainer is None:
+            raise ValueError("SHAP explainer not loaded")
+        return float(self.explainer.expected_value)
+    
+    def compute_shap_values(self, features: np.ndarray) -> np.ndarray:
+        """Raw SHAP matrix (rows x features) for rows encoded with the feature schema"""
+        if self.explainer is None:
+            raise ValueError("SHAP explainer not loaded")
+        
+        return self.explainer.shap_values(features)
+    
+    def shap_record(self, features: np.ndarray) -> Dict[str, Any]:
+        """Compute a storable SHAP record for one encoded row"""
+        shap_values = self.compute_shap_values(features)
+        return {
+            "shap_values": [float(v) for v in shap_values[0]],
+            "feature_values": [float(v) for v in features[0]],
+            "feature_names": list(self.schema.feature_names),
+            "base_value": self.base_value
+        }
+    
+    def explain_from_record(self, record: Dict[str, Any], input_data: Dict[str, Any], top_n: int = 10) -> Dict[str, Any]:
+        """Generate explanation from a stored SHAP record without re-running the explainer"""
+        if record.get("feature_names", self.schema.feature_names) != self.schema.feature_names:
+            raise ValueError("Stored SHAP record does not match the feature schema")
+        
+        return self.build_explanation(
+            np.asarray(record["feature_values"], dtype=np.float64),
+            np.asarray(record["shap_values"], dtype=np.float64),
+            float(record["base_value"]),
+            input_data,
+            top_n
+        )
+    
+    def build_explanation(self, feature_values: np.ndarray, shap_row: np.ndarray, base_value: float,
+                          input_data: Dict[str, Any], top_n: int = 10) -> Dict[str, Any]:
+        """Render explanation and recommendations from one row's SHAP vector
+        
+        Features are ranked on the raw SHAP values first so only the top_n are rendered.
+        """
+        top_indices = self.rank_top_features(shap_row[np.newaxis, :], top_n)[0]
+        explanation = self._render_explanation(
+            feature_values, shap_row, top_indices, base_value, float(np.sum(shap_row)), input_data
+        )
+        
+        logger.info("Enhanced SHAP explanation generated successfully")
+        return explanation
+    
+    def explain_batch(self, input_data_list: List[Dict[str, Any]], top_n: int = 10) -> List[Dict[str, Any]]:
+        """Generate explanations for many applications with a single SHAP call"""
+        try:
+            matrix, row_errors = self.schema.layout.encode_batch(input_data_list)
+            if row_errors:
+                raise ValueError(f"Could not encode applications: {row_errors}")
+            if len(matrix) == 0:
+                return []
             
-            # Add human-readable explanations
-            explanation["readable_explanation"] = self._create_readable_explanation(dict(sorted_features))
+            shap_values = self.compute_shap_values(matrix)
+            top_indices = self.rank_top_features(shap_values, top_n)
+            base_value = self.base_value
+            totals = shap_values.sum(axis=1)
             
-            # Generate personalized recommendations
-            explanation["recommendations"] = self._generate_personalized_recommendations(
-                dict(sorted_features), input_data
-            )
+            explanations = [
+                self._render_explanation(matrix[i], shap_values[i], top_indices[i], base_value,
+                                         float(totals[i]), input_data)
+                for i, input_data in enumerate(input_data_list)
+            ]
             
-            logger.info("Enhanced SHAP explanation generated successfully")
-            return explanation
+            logger.info(f"Batch SHAP explanations generated for {len(explanations)} applications")
+            return explanations
             
         except Exception as e:
-            logger.error(f"Error generating SHAP explanation: {str(e)}")
+            logger.error(f"Error generating batch SHAP explanation: {str(e)}")
             raise
     
+    @staticmethod
+    def rank_top_features(shap_values: np.ndarray, top_n: int) -> np.ndarray:
+        """Indices of the top_n features by |SHAP| for every row, most important first
+        
+        Ties are broken by feature order, matching a stable descending sort.
+        """
+        abs_shap = np.abs(shap_values)
+        n_rows, n_features = abs_shap.shape
+        k = max(0, min(top_n, n_features))
+        if k == 0:
+            return np.empty((n_rows, 0), dtype=np.intp)
+        
+        # k-th largest |SHAP| per row, then keep everything above it plus the
+        # earliest features equal to it until each row has exactly k
+        candidates = np.argpartition(-abs_shap, k - 1, axis=1)[:, :k]
+        threshold = np.take_along_axis(abs_shap, candidates, axis=1).min(axis=1, keepdims=True)
+        above = abs_shap > threshold
+        at_threshold = abs_shap == threshold
+        needed = k - above.sum(axis=1, keepdims=True)
+        selected = above | (at_threshold & (np.cumsum(at_threshold, axis=1) <= needed))
+        
+        top_indices = np.nonzero(selected)[1].reshape(n_rows, k)
+        order = np.argsort(-np.take_along_axis(abs_shap, top_indices, axis=1), axis=1, kind='stable')
+        return np.take_along_axis(top_indices, order, axis=1)
+    
+    def _render_explanation(self, feature_values: np.ndarray, shap_row: np.ndarray, top_indices: np.ndarray,
+                            base_value: float, total_shap_contribution: float,
+                            input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Render explanation for already-ranked features only
+        
+        ``feature_values`` is the model input (filled, clipped, maybe scaled)
+        the SHAP values belong to; descriptions show what the applicant
+        entered, falling back to the model input for missing fields.
+        """
+        feature_names = self.schema.feature_names
+        
+        top_features = {}
+        for i in top_indices.tolist():
+            feature = feature_names[i]
+            feature_value = self._display_value(input_data.get(feature), feature_values[i])
+            shap_value = float(shap_row[i])
+            top_features[feature] = {
+                "shap_value": shap_value,
+                "feature_value": feature_value,
+                "impact": "increases_risk" if shap_value > 0 else "decreases_risk",
+                "description": self._get_feature_description(feature, feature_value, shap_value),
+                "recommendation": self._get_feature_recommendation(feature, feature_value, shap_value)
+            }
+        
+        return {
+            "top_features": top_features,
+            "base_value": base_value,
+            "prediction_value": base_value + total_shap_contribution,
+            "total_shap_contribution": total_shap_contribution,
+            "readable_explanation": self._create_readable_explanation(top_features),
+            "recommendations": self._generate_personalized_recommendations(top_features, input_data)
+        }
+    
+    @staticmethod
+    def _display_value(raw_value: Any, model_value: float) -> float:
+        """The submitted value of a feature as a float, or the model input if it was missing or not numeric"""
+        if raw_value is not None and not isinstance(raw_value, bool):
+            try:
+                value = float(raw_value)
+            except (TypeError, ValueError):
+                pass
+            else:
+                if np.isfinite(value):
+                    return value
+        return float(model_value)
+    
     def _get_feature_description(self, feature: str, value: float, shap_value: float) -> str:
         """Get detailed description for a feature"""
-        descriptions = {
-            'person_income': f"Your annual income of ₹{value:,.0f} {'positively' if shap_value > 0 else 'negatively'} affects your risk profile",
-            'loan_amnt': f"The requested loan amount of ₹{value:,.0f} {'increases' if shap_value > 0 else 'decreases'} the assessed risk",
-            'loan_int_rate': f"The interest rate of {value:.1f}% {'contributes to higher' if shap_value > 0 else 'helps lower'} risk assessment",
-            'late_payments_12m': f"Having {value:.0f} late payments in the last 12 months {'significantly increases' if shap_value > 0 else 'does not increase'} your risk",
-            'on_time_payments_12m': f"Your {value:.0f} on-time payments {'demonstrate reliability' if shap_value < 0 else 'are noted'} in the assessment",
-            'digital_engagement_score': f"Your digital engagement score of {value:.0f} {'shows good' if shap_value < 0 else 'indicates limited'} digital financial behavior",
-            'utility_to_income_ratio': f"Your utility-to-income ratio of {value:.3f} {'is considered high' if shap_value > 0 else 'is within acceptable range'}",
-            'age': f"Your age of {value:.0f} years {'is factored into' if shap_value != 0 else 'neutrally affects'} the risk calculation",
-            'cb_person_cred_hist_length': f"Your credit history of {value:.1f} years {'provides' if shap_value < 0 else 'shows limited'} evidence of creditworthiness"
-        }
-        
-        return descriptions.get(feature, f"This feature with value {value:.2f} {'increases' if shap_value > 0 else 'decreases'} your risk assessment")
+        render, sign_test, if_true, if_false = self._descriptions.get(feature, self._default_description)
+        return render(value=value, phrase=if_true if sign_test(shap_value) else if_false)
     
     def _get_feature_recommendation(self, feature: str, value: float, shap_value: float) -> str:
         """Get specific recommendation for a feature"""
-        if abs(shap_value) < 0.01:  # Low impact features don't need recommendations
+        if abs(shap_value) < RECOMMENDATION_MIN_IMPACT:  # Low impact features don't need recommendations
             return None
-            
-        recommendations = {
-            'late_payments_12m': "Set up automatic payments and payment reminders to avoid future late payments",
-            'on_time_payments_12m': "Continue your excellent payment history - it's your strongest asset",
-            'utility_to_income_ratio': "Consider reducing utility costs through energy-efficient appliances or budget management",
-            'loan_int_rate': "Shop around for better interest rates or consider improving your credit score first",
-            'digital_engagement_score': "Increase your digital financial activities like mobile banking and digital payments",
-            'person_income': "Consider documenting additional income sources or pursuing income growth opportunities",
-            'loan_amnt': "Consider requesting a smaller loan amount to improve approval chances",
-            'cb_person_cred_hist_length': "Maintain your existing credit accounts to build a longer credit history",
-            'age': "Age is a natural factor - focus on other controllable aspects of your financial profile"
-        }
         
         if shap_value > 0:  # Only provide recommendations for risk-increasing features
-            return recommendations.get(feature, "Consider improving this aspect of your financial profile")
+            return self._recommendations.get(feature, DEFAULT_RECOMMENDATION)
         
         return None
     
@@ -0,0 +1,47 @@
+# backend/services/explanation_cache.py
+"""
+Explanation Cache
+
+Bounded in-process LRU of SHAP explanations keyed by application_id.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+
+class ExplanationCache:
+    """Thread-safe LRU mapping application_id -> cached explanation entry"""
+
+    def __init__(self, max_size: int = 10000):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, application_id: str) -> Optional[Dict[str, Any]]:
+        """Return the cached entry and mark it as recently used"""
+        with self._lock:
+            entry = self._entries.get(application_id)
+            if entry is not None:
+                self._entries.move_to_end(application_id)
+            return entry
+
+    def put(self, application_id: str, entry: Dict[str, Any]):
+        """Insert an entry, evicting the least recently used one when full"""
+        with self._lock:
+            self._entries[application_id] = entry
+            self._entries.move_to_end(application_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, application_id: str) -> bool:
+        return application_id in self._entries
@@ -6,18 +6,29 @@ Handles all Firebase Firestore interactions for user and application data.
 """
 
 from config.firebase_config import get_firestore
-from google.cloud.firestore import Client
+import asyncio
+import functools
 import logging
-from typing import Dict, Any, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Callable
 from datetime import datetime
 
+if TYPE_CHECKING:
+    from google.cloud.firestore import Client
+
 logger = logging.getLogger(__name__)
 
+# Top-level pointer collection: applications_index/{application_id} -> owning user
+APPLICATIONS_INDEX = 'applications_index'
+
+# Firestore caps a write batch at 500 operations
+MAX_BATCH_WRITES = 500
+
 class FirebaseService:
     """Service for Firebase Firestore operations"""
     
     def __init__(self):
-        self.db: Client = get_firestore()
+        self.db: "Client" = get_firestore()
         
     def create_user(self, user_id: str, user_data: Dict[str, Any]):
         """Create a new user document"""
@@ -44,11 +55,27 @@ class FirebaseService:
             logger.error(f"Error getting user from Firestore: {str(e)}")
             raise
     
+    def _application_ref(self, user_id: str, application_id: str):
+        return self.db.collection('users').document(user_id).collection('applications').document(application_id)
+    
+    def _index_ref(self, application_id: str):
+        return self.db.collection(APPLICATIONS_INDEX).document(application_id)
+    
+    @staticmethod
+    def _index_entry(user_id: str, application_id: str) -> Dict[str, Any]:
+        return {
+            "user_id": user_id,
+            "application_id": application_id
+        }
+    
     def store_application(self, user_id: str, application_id: str, application_data: Dict[str, Any]):
-        """Store credit application in user's subcollection"""
+        """Store credit application in user's subcollection together with its index pointer"""
         try:
-            app_ref = self.db.collection('users').document(user_id).collection('applications').document(application_id)
-            app_ref.set(application_data)
+            # Write the application and its applications_index pointer atomically
+            batch = self.db.batch()
+            batch.set(self._application_ref(user_id, application_id), application_data)
+            batch.set(self._index_ref(application_id), self._index_entry(user_id, application_id))
+            batch.commit()
             logger.info(f"Application stored: {application_id}")
             
         except Exception as e:
@@ -56,17 +83,19 @@ class FirebaseService:
             raise
     
     def get_application(self, application_id: str) -> Optional[Dict[str, Any]]:
-        """Get application by ID (searches across all users)"""
+        """Get application by ID via the applications_index pointer"""
         try:
-            # This is a simplified approach - in production, you might want to index by application_id
-            users = self.db.collection('users').stream()
+            index_doc = self._index_ref(application_id).get()
             
-            for user in users:
-                app_ref = self.db.collection('users').document(user.id).collection('applications').document(application_id)
-                app_doc = app_ref.get()
-                
-                if app_doc.exists:
-                    return app_doc.to_dict()
+            if index_doc.exists:
+                user_id = index_doc.to_dict()["user_id"]
+                app_doc = self._application_ref(user_id, application_id).get()
+                return app_doc.to_dict() if app_doc.exists else None
+            
+            # Not indexed yet (written before the index existed): single collection-group query
+            query = self.db.collection_group('applications').where('application_id', '==', application_id).limit(1)
+            for app_doc in query.stream():
+                return app_doc.to_dict()
             
             return None
             
@@ -74,6 +103,36 @@ class FirebaseService:
             logger.error(f"Error getting application: {str(e)}")
             raise
     
+    def backfill_application_index(self) -> int:
+        """Write applications_index pointers for all existing applications"""
+        try:
+            written = 0
+            batch = self.db.batch()
+            pending = 0
+            
+            for app_doc in self.db.collection_group('applications').stream():
+                # users/{user_id}/applications/{application_id}
+                user_id = app_doc.reference.parent.parent.id
+                batch.set(self._index_ref(app_doc.id), self._index_entry(user_id, app_doc.id))
+                pending += 1
+                
+                if pending == MAX_BATCH_WRITES:
+                    batch.commit()
+                    written += pending
+                    batch = self.db.batch()
+                    pending = 0
+            
+            if pending:
+                batch.commit()
+                written += pending
+            
+            logger.info(f"Application index backfilled: {written} entries")
+            return written
+            
+        except Exception as e:
+            logger.error(f"Error backfilling application index: {str(e)}")
+            raise
+    
     def get_user_applications(self, user_id: str, limit: int = 10, offset: int = 0) -> List[Dict[str, Any]]:
         """Get user's applications with pagination"""
         try:
@@ -92,3 +151,41 @@ class FirebaseService:
         except Exception as e:
             logger.error(f"Error getting user applications: {str(e)}")
             raise
+
+
+class AsyncFirebaseService:
+    """Awaitable facade over FirebaseService for async request handlers
+    
+    The Firestore client is synchronous, so each call runs on a bounded
+    thread pool instead of blocking the event loop.
+    """
+    
+    def __init__(self, service: Optional[FirebaseService] = None, max_workers: int = 16):
+        self.service = service if service is not None else FirebaseService()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="firestore-io")
+    
+    async def _run(self, fn: Callable, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+    
+    async def create_user(self, user_id: str, user_data: Dict[str, Any]):
+        return await self._run(self.service.create_user, user_id, user_data)
+    
+    async def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self.service.get_user, user_id)
+    
+    async def store_application(self, user_id: str, application_id: str, application_data: Dict[str, Any]):
+        return await self._run(self.service.store_application, user_id, application_id, application_data)
+    
+    async def get_application(self, application_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self.service.get_application, application_id)
+    
+    async def get_user_applications(self, user_id: str, limit: int = 10, offset: int = 0) -> List[Dict[str, Any]]:
+        return await self._run(self.service.get_user_applications, user_id, limit, offset)
+    
+    async def backfill_application_index(self) -> int:
+        return await self._run(self.service.backfill_application_index)
+    
+    def shutdown(self):
+        """Wait for in-flight Firestore calls and release the I/O threads"""
+        self._executor.shutdown(wait=True)
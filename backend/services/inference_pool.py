@@ -0,0 +1,226 @@
+# backend/services/inference_pool.py
+"""
+Inference Worker Pool
+
+Runs CPU-bound model calls (prediction, SHAP) off the event loop on a
+bounded thread or process pool, with backpressure and queue metrics.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Per-process model registry for process-pool workers, built once by the initializer
+_worker_registry = None
+# Recently served versions other than the worker's current one, most recent last
+# (workers hold no request pins, so the registry never keeps a replaced version draining)
+_worker_handles = OrderedDict()
+WORKER_HANDLE_CACHE_SIZE = 2
+
+
+class InferencePoolSaturated(Exception):
+    """Raised when the pool's queue is full; callers should answer 429"""
+
+
+def _init_worker(artifact_root: str):
+    """Process-pool initializer: preload (and warm up) the latest model once per worker"""
+    global _worker_registry
+    from services.model_registry import ModelRegistry
+
+    _worker_registry = ModelRegistry(artifact_root)
+    _worker_registry.refresh()
+    logger.info(f"Inference worker ready with model {_worker_registry.current.version}")
+
+
+def _call_in_worker(target: str, method: str, version: Optional[str],
+                    args: tuple, kwargs: dict) -> Tuple[float, Any]:
+    """Process-pool task: run a method on this worker's copy of the requested model version"""
+    started_at = time.time()
+    handle = _worker_handle(version)
+    return started_at, getattr(handle.service(target), method)(*args, **kwargs)
+
+
+def _worker_handle(version: Optional[str]):
+    """This worker's handle for a version (LATEST if None)
+
+    Only the LATEST version becomes the worker's current one; an older
+    version pinned by a request that started before a swap is served from
+    a small LRU of handles, so requests straddling a swap don't make the
+    worker reload models back and forth.
+    """
+    current = _worker_registry.current
+    if version is not None:
+        if current is not None and current.version == version:
+            return current
+        if version in _worker_handles:
+            _worker_handles.move_to_end(version)
+            return _worker_handles[version]
+
+    latest = _worker_registry.latest_version()
+    if version is None:
+        version = latest
+        if current is not None and current.version == version:
+            return current
+    if version != latest:
+        # A pinned older version: serve it without swapping it in
+        handle = _worker_registry.load(version)
+        _remember_handle(handle)
+        return handle
+
+    # A new LATEST: swap it in and keep the replaced version for requests still pinned to it
+    cached = _worker_handles.pop(version, None)
+    handle = _worker_registry.activate(version) if cached is None else _worker_registry.publish(cached)
+    if current is not None:
+        _remember_handle(current)
+    return handle
+
+
+def _remember_handle(handle):
+    _worker_handles[handle.version] = handle
+    while len(_worker_handles) > WORKER_HANDLE_CACHE_SIZE:
+        _worker_handles.popitem(last=False)
+
+
+def _call_in_thread(resolver: Callable[[str, Optional[str]], Any], target: str, method: str,
+                    version: Optional[str], args: tuple, kwargs: dict) -> Tuple[float, Any]:
+    """Thread-pool task: run a method on the process' service for the requested version"""
+    started_at = time.time()
+    return started_at, getattr(resolver(target, version), method)(*args, **kwargs)
+
+
+class InferencePool:
+    """Bounded executor for model inference with 429-style backpressure
+
+    ``mode="thread"`` runs calls against the services returned by
+    ``resolver(target, version)`` in this process. ``mode="process"``
+    starts workers that each open the artifact root themselves, serve the
+    model version named by each call and follow LATEST otherwise.
+    """
+
+    def __init__(self, mode: str = "thread", max_workers: int = 4, max_queue: int = 64,
+                 resolver: Optional[Callable[[str, Optional[str]], Any]] = None,
+                 artifact_root: str = "trained_models/artifacts"):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown inference pool mode: {mode}")
+        if mode == "thread" and resolver is None:
+            raise ValueError("Thread mode needs a resolver returning the services")
+
+        self.mode = mode
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.resolver = resolver
+
+        if mode == "process":
+            # Workers start while startup threads are loading models and importing modules;
+            # forking then could copy a held lock into the child, so start them fresh
+            self._executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(artifact_root,)
+            )
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+
+        # Metrics
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._failed = 0
+        self._max_queue_depth = 0
+        self._timed_calls = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._recent_waits = deque(maxlen=1024)
+
+    @property
+    def capacity(self) -> int:
+        """Calls that may be running or queued at once"""
+        return self.max_workers + self.max_queue
+
+    def warm_up(self):
+        """Start every worker (and load its models) before serving traffic"""
+        if self.mode == "process":
+            futures = [self._executor.submit(time.time) for _ in range(self.max_workers)]
+            for future in futures:
+                future.result()
+
+    async def run(self, target: str, method: str, *args, version: Optional[str] = None, **kwargs) -> Any:
+        """Run ``<target service>.<method>(*args, **kwargs)`` on the pool
+
+        ``version`` pins the model version the request started with; None
+        means the LATEST version when the call starts.
+        """
+        with self._lock:
+            if self._pending >= self.capacity:
+                self._rejected += 1
+                raise InferencePoolSaturated(
+                    f"Inference queue is full ({self._pending} pending, capacity {self.capacity})"
+                )
+            self._pending += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._queue_depth())
+
+        submitted_at = time.time()
+        try:
+            if self.mode == "process":
+                future = self._executor.submit(_call_in_worker, target, method, version, args, kwargs)
+            else:
+                future = self._executor.submit(_call_in_thread, self.resolver, target, method, version, args, kwargs)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+        # Free the slot when the call finishes, even if the awaiting request was cancelled
+        future.add_done_callback(self._on_done)
+
+        started_at, result = await asyncio.wrap_future(future)
+
+        wait = max(0.0, started_at - submitted_at)
+        with self._lock:
+            self._timed_calls += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self._recent_waits.append(wait)
+        return result
+
+    def _on_done(self, future):
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled() or future.exception() is not None:
+                self._failed += 1
+            else:
+                self._completed += 1
+
+    def _queue_depth(self) -> int:
+        return max(0, self._pending - self.max_workers)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth and wait-time metrics (wait = submit until a worker starts the call)"""
+        with self._lock:
+            recent = sorted(self._recent_waits)
+            return {
+                "mode": self.mode,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._pending,
+                "queue_depth": self._queue_depth(),
+                "max_queue_depth": self._max_queue_depth,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "wait_ms_avg": (self._wait_total / self._timed_calls * 1000) if self._timed_calls else 0.0,
+                "wait_ms_max": self._wait_max * 1000,
+                "wait_ms_p50": recent[len(recent) // 2] * 1000 if recent else 0.0,
+                "wait_ms_p99": recent[min(len(recent) - 1, int(len(recent) * 0.99))] * 1000 if recent else 0.0,
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
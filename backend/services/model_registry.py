@@ -0,0 +1,195 @@
+# backend/services/model_registry.py
+"""
+Model Registry with Hot Swap
+
+Holds the model version being served as an immutable ModelHandle. New
+versions are loaded, warmed up and validated off the request path, then
+published by replacing a single reference, so a request never sees a
+half-loaded model. Requests pin a handle for their whole lifetime; a
+replaced handle drains and is released once its last request finishes.
+
+Every process keeps its own registry and picks up new versions by polling
+the artifact root's LATEST stamp (``watch``), or when an inference call
+names a version it has not loaded yet (``activate``).
+"""
+
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from models.model_artifact import resolve_version_dir, set_latest
+from services.startup import load_services, warm_up_services, validate_services
+
+logger = logging.getLogger(__name__)
+
+
+class ModelHandle:
+    """One loaded and validated model version; never mutated once published"""
+
+    __slots__ = ("version", "prediction", "explainability", "loaded_at")
+
+    def __init__(self, version: str, prediction, explainability):
+        self.version = version
+        self.prediction = prediction
+        self.explainability = explainability
+        self.loaded_at = datetime.now()
+
+    def service(self, name: str):
+        """Service by inference-pool target name"""
+        if name == "prediction":
+            return self.prediction
+        if name == "explainability":
+            return self.explainability
+        raise KeyError(f"Unknown service: {name}")
+
+
+class ModelRegistry:
+    """Serves the current ModelHandle and swaps in new versions atomically"""
+
+    def __init__(self, artifact_root: str, warm_up: bool = True):
+        self.artifact_root = Path(artifact_root)
+        self.warm_up = warm_up
+        self._current: Optional[ModelHandle] = None
+        # Serializes loads and swaps; reads of _current never take it
+        self._swap_lock = threading.Lock()
+        # Pinned request counts, and replaced handles still serving requests
+        self._pin_lock = threading.Lock()
+        self._in_flight: Dict[str, int] = {}
+        self._draining: Dict[str, ModelHandle] = {}
+        self.swaps = 0
+        self.failed_loads = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def current(self) -> Optional[ModelHandle]:
+        return self._current
+
+    def latest_version(self) -> str:
+        """Version named by the artifact root's LATEST stamp"""
+        return resolve_version_dir(self.artifact_root).name
+
+    def load(self, version: str) -> ModelHandle:
+        """Load, warm up and validate a version without publishing it"""
+        version_dir = str(self.artifact_root / version)
+        prediction, explainability = load_services(version_dir, version_dir)
+        if self.warm_up:
+            warm_up_services(prediction, explainability)
+        validate_services(prediction, explainability)
+        return ModelHandle(version, prediction, explainability)
+
+    def activate(self, version: str) -> ModelHandle:
+        """Serve the given version, loading and swapping it in if needed"""
+        handle = self._current
+        if handle is not None and handle.version == version:
+            return handle
+        with self._swap_lock:
+            handle = self._current
+            if handle is not None and handle.version == version:
+                return handle
+            with self._pin_lock:
+                if version in self._draining:
+                    return self._draining[version]
+            try:
+                new_handle = self.load(version)
+            except Exception as e:
+                self.failed_loads += 1
+                self.last_error = f"{version}: {str(e)}"
+                logger.error(f"Error loading model version {version}: {str(e)}")
+                raise
+            self._swap(new_handle)
+            return new_handle
+
+    def publish(self, handle: ModelHandle) -> ModelHandle:
+        """Serve a handle that is already loaded and validated (see ``load``)"""
+        with self._swap_lock:
+            self._swap(handle)
+        return handle
+
+    def refresh(self) -> bool:
+        """Swap to the LATEST version if it changed; returns whether a swap happened"""
+        version = self.latest_version()
+        if self._current is not None and self._current.version == version:
+            return False
+        self.activate(version)
+        return True
+
+    def promote(self, version: str) -> ModelHandle:
+        """Point LATEST at a version (e.g. a rollback) and serve it"""
+        handle = self.activate(version)
+        set_latest(self.artifact_root, version)
+        return handle
+
+    def _swap(self, handle: ModelHandle):
+        with self._pin_lock:
+            previous = self._current
+            # The swap itself: one reference assignment, atomic for readers
+            self._current = handle
+            self.swaps += 1
+            if previous is not None and self._in_flight.get(previous.version, 0) > 0:
+                self._draining[previous.version] = previous
+        logger.info(f"Serving model version {handle.version}"
+                    + (f" (replacing {previous.version})" if previous is not None else ""))
+
+    @contextmanager
+    def acquire(self, version: Optional[str] = None) -> Iterator[ModelHandle]:
+        """Pin a handle (the current one by default) for the duration of a request"""
+        with self._pin_lock:
+            handle = self._current if version is None else self._pinnable(version)
+            if handle is None:
+                raise LookupError("No model version is loaded" if version is None
+                                  else f"Model version {version} is not loaded")
+            self._in_flight[handle.version] = self._in_flight.get(handle.version, 0) + 1
+        try:
+            yield handle
+        finally:
+            self._release(handle)
+
+    def _pinnable(self, version: str) -> Optional[ModelHandle]:
+        if self._current is not None and self._current.version == version:
+            return self._current
+        return self._draining.get(version)
+
+    def _release(self, handle: ModelHandle):
+        with self._pin_lock:
+            count = self._in_flight[handle.version] - 1
+            if count:
+                self._in_flight[handle.version] = count
+                return
+            del self._in_flight[handle.version]
+            if self._draining.pop(handle.version, None) is not None:
+                logger.info(f"Model version {handle.version} drained")
+
+    def get(self, version: Optional[str] = None) -> ModelHandle:
+        """Handle for a pinned version (current if None), for calls already holding a pin"""
+        with self._pin_lock:
+            handle = self._current if version is None else self._pinnable(version)
+        if handle is None:
+            raise LookupError(f"Model version {version} is not loaded")
+        return handle
+
+    async def watch(self, interval: float):
+        """Poll the LATEST stamp and hot-swap new versions until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                # Keep serving the current version; the next poll retries
+                logger.error(f"Error refreshing model registry: {str(e)}")
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._pin_lock:
+            current = self._current
+            return {
+                "version": current.version if current else None,
+                "loaded_at": current.loaded_at.isoformat() if current else None,
+                "swaps": self.swaps,
+                "failed_loads": self.failed_loads,
+                "last_error": self.last_error,
+                "in_flight": dict(self._in_flight),
+                "draining": sorted(self._draining),
+            }
@@ -0,0 +1,112 @@
+# backend/services/prediction_batcher.py
+"""
+Prediction Micro-Batcher
+
+Coalesces concurrent single-application predictions into one model call.
+Requests are collected for up to ``max_batch_size`` items or
+``max_wait_ms`` after the first one arrives, scored as one matrix per
+model version the requests pinned, and each caller's future is resolved
+with its own row's result.
+"""
+
+import asyncio
+import logging
+import numpy as np
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionBatcher:
+    """Dynamic batcher in front of a batch scoring function"""
+
+    def __init__(self, score_batch: Callable[[np.ndarray, Optional[str]], Awaitable[List[Dict[str, Any]]]],
+                 max_batch_size: int = 64, max_wait_ms: float = 2.0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.score_batch = score_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._scoring = set()
+        self.batches = 0
+        self.items = 0
+
+    def _ensure_running(self):
+        """Start the collector on the current event loop (lazily, once per loop)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._collect())
+
+    async def submit(self, features: np.ndarray, version: Optional[str] = None) -> Dict[str, Any]:
+        """Queue one encoded (1, n_features) row and wait for its prediction by the given model version"""
+        self._ensure_running()
+        future = self._loop.create_future()
+        await self._queue.put((features, version, future))
+        return await future
+
+    async def _collect(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # A hot swap can land mid-batch: each version's rows are scored by that version
+            groups: Dict[Optional[str], List[Tuple[np.ndarray, asyncio.Future]]] = {}
+            for features, version, future in batch:
+                groups.setdefault(version, []).append((features, future))
+
+            # Score without holding up collection of the next batch
+            for version, group in groups.items():
+                task = self._loop.create_task(self._score(group, version))
+                self._scoring.add(task)
+                task.add_done_callback(self._scoring.discard)
+
+    async def _score(self, batch: List[Tuple[np.ndarray, asyncio.Future]], version: Optional[str]):
+        futures = [future for _, future in batch]
+        try:
+            matrix = np.vstack([features for features, _ in batch])
+            results = await self.score_batch(matrix, version)
+        except Exception as e:
+            logger.error(f"Error scoring batch of {len(batch)}: {str(e)}")
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.items += len(batch)
+        for future, result in zip(futures, results):
+            if not future.done():
+                future.set_result(result)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+        }
+
+    async def stop(self):
+        """Cancel the collector task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
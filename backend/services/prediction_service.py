@@ -5,98 +5,90 @@ Credit Risk Prediction Service
 Handles loading the trained model and making predictions on new data.
 """
 
-import joblib
-import pandas as pd
 import numpy as np
 from pathlib import Path
 import logging
-from typing import Dict, Any, List
+from typing import TYPE_CHECKING, Dict, Any, List
 from datetime import datetime
 
+from models.feature_schema import FeatureSchema
+from models.model_artifact import artifact_root_for
+from models.tree_ensemble import TreeEnsemble
+
+if TYPE_CHECKING:
+    import pandas as pd
+
 logger = logging.getLogger(__name__)
 
+# Decision thresholds on the probability of default
+RISK_THRESHOLD = 0.5
+RISK_CATEGORY_BOUNDS = [0.3, 0.7]
+RISK_CATEGORIES = np.array(["Low Risk", "Medium Risk", "High Risk"])
+
 class PredictionService:
     """Service for credit risk predictions"""
     
-    def __init__(self, model_path: str = "trained_models/global_credit_model.pkl"):
+    def __init__(self, model_path: str = "trained_models/artifacts"):
         self.model_path = Path(model_path)
         self.model = None
         self.feature_columns = None
+        self.schema = FeatureSchema.for_artifact(self.model_path)
+        self.feature_layout = self.schema.layout
         self._load_model()
     
     def _load_model(self):
-        """Load the trained model"""
+        """Load the trained model as a flattened tree ensemble"""
         try:
-            if not self.model_path.exists():
+            artifact_root = artifact_root_for(self.model_path)
+            if artifact_root.exists():
+                self.model = TreeEnsemble.shared(artifact_root)
+                logger.info(f"Model {self.model.artifact_version} memory-mapped from {artifact_root}")
+            elif self.model_path.is_file():
+                # Older training output without an artifact directory: unpickle and flatten once here
+                import joblib
+                self.model = TreeEnsemble.from_booster(joblib.load(self.model_path))
+                logger.info(f"Model loaded and flattened from {self.model_path}")
+            else:
                 raise FileNotFoundError(f"Model file not found at {self.model_path}")
             
-            self.model = joblib.load(self.model_path)
-            logger.info(f"Model loaded successfully from {self.model_path}")
-            
             # Store feature names for consistency
-            if hasattr(self.model, 'feature_name_'):
-                self.feature_columns = self.model.feature_name_
+            self.feature_columns = self.model.feature_names
+            if list(self.feature_columns) != self.schema.feature_names:
+                raise ValueError("Model features do not match the feature schema")
             
         except Exception as e:
             logger.error(f"Error loading model: {str(e)}")
             raise
     
-    def prepare_input_data(self, input_data: Dict[str, Any]) -> pd.DataFrame:
+    def prepare_input_data(self, input_data: Dict[str, Any]) -> "pd.DataFrame":
         """Prepare input data for prediction"""
-        # Define expected features (same as training)
-        expected_features = [
-            'person_income', 'person_emp_length', 'loan_amnt', 'loan_int_rate', 
-            'loan_percent_income', 'cb_person_cred_hist_length', 'age', 
-            'estimated_monthly_income', 'monthly_airtime_spend', 'monthly_data_usage_gb',
-            'avg_calls_per_day', 'avg_sms_per_day', 'digital_wallet_usage',
-            'monthly_digital_transactions', 'avg_transaction_amount', 
-            'social_media_activity_score', 'mobile_banking_user',
-            'digital_engagement_score', 'financial_inclusion_score',
-            'electricity_bill_avg', 'water_bill_avg', 'gas_bill_avg',
-            'total_utility_expense', 'utility_to_income_ratio', 
-            'on_time_payments_12m', 'late_payments_12m', 'credit_risk_score'
-        ]
-        
-        # Create DataFrame with expected features
-        df = pd.DataFrame([input_data])
-        
-        # Ensure all expected features are present
-        for feature in expected_features:
-            if feature not in df.columns:
-                df[feature] = 0  # Default value for missing features
-        
-        # Select only expected features in correct order
-        df = df[expected_features]
-        
-        # Handle missing values
-        df = df.fillna(0)
+        # pandas is only needed on this legacy path; importing it lazily keeps API startup fast
+        import pandas as pd
         
-        return df
+        # Expected features in order, with the same fill/clip/scale as the encoded path
+        return self.schema.transform_frame(pd.DataFrame([input_data]))
     
     def predict(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """Make credit risk prediction"""
+        return self.predict_encoded(self.feature_layout.fill_row(input_data))
+    
+    def predict_encoded(self, features: np.ndarray) -> Dict[str, Any]:
+        """Make credit risk prediction for a row encoded with the feature schema"""
         try:
             if self.model is None:
                 raise ValueError("Model not loaded")
             
-            # Prepare input data
-            df = self.prepare_input_data(input_data)
-            
-            # Make prediction
-            prediction_proba = self.model.predict_proba(df)[0]
-            prediction = self.model.predict(df)[0]
-            
             # Calculate risk probability (probability of default)
-            risk_probability = prediction_proba[1]
+            risk_probability = self._predict_risk(features)[0]
+            prediction_proba = [1.0 - risk_probability, risk_probability]
             
             # Determine loan status based on risk threshold
-            risk_threshold = 0.5  # Adjustable threshold
-            loan_status = "Denied" if risk_probability > risk_threshold else "Approved"
+            loan_status = "Denied" if risk_probability > RISK_THRESHOLD else "Approved"
             
             # Create risk category
-            if risk_probability <= 0.3:
+            if risk_probability <= RISK_CATEGORY_BOUNDS[0]:
                 risk_category = "Low Risk"
-            elif risk_probability <= 0.7:
+            elif risk_probability <= RISK_CATEGORY_BOUNDS[1]:
                 risk_category = "Medium Risk"
             else:
                 risk_category = "High Risk"
@@ -118,34 +110,87 @@ class PredictionService:
             raise
     
     def predict_batch(self, input_data_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Make batch predictions"""
-        results = []
-        for input_data in input_data_list:
-            try:
-                result = self.predict(input_data)
-                results.append(result)
-            except Exception as e:
-                logger.error(f"Error in batch prediction: {str(e)}")
-                results.append({
-                    "error": str(e),
-                    "loan_status": "Error",
-                    "risk_probability": 0.0
-                })
+        """Make batch predictions with a single vectorized model call"""
+        results: List[Dict[str, Any]] = [None] * len(input_data_list)
+        
+        try:
+            if self.model is None:
+                raise ValueError("Model not loaded")
+            
+            matrix, row_errors = self.feature_layout.encode_batch(input_data_list)
+            for i, error in row_errors.items():
+                logger.error(f"Error in batch prediction (row {i}): {error}")
+                results[i] = self._batch_error(error)
+            
+            valid_rows = np.array(
+                [i for i in range(len(input_data_list)) if i not in row_errors], dtype=np.intp
+            )
+            if len(valid_rows) == 0:
+                return results
+            
+            # One model call for the whole batch
+            batch_results = self.predict_encoded_batch(matrix[valid_rows])
+        except Exception as e:
+            logger.error(f"Error in batch prediction: {str(e)}")
+            return [result or self._batch_error(str(e)) for result in results]
+        
+        for i, result in zip(valid_rows.tolist(), batch_results):
+            results[i] = result
+        
+        if row_errors:
+            logger.info(f"Batch prediction skipped {len(row_errors)} invalid applications")
         return results
     
+    def predict_encoded_batch(self, matrix: np.ndarray) -> List[Dict[str, Any]]:
+        """Score a feature matrix encoded with the feature schema in one model call"""
+        if self.model is None:
+            raise ValueError("Model not loaded")
+        
+        risk_probability = self._predict_risk(matrix)
+        
+        # Derive status and category with NumPy thresholding
+        denied = risk_probability > RISK_THRESHOLD
+        risk_category = RISK_CATEGORIES[np.digitize(risk_probability, RISK_CATEGORY_BOUNDS, right=True)]
+        confidence = np.maximum(1.0 - risk_probability, risk_probability)
+        timestamp = datetime.now().isoformat()
+        
+        results = [
+            {
+                "loan_status": "Denied" if denied[j] else "Approved",
+                "risk_probability": float(risk_probability[j]),
+                "risk_category": str(risk_category[j]),
+                "confidence": float(confidence[j]),
+                "prediction_timestamp": timestamp,
+                "model_version": "1.0"
+            }
+            for j in range(len(risk_probability))
+        ]
+        
+        logger.info(f"Batch prediction made for {len(results)} applications ({int(denied.sum())} denied)")
+        return results
+    
+    def _predict_risk(self, matrix: np.ndarray) -> np.ndarray:
+        """Probability of default for each row of an encoded feature matrix"""
+        return self.model.predict(matrix)
+    
+    @staticmethod
+    def _batch_error(error: str) -> Dict[str, Any]:
+        """Error placeholder for a row that could not be scored"""
+        return {
+            "error": error,
+            "loan_status": "Error",
+            "risk_probability": 0.0
+        }
+    
     def get_feature_importance(self) -> Dict[str, float]:
         """Get feature importance from the model"""
         if self.model is None:
             raise ValueError("Model not loaded")
         
-        if hasattr(self.model, 'feature_importances_'):
-            importance_dict = {}
-            feature_names = self.feature_columns or [f"feature_{i}" for i in range(len(self.model.feature_importances_))]
-            
-            for name, importance in zip(feature_names, self.model.feature_importances_):
-                importance_dict[name] = float(importance)
-            
-            # Sort by importance
-            return dict(sorted(importance_dict.items(), key=lambda x: x[1], reverse=True))
+        importance_dict = {
+            name: float(importance)
+            for name, importance in zip(self.feature_columns, self.model.feature_importance())
+        }
         
-        return {}
+        # Sort by importance
+        return dict(sorted(importance_dict.items(), key=lambda x: x[1], reverse=True))
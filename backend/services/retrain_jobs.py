@@ -0,0 +1,253 @@
+# backend/services/retrain_jobs.py
+"""
+Supervised Retraining Jobs
+
+Runs model retraining as a child process instead of inside the API event
+loop. The child is pinned to a limited set of CPU cores (with matching
+thread-pool sizes) and runs at a lower scheduling priority, so serving
+keeps its share of the machine. Jobs can be polled and cancelled; a job
+that finishes successfully hands the new artifact version to the caller's
+``on_success`` hook (the model registry hot-swaps it).
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Job states; the last three are final
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINAL_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+# Lines of the job log returned with its status
+LOG_TAIL_LINES = 20
+
+
+class RetrainJobConflict(RuntimeError):
+    """Raised when a retraining job is started while another one is running"""
+
+
+class RetrainJob:
+    """State of one retraining run"""
+
+    def __init__(self, job_id: str, command: List[str], log_path: Path, cpus: List[int]):
+        self.job_id = job_id
+        self.command = command
+        self.log_path = log_path
+        self.cpus = cpus
+        self.status = QUEUED
+        self.pid: Optional[int] = None
+        self.returncode: Optional[int] = None
+        self.error: Optional[str] = None
+        self.version: Optional[str] = None
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._cancel_requested = False
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINAL_STATES
+
+    def log_tail(self, n_lines: int = LOG_TAIL_LINES) -> List[str]:
+        try:
+            with open(self.log_path, errors="replace") as f:
+                return [line.rstrip("\n") for line in f.readlines()[-n_lines:]]
+        except FileNotFoundError:
+            return []
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = ((self.finished_at or datetime.now()) - self.started_at).total_seconds()
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "pid": self.pid,
+            "cpus": self.cpus,
+            "returncode": self.returncode,
+            "error": self.error,
+            "version": self.version,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "elapsed_seconds": round(elapsed, 3) if elapsed is not None else None,
+            "log_tail": self.log_tail(),
+        }
+
+
+def _allowed_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class RetrainJobManager:
+    """Starts, supervises and cancels retraining subprocesses, one at a time
+
+    ``command_factory(n_cpus)`` returns the argv of the training process.
+    Jobs live in this API process only; the registry of finished jobs is
+    capped at ``history`` entries.
+    """
+
+    def __init__(self, command_factory: Callable[[int], List[str]], log_dir: str, cwd: Optional[str] = None,
+                 max_cpus: int = 1, nice: int = 10, timeout_s: Optional[float] = None,
+                 cancel_grace_s: float = 5.0, on_success: Optional[Callable[[], Awaitable[Optional[str]]]] = None,
+                 history: int = 20):
+        self.command_factory = command_factory
+        self.log_dir = Path(log_dir)
+        self.cwd = cwd
+        self.max_cpus = max(1, max_cpus)
+        self.nice = nice
+        self.timeout_s = timeout_s
+        self.cancel_grace_s = cancel_grace_s
+        self.on_success = on_success
+        self.history = history
+        self._jobs: "OrderedDict[str, RetrainJob]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def active(self) -> Optional[RetrainJob]:
+        for job in self._jobs.values():
+            if not job.done:
+                return job
+        return None
+
+    def _pick_cpus(self) -> List[int]:
+        # The highest-numbered cores, leaving the low ones to the API and its workers
+        return _allowed_cpus()[-self.max_cpus:]
+
+    async def start(self) -> RetrainJob:
+        """Launch a retraining job; raises RetrainJobConflict if one is running"""
+        if self.active is not None:
+            raise RetrainJobConflict(f"Retraining job {self.active.job_id} is still {self.active.status}")
+
+        cpus = self._pick_cpus()
+        job_id = uuid.uuid4().hex[:12]
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        job = RetrainJob(job_id, self.command_factory(len(cpus)), self.log_dir / f"{job_id}.log", cpus)
+        self._remember(job)
+
+        # Thread pools in the child (OpenMP/BLAS) sized to the cores it may use
+        env = dict(os.environ)
+        for name in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+            env[name] = str(len(cpus))
+
+        try:
+            with open(job.log_path, "wb") as log_file:
+                # Own session, so cancellation can signal the whole process group
+                job._process = await asyncio.create_subprocess_exec(
+                    *job.command, cwd=self.cwd, env=env,
+                    stdout=log_file, stderr=asyncio.subprocess.STDOUT,
+                    stdin=asyncio.subprocess.DEVNULL, start_new_session=True
+                )
+            job.pid = job._process.pid
+            self._limit(job)
+        except Exception as e:
+            job.status, job.error, job.finished_at = FAILED, str(e), datetime.now()
+            logger.error(f"Error starting retraining job {job_id}: {str(e)}")
+            raise
+
+        job.status, job.started_at = RUNNING, datetime.now()
+        self._tasks[job_id] = asyncio.create_task(self._supervise(job))
+        logger.info(f"Retraining job {job_id} started (pid {job.pid}, cpus {cpus})")
+        return job
+
+    def _limit(self, job: RetrainJob):
+        """Pin the child to its cores and lower its priority below the API's"""
+        try:
+            if hasattr(os, "sched_setaffinity"):
+                os.sched_setaffinity(job.pid, job.cpus)
+            if self.nice and hasattr(os, "setpriority"):
+                os.setpriority(os.PRIO_PROCESS, job.pid, os.getpriority(os.PRIO_PROCESS, 0) + self.nice)
+        except (OSError, ProcessLookupError) as e:
+            # The child may already have exited; its status comes from the supervisor
+            logger.warning(f"Could not limit retraining job {job.job_id}: {str(e)}")
+
+    async def _supervise(self, job: RetrainJob):
+        try:
+            try:
+                job.returncode = await asyncio.wait_for(job._process.wait(), self.timeout_s)
+            except asyncio.TimeoutError:
+                await self._terminate(job)
+                job.status, job.error = FAILED, f"Timed out after {self.timeout_s}s"
+                return
+
+            if job._cancel_requested:
+                job.status = CANCELLED
+            elif job.returncode != 0:
+                job.status, job.error = FAILED, f"Training exited with code {job.returncode}"
+            else:
+                if self.on_success is not None:
+                    job.version = await self.on_success()
+                job.status = SUCCEEDED
+        except asyncio.CancelledError:
+            await self._terminate(job)
+            job.status = CANCELLED
+            raise
+        except Exception as e:
+            # Training finished but the new version could not be served
+            job.status, job.error = FAILED, str(e)
+        finally:
+            job.finished_at = datetime.now()
+            self._tasks.pop(job.job_id, None)
+            log = logger.error if job.status == FAILED else logger.info
+            log(f"Retraining job {job.job_id} {job.status}" + (f": {job.error}" if job.error else ""))
+
+    async def _terminate(self, job: RetrainJob):
+        """SIGTERM the job's process group, then SIGKILL it after the grace period"""
+        process = job._process
+        if process is None or process.returncode is not None:
+            return
+        for sig, wait in ((signal.SIGTERM, self.cancel_grace_s), (signal.SIGKILL, None)):
+            try:
+                os.killpg(process.pid, sig)
+            except ProcessLookupError:
+                break
+            try:
+                job.returncode = await asyncio.wait_for(process.wait(), wait)
+                break
+            except asyncio.TimeoutError:
+                continue
+
+    async def cancel(self, job_id: str) -> RetrainJob:
+        """Stop a running job; finished jobs are returned unchanged"""
+        job = self.get(job_id)
+        if job.done:
+            return job
+        job._cancel_requested = True
+        await self._terminate(job)
+        task = self._tasks.get(job_id)
+        if task is not None:
+            await asyncio.shield(task)
+        return job
+
+    def get(self, job_id: str) -> RetrainJob:
+        """Job by id; raises KeyError if unknown"""
+        return self._jobs[job_id]
+
+    def list(self) -> List[RetrainJob]:
+        """Known jobs, newest first"""
+        return list(reversed(self._jobs.values()))
+
+    def _remember(self, job: RetrainJob):
+        self._jobs[job.job_id] = job
+        while len(self._jobs) > self.history:
+            oldest = next(iter(self._jobs.values()))
+            if not oldest.done:
+                break
+            self._jobs.popitem(last=False)
+
+    async def shutdown(self):
+        """Cancel the running job, if any (API shutdown)"""
+        job = self.active
+        if job is not None:
+            await self.cancel(job.job_id)
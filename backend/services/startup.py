@@ -0,0 +1,146 @@
+# backend/services/startup.py
+"""
+API Startup and Readiness
+
+Loads the model artifacts in parallel, runs synthetic warm-up calls so the
+first real request doesn't pay first-call costs, and tracks the
+liveness/readiness state reported by /health.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Warm-up batch size; one full TreeEnsemble evaluation block sizes the SHAP scratch buffers
+WARM_UP_ROWS = 64
+
+
+def load_services(model_path: str, explainer_path: str) -> Tuple[Any, Any]:
+    """Build PredictionService and ExplainabilityService concurrently"""
+    from services.prediction_service import PredictionService
+    from services.explainability_service import ExplainabilityService
+
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="startup") as executor:
+        prediction = executor.submit(PredictionService, model_path)
+        explainability = executor.submit(ExplainabilityService, explainer_path)
+        return prediction.result(), explainability.result()
+
+
+def synthetic_records(schema, n_rows: int = WARM_UP_ROWS, model=None) -> list:
+    """Deterministic fake applications spread over each feature's serving range
+
+    A feature's range is its clip bounds from the fitted preprocessing
+    pipeline, else the span of the model's split thresholds on it (so rows
+    go down both sides of the splits), else +/-50% around its fill value
+    (the pipeline median, or the schema default). Categorical features get
+    valid category codes.
+    """
+    rng = np.random.default_rng(0)
+    pipeline = schema.pipeline
+    center = pipeline.fill_values if pipeline is not None else \
+        np.array([schema.defaults[name] for name in schema.feature_names])
+    low, high = np.minimum(0.5 * center, 1.5 * center), np.maximum(0.5 * center, 1.5 * center)
+
+    if model is not None:
+        model_index = {name: i for i, name in enumerate(model.feature_names)}
+        for i, name in enumerate(schema.feature_names):
+            thresholds = model.threshold[model.feature == model_index.get(name, -1)]
+            if len(thresholds):
+                margin = 0.1 * (thresholds.max() - thresholds.min()) or 1.0
+                low[i], high[i] = thresholds.min() - margin, thresholds.max() + margin
+
+    if pipeline is not None:
+        clipped = np.isfinite(pipeline.clip_lower) & np.isfinite(pipeline.clip_upper)
+        low[clipped], high[clipped] = pipeline.clip_lower[clipped], pipeline.clip_upper[clipped]
+
+    values = rng.uniform(low, high, size=(n_rows, schema.n_features))
+    if pipeline is not None:
+        for name, classes in pipeline.category_maps.items():
+            if name in schema.feature_index:
+                values[:, schema.feature_index[name]] = rng.integers(len(classes), size=n_rows)
+    return [dict(zip(schema.feature_names, row.tolist())) for row in values]
+
+
+def warm_up_services(prediction_service, explainability_service, n_rows: int = WARM_UP_ROWS):
+    """Exercise every serving path once (single row, batch, SHAP) with synthetic data"""
+    records = synthetic_records(prediction_service.schema, n_rows, prediction_service.model)
+    matrix = np.vstack([prediction_service.schema.encode(record) for record in records])
+
+    prediction_service.predict_encoded(matrix[:1])
+    prediction_service.predict_encoded_batch(matrix)
+    explainability_service.shap_record(matrix[:1])
+    explainability_service.explain_prediction(records[0])
+    explainability_service.explain_batch(records)
+
+
+def validate_services(prediction_service, explainability_service, n_rows: int = WARM_UP_ROWS):
+    """Smoke batch for a freshly loaded model; raises ValueError if it is not fit to serve"""
+    if prediction_service.schema.feature_names != explainability_service.schema.feature_names:
+        raise ValueError("Prediction and explanation models use different feature layouts")
+
+    records = synthetic_records(prediction_service.schema, n_rows, prediction_service.model)
+    matrix = np.vstack([prediction_service.schema.encode(record) for record in records])
+    risk = prediction_service.model.predict(matrix)
+    if not np.all(np.isfinite(risk)) or risk.min() < 0.0 or risk.max() > 1.0:
+        raise ValueError("Model produced invalid probabilities on the smoke batch")
+
+    # SHAP values must add up to the model's raw score
+    shap_values = explainability_service.compute_shap_values(matrix)
+    raw = explainability_service.base_value + shap_values.sum(axis=1)
+    if not np.allclose(raw, prediction_service.model.predict_raw(matrix), rtol=0.0, atol=1e-6):
+        raise ValueError("SHAP values do not add up to the model output on the smoke batch")
+
+
+class StartupState:
+    """Liveness/readiness of the API process
+
+    The process is live as soon as it answers HTTP; it is ready once every
+    component has loaded and warmed up.
+    """
+
+    def __init__(self):
+        self.started_at = datetime.now()
+        self.ready_at: Optional[datetime] = None
+        self.error: Optional[str] = None
+        self.components: Dict[str, Dict[str, Any]] = {}
+        self._clock = time.perf_counter()
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+    @property
+    def status(self) -> str:
+        if self.error is not None:
+            return "failed"
+        return "ready" if self.ready else "starting"
+
+    def component(self, name: str, ok: bool, seconds: float, error: Optional[str] = None):
+        self.components[name] = {"ok": ok, "seconds": round(seconds, 4)}
+        if error is not None:
+            self.components[name]["error"] = error
+
+    def mark_ready(self):
+        self.ready_at = datetime.now()
+        logger.info(f"API ready in {time.perf_counter() - self._clock:.2f}s")
+
+    def mark_failed(self, error: str):
+        self.error = error
+        logger.error(f"API startup failed: {error}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "live": True,
+            "ready": self.ready,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "ready_at": self.ready_at.isoformat() if self.ready_at else None,
+            "error": self.error,
+            "components": self.components,
+        }
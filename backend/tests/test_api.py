@@ -10,6 +10,7 @@ from fastapi.testclient import TestClient
 import json
 from pathlib import Path
 import sys
+import time
 
 # Add backend to path for imports
 backend_path = Path(__file__).parent.parent
@@ -19,6 +20,15 @@ from main import app
 
 client = TestClient(app)
 
+@pytest.fixture(scope="module", autouse=True)
+def started_app():
+    """Run the app lifespan and wait until background startup has warmed the models"""
+    with client:
+        deadline = time.monotonic() + 60
+        while client.get("/health/ready").status_code != 200 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        yield
+
 class TestHealthEndpoints:
     """Test health check endpoints"""
     
@@ -33,6 +43,27 @@ class TestHealthEndpoints:
         data = response.json()
         assert "status" in data
         assert "version" in data
+        assert data["live"] is True
+        assert data["ready"] is True
+    
+    def test_liveness_probe(self):
+        response = client.get("/health/live")
+        assert response.status_code == 200
+        assert response.json() == {"live": True}
+    
+    def test_readiness_probe(self):
+        response = client.get("/health/ready")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["ready"] is True
+        assert data["components"]["models"]["ok"] is True
+    
+    def test_model_metrics_report_served_version(self):
+        response = client.get("/metrics/models")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["version"] is not None
+        assert data["draining"] == []
 
 class TestUserEndpoints:
     """Test user management endpoints"""
@@ -46,8 +77,8 @@ class TestUserEndpoints:
         }
         
         response = client.post("/users/", json=user_data)
-        # May fail if Firebase not configured, that's expected in tests
-        assert response.status_code in [200, 400, 500]
+        # May fail if Firebase not configured (503), that's expected in tests
+        assert response.status_code in [200, 400, 500, 503]
 
 class TestApplicationEndpoints:
     """Test credit application endpoints"""
@@ -97,8 +128,8 @@ class TestApplicationEndpoints:
     
     def test_get_user_applications(self):
         response = client.get("/applications/test_user/")
-        # May return 404 if user doesn't exist, that's expected
-        assert response.status_code in [200, 404]
+        # May return 404 if user doesn't exist, or 503 without Firebase credentials
+        assert response.status_code in [200, 404, 503]
 
 class TestModelEndpoints:
     """Test model information endpoints"""
@@ -16,6 +16,13 @@ backend_path = Path(__file__).parent.parent
 sys.path.append(str(backend_path))
 
 from models.ml_models import ModelManager, calculate_derived_features, validate_prediction_input
+from models.feature_layout import FeatureLayout
+from models.feature_schema import FeatureSchema, DEFAULT_FEATURE_SCHEMA
+from models.model_artifact import ArtifactError, list_versions, set_latest
+from models.preprocessing_pipeline import PIPELINE_FILENAME, PreprocessingPipeline
+from models.quantile_sketch import KLLSketch, StreamingStatistics
+from models.tree_ensemble import TreeEnsemble
+from models.tree_shap import TreeShapExplainer
 from services.prediction_service import PredictionService
 from services.explainability_service import ExplainabilityService
 
@@ -60,6 +67,317 @@ class TestModelManager:
         incomplete_data = {'person_income': 50000}
         assert not self.model_manager.validate_model_input(incomplete_data, required_features)
 
+class TestFeatureLayout:
+    """Test compiled feature layout against the DataFrame path"""
+    
+    def test_fill_row_matches_dataframe_path(self):
+        """Test that the layout row is bit-identical to prepare_model_features"""
+        model_manager = ModelManager("test_models")
+        layout = FeatureLayout(model_manager.prepare_model_features({}).columns)
+        
+        inputs = [
+            {},
+            {'person_income': 50000, 'loan_amnt': 15000.5, 'age': 30},
+            {'person_income': None, 'loan_int_rate': float('nan'), 'mobile_banking_user': True},
+            {'late_payments_12m': 3, 'credit_risk_score': 712.25, 'loan_intent': 'personal'},
+        ]
+        for data in inputs:
+            expected = model_manager.prepare_model_features(data).to_numpy(dtype=np.float64)
+            row = layout.fill_row(data)
+            assert row.dtype == np.float64
+            assert np.array_equal(row, expected)
+    
+    def test_fill_row_reuses_buffer(self):
+        """Test that the per-thread row buffer is reused between calls"""
+        layout = FeatureLayout(['a', 'b'])
+        first = layout.fill_row({'a': 1.0})
+        second = layout.fill_row({'b': 2.0})
+        
+        assert first is second
+        assert second.tolist() == [[0.0, 2.0]]
+
+class TestFeatureSchema:
+    """Test the shared feature schema"""
+    
+    def test_save_and_load_round_trip(self, tmp_path):
+        """Test that a saved schema loads back unchanged"""
+        path = DEFAULT_FEATURE_SCHEMA.save(tmp_path / "feature_schema.json")
+        loaded = FeatureSchema.load(path)
+        
+        assert loaded.feature_names == DEFAULT_FEATURE_SCHEMA.feature_names
+        assert loaded.feature_index['loan_amnt'] == DEFAULT_FEATURE_SCHEMA.feature_index['loan_amnt']
+        assert loaded.defaults == DEFAULT_FEATURE_SCHEMA.defaults
+        assert loaded.derived_features == DEFAULT_FEATURE_SCHEMA.derived_features
+    
+    def test_for_artifact_falls_back_to_default(self, tmp_path):
+        """Test that a model without a saved schema uses the default one"""
+        schema = FeatureSchema.for_artifact(tmp_path / "model.pkl")
+        assert schema.feature_names == DEFAULT_FEATURE_SCHEMA.feature_names
+    
+    def test_apply_derived(self):
+        """Test loan_percent_income derivation"""
+        data = DEFAULT_FEATURE_SCHEMA.apply_derived({'loan_amnt': 15000, 'person_income': 50000})
+        assert abs(data['loan_percent_income'] - 0.3) < 1e-12
+        
+        data = DEFAULT_FEATURE_SCHEMA.apply_derived({'loan_amnt': 15000, 'person_income': 0})
+        assert data['loan_percent_income'] == 0
+    
+    def test_encode_returns_independent_rows(self):
+        """Test that encoded rows are not shared buffers"""
+        first = DEFAULT_FEATURE_SCHEMA.encode({'age': 30})
+        second = DEFAULT_FEATURE_SCHEMA.encode({'age': 40})
+        
+        assert first.shape == (1, DEFAULT_FEATURE_SCHEMA.n_features)
+        assert first[0, DEFAULT_FEATURE_SCHEMA.feature_index['age']] == 30
+        assert second[0, DEFAULT_FEATURE_SCHEMA.feature_index['age']] == 40
+
+class TestPreprocessingPipeline:
+    """Test the fitted preprocessing shared by training and serving"""
+    
+    def setup_method(self):
+        self.train = pd.DataFrame({
+            'loan_amnt': [1000.0, 2000.0, np.nan, 3000.0, 4000.0],
+            'age': [20.0, 30.0, 40.0, np.nan, 50.0],
+        })
+        self.pipeline = PreprocessingPipeline.fit(self.train, ['loan_amnt', 'age', 'gas_bill_avg'],
+                                                  clip_columns=['loan_amnt'], scale_params={'age': (35.0, 10.0)})
+    
+    def test_fit_and_apply(self):
+        """Test median fill, IQR clipping and scaling"""
+        q1, q3 = self.train['loan_amnt'].quantile([0.25, 0.75])
+        matrix = np.array([[np.nan, np.nan, np.nan], [1e6, 55.0, 7.0]])
+        self.pipeline.apply(matrix)
+        
+        np.testing.assert_allclose(matrix[0], [2500.0, 0.0, 0.0])
+        np.testing.assert_allclose(matrix[1], [q3 + 1.5 * (q3 - q1), 2.0, 7.0])
+    
+    def test_round_trip_and_frame_path(self, tmp_path):
+        """Test that a saved pipeline loads back and the DataFrame path matches the matrix path"""
+        loaded = PreprocessingPipeline.load(self.pipeline.save(tmp_path / PIPELINE_FILENAME))
+        
+        for name in ('fill_values', 'clip_lower', 'clip_upper', 'offset', 'scale'):
+            np.testing.assert_array_equal(getattr(loaded, name), getattr(self.pipeline, name))
+        frame = loaded.transform_frame(self.train)
+        assert list(frame.columns) == ['loan_amnt', 'age', 'gas_bill_avg']
+        matrix = self.train.reindex(columns=frame.columns).to_numpy(dtype=np.float64)
+        np.testing.assert_array_equal(frame.to_numpy(), self.pipeline.apply(matrix))
+    
+    def test_schema_encodes_through_artifact_pipeline(self, tmp_path):
+        """Test that the pipeline saved next to a model is applied by every encode path"""
+        pipeline = PreprocessingPipeline.fit(pd.DataFrame({'loan_amnt': [100.0, 200.0, 300.0, 400.0]}),
+                                             DEFAULT_FEATURE_SCHEMA.feature_names, clip_columns=['loan_amnt'])
+        pipeline.save(tmp_path / PIPELINE_FILENAME)
+        schema = FeatureSchema.for_artifact(tmp_path / "model.pkl")
+        
+        column = schema.feature_index['loan_amnt']
+        assert schema.encode({})[0, column] == 250.0
+        assert schema.encode({'loan_amnt': 1e9})[0, column] == pipeline.clip_upper[column]
+        matrix, _ = schema.layout.encode_batch([{}, {'loan_amnt': 1e9}])
+        np.testing.assert_array_equal(matrix[:, column], [250.0, pipeline.clip_upper[column]])
+
+class TestQuantileSketch:
+    """Test mergeable KLL quantile sketches"""
+    
+    def setup_method(self):
+        self.values = np.random.default_rng(0).lognormal(10, 1, 200_000)
+        self.qs = np.array([0.01, 0.25, 0.5, 0.75, 0.99])
+    
+    def rank_error(self, estimates):
+        return np.abs(np.searchsorted(np.sort(self.values), estimates) / len(self.values) - self.qs)
+    
+    def test_rank_error_within_bound(self):
+        """Test that a streamed sketch stays small and within its rank-error bound"""
+        sketch = KLLSketch(k=200, seed=1)
+        for chunk in np.array_split(self.values, 50):
+            sketch.update(chunk)
+        
+        assert sketch.n == len(self.values)
+        assert sketch.size < 1000
+        assert self.rank_error(sketch.quantiles(self.qs)).max() < 1.7 / 200
+        assert sketch.quantile(0.0) == self.values.min() and sketch.quantile(1.0) == self.values.max()
+    
+    def test_merged_shards_match_whole_stream(self):
+        """Test that sketches of shards, serialized and merged, keep the same accuracy"""
+        shards = [KLLSketch(k=200, seed=i).update(part) for i, part in enumerate(np.array_split(self.values, 8))]
+        merged = KLLSketch(k=200, seed=99)
+        for shard in shards:
+            merged.merge(KLLSketch.from_dict(shard.to_dict()))
+        
+        assert merged.n == len(self.values)
+        assert self.rank_error(merged.quantiles(self.qs)).max() < 1.7 / 200
+    
+    def test_statistics_fit_pipeline(self):
+        """Test medians, modes and IQR bounds from merged streaming statistics"""
+        df = pd.DataFrame({'loan_amnt': np.arange(100, dtype=np.float64),
+                           'region': ['north'] * 60 + ['south'] * 40})
+        stats = StreamingStatistics.merged([StreamingStatistics().update(part) for part in (df[:30], df[30:])])
+        pipeline = PreprocessingPipeline.from_statistics(stats, ['loan_amnt', 'age'], clip_columns=['loan_amnt'])
+        
+        assert stats.rows == 100 and stats.modes() == {'region': 'north'}
+        # Fewer than k items per column are kept exactly (quantiles are lower order statistics)
+        assert pipeline.fill_values.tolist() == [49.0, 0.0]
+        assert pipeline.clip_upper[0] == 74.0 + 1.5 * 50 and np.isinf(pipeline.clip_upper[1])
+
+class TestTreeEnsemble:
+    """Test the flattened tree ensemble against LightGBM"""
+    
+    def test_matches_lightgbm_with_missing_value_splits(self, tmp_path):
+        import lightgbm as lgb
+        
+        rng = np.random.default_rng(0)
+        X = rng.normal(size=(2000, 5))
+        X[rng.random(X.shape) < 0.2] = np.nan
+        X[rng.random(X.shape) < 0.2] = 0.0
+        y = (np.nan_to_num(X[:, 0]) + np.isnan(X[:, 1]) + rng.normal(size=2000) > 0.3).astype(int)
+        
+        for zero_as_missing in (False, True):
+            booster = lgb.train(
+                {'objective': 'binary', 'num_leaves': 40, 'min_data_in_leaf': 5,
+                 'zero_as_missing': zero_as_missing, 'verbose': -1},
+                lgb.Dataset(X, y), num_boost_round=20
+            )
+            ensemble = TreeEnsemble.load(TreeEnsemble.from_booster(booster).save(tmp_path / f"artifacts_{zero_as_missing}"))
+            
+            np.testing.assert_allclose(ensemble.predict_raw(X), booster.predict(X, raw_score=True), rtol=0, atol=1e-12)
+            np.testing.assert_allclose(ensemble.predict(X[:1]), booster.predict(X[:1]), rtol=0, atol=1e-12)
+            assert ensemble.feature_importance().tolist() == booster.feature_importance('split').tolist()
+    
+    def test_all_stump_ensemble_scores_constant(self):
+        # Three single-leaf trees, as federated clients with too few rows produce
+        leaves = {'feature': [-1] * 3, 'threshold': [0.0] * 3, 'left': [-1] * 3, 'right': [-1] * 3,
+                  'default_left': [True] * 3, 'missing_type': [0] * 3, 'value': [0.1, -0.3, 0.05],
+                  'cover': [30.0] * 3}
+        ensemble = TreeEnsemble(['a', 'b'], np.arange(3), leaves)
+        X = np.array([[1.0, np.nan], [0.0, 2.0]])
+        
+        np.testing.assert_allclose(ensemble.predict_raw(X), [-0.15, -0.15])
+        np.testing.assert_allclose(ensemble.predict(X[0]), [1.0 / (1.0 + np.exp(0.15))])
+        assert ensemble.leaf_indices(X).shape == (2, 0)
+    
+    def test_matches_trained_model_predict_proba(self):
+        model_path = backend_path / "trained_models" / "global_credit_model.pkl"
+        if not model_path.exists():
+            pytest.skip("Model not available")
+        import joblib
+        
+        model = joblib.load(model_path)
+        ensemble = TreeEnsemble.from_booster(model)
+        X = pd.read_csv(backend_path / "data" / "processed_data.csv")[ensemble.feature_names]
+        
+        np.testing.assert_allclose(ensemble.predict(X.to_numpy()), model.predict_proba(X)[:, 1], rtol=0, atol=1e-12)
+
+class TestModelArtifact:
+    """Test the versioned, memory-mapped model artifact format"""
+    
+    def make_ensemble(self, seed=0, rounds=5):
+        import lightgbm as lgb
+        
+        rng = np.random.default_rng(seed)
+        X = rng.normal(size=(500, 4))
+        y = (X[:, 0] + rng.normal(size=500) > 0).astype(int)
+        booster = lgb.train({'objective': 'binary', 'num_leaves': 8, 'verbose': -1}, lgb.Dataset(X, y), num_boost_round=rounds)
+        return TreeEnsemble.from_booster(booster), X
+    
+    def test_load_is_memory_mapped_and_pickle_free(self, tmp_path):
+        ensemble, X = self.make_ensemble()
+        version_dir = ensemble.save(tmp_path)
+        
+        loaded = TreeEnsemble.load(tmp_path, verify=True)
+        
+        assert loaded.artifact_version == version_dir.name
+        assert isinstance(loaded.threshold.base, np.memmap)
+        assert not loaded.threshold.flags.writeable
+        assert not list(tmp_path.rglob("*.pkl"))
+    
+    def test_compiled_arrays_are_loaded_not_recomputed(self, tmp_path):
+        from unittest.mock import patch
+        
+        ensemble, X = self.make_ensemble()
+        ensemble.save(tmp_path)
+        
+        with patch.object(TreeEnsemble, '_compile', side_effect=AssertionError("recompiled on load")):
+            loaded = TreeEnsemble.load(tmp_path)
+        
+        for array in (loaded._split_threshold, loaded._split_left_bits, loaded._leaf_values, loaded.split_nodes):
+            assert not array.flags.writeable
+            while not isinstance(array, np.memmap) and array.base is not None:
+                array = array.base
+            assert isinstance(array, np.memmap)
+        assert loaded._split_threshold.shape == (len(loaded.split_nodes), 1)
+        assert loaded._bias == ensemble._bias
+        np.testing.assert_array_equal(loaded.predict_raw(X), ensemble.predict_raw(X))
+        np.testing.assert_array_equal(loaded.predict_raw(X), ensemble.predict_raw(X))
+    
+    def test_latest_pointer_selects_version(self, tmp_path):
+        first, X = self.make_ensemble(seed=0)
+        second, _ = self.make_ensemble(seed=1)
+        first_dir = first.save(tmp_path)
+        second_dir = second.save(tmp_path)
+        
+        assert list_versions(tmp_path) == sorted([first_dir.name, second_dir.name])
+        assert TreeEnsemble.load(tmp_path).artifact_version == second_dir.name
+        
+        set_latest(tmp_path, first_dir.name)
+        np.testing.assert_array_equal(TreeEnsemble.load(tmp_path).predict_raw(X), first.predict_raw(X))
+        with pytest.raises(ArtifactError):
+            set_latest(tmp_path, "missing")
+    
+    def test_rejects_tampered_arrays(self, tmp_path):
+        ensemble, _ = self.make_ensemble()
+        version_dir = ensemble.save(tmp_path)
+        
+        values = np.load(version_dir / "value.npy")
+        np.save(version_dir / "value.npy", values + 1.0)
+        TreeEnsemble.load(version_dir)  # shapes still match the manifest
+        with pytest.raises(ArtifactError):
+            TreeEnsemble.load(version_dir, verify=True)
+        
+        np.save(version_dir / "value.npy", values.astype(np.float32))
+        with pytest.raises(ArtifactError):
+            TreeEnsemble.load(version_dir)
+
+class TestTreeShap:
+    """Test native TreeSHAP against shap / LightGBM pred_contrib"""
+    
+    def test_matches_pred_contrib_with_missing_value_splits(self):
+        import lightgbm as lgb
+        
+        rng = np.random.default_rng(1)
+        X = rng.normal(size=(1000, 6))
+        X[rng.random(X.shape) < 0.2] = np.nan
+        X[rng.random(X.shape) < 0.2] = 0.0
+        y = (np.nan_to_num(X[:, 0]) + np.isnan(X[:, 1]) + rng.normal(size=1000) > 0.3).astype(int)
+        
+        for zero_as_missing in (False, True):
+            booster = lgb.train(
+                {'objective': 'binary', 'num_leaves': 40, 'min_data_in_leaf': 3,
+                 'zero_as_missing': zero_as_missing, 'verbose': -1},
+                lgb.Dataset(X, y), num_boost_round=20
+            )
+            explainer = TreeShapExplainer(TreeEnsemble.from_booster(booster))
+            contrib = booster.predict(X, pred_contrib=True)
+            
+            np.testing.assert_allclose(explainer.shap_values(X), contrib[:, :-1], rtol=0, atol=1e-9)
+            assert explainer.expected_value == pytest.approx(contrib[0, -1], abs=1e-9)
+    
+    def test_matches_shap_tree_explainer(self):
+        explainer_path = backend_path / "trained_models" / "shap_explainer.pkl"
+        if not explainer_path.exists():
+            pytest.skip("Explainer not available")
+        import joblib
+        
+        reference = joblib.load(explainer_path)
+        ensemble = TreeEnsemble.from_booster(reference.model.original_model)
+        explainer = TreeShapExplainer(ensemble)
+        X = pd.read_csv(backend_path / "data" / "processed_data.csv")[ensemble.feature_names].to_numpy()
+        X[::5, 3] = np.nan
+        
+        shap_values = explainer.shap_values(X)
+        np.testing.assert_allclose(shap_values, reference.shap_values(X), rtol=0, atol=1e-6)
+        assert explainer.expected_value == pytest.approx(reference.expected_value, abs=1e-6)
+        np.testing.assert_allclose(shap_values.sum(axis=1) + explainer.expected_value,
+                                   ensemble.predict_raw(X), rtol=0, atol=1e-9)
+
 class TestDerivedFeatures:
     """Test derived feature calculations"""
     
@@ -163,6 +481,57 @@ class TestPredictionService:
         assert 0 <= result['risk_probability'] <= 1
         assert 0 <= result['confidence'] <= 1
         assert result['loan_status'] in ['Approved', 'Denied']
+    
+    def test_predict_batch_matches_single_predictions(self):
+        """Test vectorized batch scoring against per-row predictions"""
+        if not self.has_model:
+            pytest.skip("Model not available")
+        
+        df = pd.read_csv(backend_path / "data" / "processed_data.csv").head(50)
+        input_data_list = df.to_dict(orient="records")
+        input_data_list[3]["monthly_airtime_spend"] = None
+        
+        batch_results = self.prediction_service.predict_batch(input_data_list)
+        
+        assert len(batch_results) == len(input_data_list)
+        for input_data, batch_result in zip(input_data_list, batch_results):
+            single_result = self.prediction_service.predict(input_data)
+            assert batch_result['risk_probability'] == single_result['risk_probability']
+            assert batch_result['loan_status'] == single_result['loan_status']
+            assert batch_result['risk_category'] == single_result['risk_category']
+            assert batch_result['confidence'] == single_result['confidence']
+    
+    def test_predict_matches_dataframe_path(self):
+        """Test that tree-ensemble scoring on the layout row matches the sklearn DataFrame path"""
+        model_path = backend_path / "trained_models" / "global_credit_model.pkl"
+        if not self.has_model or not model_path.exists():
+            pytest.skip("Model not available")
+        import joblib
+        
+        sklearn_model = joblib.load(model_path)
+        df = pd.read_csv(backend_path / "data" / "processed_data.csv").head(20)
+        for input_data in df.to_dict(orient="records"):
+            expected = sklearn_model.predict_proba(
+                self.prediction_service.prepare_input_data(input_data)
+            )[0]
+            result = self.prediction_service.predict(input_data)
+            assert result['risk_probability'] == pytest.approx(expected[1], abs=1e-12)
+            assert result['confidence'] == pytest.approx(max(expected), abs=1e-12)
+    
+    def test_predict_batch_isolates_row_errors(self):
+        """Test that a bad row does not fail the rest of the batch"""
+        if not self.has_model:
+            pytest.skip("Model not available")
+        
+        good_row = {'person_income': 50000, 'loan_amnt': 15000, 'age': 30}
+        bad_row = {'person_income': 'not a number', 'loan_amnt': 15000}
+        
+        results = self.prediction_service.predict_batch([good_row, bad_row, good_row])
+        
+        assert results[1]['loan_status'] == 'Error'
+        assert 'error' in results[1]
+        assert results[0]['loan_status'] in ['Approved', 'Denied']
+        assert results[0] == results[2]
 
 if __name__ == "__main__":
     pytest.main([__file__])
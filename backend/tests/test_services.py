@@ -6,7 +6,10 @@ Tests Firebase service, prediction service, and explainability service.
 """
 
 import pytest
+import asyncio
+import time
 from unittest.mock import Mock, patch
+import numpy as np
 import pandas as pd
 from pathlib import Path
 import sys
@@ -15,7 +18,10 @@ import sys
 backend_path = Path(__file__).parent.parent
 sys.path.append(str(backend_path))
 
-from services.firebase_service import FirebaseService
+from services.firebase_service import FirebaseService, AsyncFirebaseService
+from services.explanation_cache import ExplanationCache
+from services.inference_pool import InferencePool, InferencePoolSaturated
+from services.prediction_batcher import PredictionBatcher
 
 class TestFirebaseService:
     """Test Firebase service functionality"""
@@ -93,13 +99,578 @@ class TestFirebaseService:
         mock_user_doc = Mock()
         mock_user_doc.collection.return_value = mock_collection
         
-        self.mock_db.collection.return_value.document.return_value = mock_user_doc
+        mock_index_ref = Mock()
+        users_collection = Mock()
+        users_collection.document.return_value = mock_user_doc
+        index_collection = Mock()
+        index_collection.document.return_value = mock_index_ref
+        self.mock_db.collection.side_effect = lambda name: index_collection if name == 'applications_index' else users_collection
+        
+        mock_batch = Mock()
+        self.mock_db.batch.return_value = mock_batch
         
         # Should not raise exception
         self.firebase_service.store_application('user123', 'app123', application_data)
         
-        # Verify the call chain
-        mock_app_ref.set.assert_called_with(application_data)
+        # Verify application and index pointer are written in one batch
+        mock_batch.set.assert_any_call(mock_app_ref, application_data)
+        mock_batch.set.assert_any_call(mock_index_ref, {'user_id': 'user123', 'application_id': 'app123'})
+        mock_batch.commit.assert_called_once()
+    
+    def test_get_application_uses_index(self):
+        """Test application lookup through applications_index"""
+        index_doc = Mock()
+        index_doc.exists = True
+        index_doc.to_dict.return_value = {'user_id': 'user123', 'application_id': 'app123'}
+        app_doc = Mock()
+        app_doc.exists = True
+        app_doc.to_dict.return_value = {'application_id': 'app123'}
+        
+        index_collection = Mock()
+        index_collection.document.return_value.get.return_value = index_doc
+        users_collection = Mock()
+        users_collection.document.return_value.collection.return_value.document.return_value.get.return_value = app_doc
+        self.mock_db.collection.side_effect = lambda name: index_collection if name == 'applications_index' else users_collection
+        
+        result = self.firebase_service.get_application('app123')
+        
+        assert result == {'application_id': 'app123'}
+        users_collection.document.assert_called_with('user123')
+        users_collection.stream.assert_not_called()
+        self.mock_db.collection_group.assert_not_called()
+    
+    def test_get_application_not_indexed(self):
+        """Test fallback lookup for applications without an index pointer"""
+        index_doc = Mock()
+        index_doc.exists = False
+        self.mock_db.collection.return_value.document.return_value.get.return_value = index_doc
+        
+        app_doc = Mock()
+        app_doc.to_dict.return_value = {'application_id': 'legacy'}
+        query = self.mock_db.collection_group.return_value.where.return_value.limit.return_value
+        query.stream.return_value = [app_doc]
+        
+        assert self.firebase_service.get_application('legacy') == {'application_id': 'legacy'}
+        
+        query.stream.return_value = []
+        assert self.firebase_service.get_application('missing') is None
+    
+    def test_backfill_application_index(self):
+        """Test index backfill from existing applications"""
+        app_docs = []
+        for i in range(3):
+            app_doc = Mock()
+            app_doc.id = f'app{i}'
+            app_doc.reference.parent.parent.id = 'user123'
+            app_docs.append(app_doc)
+        self.mock_db.collection_group.return_value.stream.return_value = app_docs
+        mock_batch = Mock()
+        self.mock_db.batch.return_value = mock_batch
+        
+        written = self.firebase_service.backfill_application_index()
+        
+        assert written == 3
+        assert mock_batch.set.call_count == 3
+        mock_batch.commit.assert_called_once()
+
+class TestAsyncFirebaseService:
+    """Test the thread-pool backed async Firestore facade"""
+    
+    def test_delegates_to_sync_service(self):
+        sync_service = Mock()
+        sync_service.get_user_applications.return_value = [{'application_id': 'app1'}]
+        async_service = AsyncFirebaseService(sync_service, max_workers=2)
+        
+        result = asyncio.run(async_service.get_user_applications('user123', 5, 0))
+        async_service.shutdown()
+        
+        assert result == [{'application_id': 'app1'}]
+        sync_service.get_user_applications.assert_called_once_with('user123', 5, 0)
+    
+    def test_calls_do_not_block_event_loop(self):
+        """Concurrent slow reads should overlap instead of running back to back"""
+        sync_service = Mock()
+        sync_service.get_application.side_effect = lambda application_id: time.sleep(0.1) or {'application_id': application_id}
+        async_service = AsyncFirebaseService(sync_service, max_workers=5)
+        
+        async def run():
+            start = time.perf_counter()
+            results = await asyncio.gather(*(async_service.get_application(f'app{i}') for i in range(5)))
+            return results, time.perf_counter() - start
+        
+        results, elapsed = asyncio.run(run())
+        async_service.shutdown()
+        
+        assert [r['application_id'] for r in results] == [f'app{i}' for i in range(5)]
+        assert elapsed < 0.4
+
+class TestInferencePool:
+    """Test the bounded inference worker pool"""
+    
+    def make_pool(self, service, max_workers=1, max_queue=1):
+        return InferencePool(mode="thread", max_workers=max_workers, max_queue=max_queue,
+                             resolver=lambda name, version: service)
+    
+    def test_runs_service_method(self):
+        service = Mock()
+        service.predict_encoded.return_value = {'loan_status': 'Approved'}
+        pool = self.make_pool(service)
+        
+        result = asyncio.run(pool.run("prediction", "predict_encoded", [[1.0]]))
+        pool.shutdown()
+        
+        assert result == {'loan_status': 'Approved'}
+        service.predict_encoded.assert_called_once_with([[1.0]])
+        assert pool.metrics()['completed'] == 1
+    
+    def test_rejects_when_saturated(self):
+        """Calls beyond workers + queue are rejected instead of queued"""
+        service = Mock()
+        service.predict_encoded.side_effect = lambda features: time.sleep(0.2) or features
+        pool = self.make_pool(service, max_workers=1, max_queue=1)
+        
+        async def run():
+            return await asyncio.gather(
+                *(pool.run("prediction", "predict_encoded", i) for i in range(3)),
+                return_exceptions=True
+            )
+        
+        results = asyncio.run(run())
+        pool.shutdown()
+        
+        assert sorted(r for r in results if not isinstance(r, Exception)) == [0, 1]
+        assert sum(isinstance(r, InferencePoolSaturated) for r in results) == 1
+        
+        metrics = pool.metrics()
+        assert metrics['rejected'] == 1
+        assert metrics['max_queue_depth'] == 1
+        assert metrics['in_flight'] == 0
+        assert metrics['wait_ms_max'] >= 150
+
+class TestPredictionBatcher:
+    """Test coalescing of concurrent predictions"""
+    
+    def test_coalesces_concurrent_requests(self):
+        import numpy as np
+        batch_sizes = []
+        
+        async def score_batch(matrix, version):
+            batch_sizes.append(len(matrix))
+            return [{'row': float(row[0])} for row in matrix]
+        
+        batcher = PredictionBatcher(score_batch, max_batch_size=8, max_wait_ms=20)
+        
+        async def run():
+            results = await asyncio.gather(*(batcher.submit(np.array([[float(i)]])) for i in range(10)))
+            await batcher.stop()
+            return results
+        
+        results = asyncio.run(run())
+        
+        assert [r['row'] for r in results] == [float(i) for i in range(10)]
+        assert batch_sizes == [8, 2]
+        assert batcher.metrics()['batches'] == 2
+    
+    def test_batch_errors_reach_every_caller(self):
+        import numpy as np
+        
+        async def score_batch(matrix, version):
+            raise InferencePoolSaturated("full")
+        
+        batcher = PredictionBatcher(score_batch, max_batch_size=4, max_wait_ms=5)
+        
+        async def run():
+            results = await asyncio.gather(*(batcher.submit(np.zeros((1, 1))) for _ in range(3)),
+                                           return_exceptions=True)
+            await batcher.stop()
+            return results
+        
+        assert all(isinstance(r, InferencePoolSaturated) for r in asyncio.run(run()))
+    
+    def test_groups_batches_by_pinned_version(self):
+        """Requests straddling a hot swap are scored by the version each one pinned"""
+        import numpy as np
+        calls = []
+        
+        async def score_batch(matrix, version):
+            calls.append((version, len(matrix)))
+            return [{'version': version, 'row': float(row[0])} for row in matrix]
+        
+        batcher = PredictionBatcher(score_batch, max_batch_size=8, max_wait_ms=20)
+        versions = ['v1', 'v2', 'v1', 'v2', 'v2']
+        
+        async def run():
+            results = await asyncio.gather(*(batcher.submit(np.array([[float(i)]]), version)
+                                             for i, version in enumerate(versions)))
+            await batcher.stop()
+            return results
+        
+        results = asyncio.run(run())
+        
+        assert [(r['version'], r['row']) for r in results] == [(v, float(i)) for i, v in enumerate(versions)]
+        assert sorted(calls) == [('v1', 2), ('v2', 3)]
+
+class TestExplanationCache:
+    """Test the application_id -> explanation LRU"""
+    
+    def test_get_and_put(self):
+        cache = ExplanationCache(max_size=2)
+        cache.put('app1', {'shap_values': [0.1]})
+        
+        assert cache.get('app1') == {'shap_values': [0.1]}
+        assert cache.get('missing') is None
+    
+    def test_evicts_least_recently_used(self):
+        cache = ExplanationCache(max_size=2)
+        cache.put('app1', {})
+        cache.put('app2', {})
+        cache.get('app1')  # app2 is now least recently used
+        cache.put('app3', {})
+        
+        assert 'app1' in cache
+        assert 'app2' not in cache
+        assert 'app3' in cache
+        assert len(cache) == 2
+
+class TestStartup:
+    """Test API startup loading, warm-up and readiness state"""
+
+    def test_startup_state_transitions(self):
+        from services.startup import StartupState
+
+        state = StartupState()
+        assert state.status == "starting"
+        assert state.to_dict()["live"] is True
+        assert not state.ready
+
+        state.component("models", True, 0.25)
+        state.mark_ready()
+        assert state.ready
+        assert state.to_dict()["components"]["models"] == {"ok": True, "seconds": 0.25}
+
+        state.mark_failed("boom")
+        assert state.status == "failed"
+
+    def test_load_and_warm_up_services(self):
+        from services.startup import load_services, warm_up_services
+
+        try:
+            prediction_service, explainability_service = load_services(
+                str(backend_path / "trained_models" / "global_credit_model.pkl"),
+                str(backend_path / "trained_models" / "shap_explainer.pkl")
+            )
+        except FileNotFoundError:
+            pytest.skip("Trained models not available")
+
+        with patch.object(explainability_service, 'explain_batch', wraps=explainability_service.explain_batch) as explain_batch:
+            warm_up_services(prediction_service, explainability_service, n_rows=4)
+
+        assert explain_batch.call_count == 1
+        assert len(explain_batch.call_args[0][0]) == 4
+    
+    def test_synthetic_records_cover_pipeline_ranges(self):
+        """Smoke rows are distinct and spread over the fitted clip ranges, not copies of the defaults"""
+        from models.feature_schema import FeatureSchema
+        from models.preprocessing_pipeline import PreprocessingPipeline
+        from services.startup import synthetic_records
+        
+        names = ['loan_amnt', 'loan_int_rate', 'person_home_ownership']
+        pipeline = PreprocessingPipeline(names, [9000.0, 11.0, 0.0], clip_lower=[500.0, -np.inf, -np.inf],
+                                         clip_upper=[35000.0, np.inf, np.inf],
+                                         category_maps={'person_home_ownership': ['MORTGAGE', 'OWN', 'RENT']})
+        schema = FeatureSchema(names, pipeline=pipeline)
+        
+        records = synthetic_records(schema, n_rows=64)
+        
+        assert len({tuple(record.values()) for record in records}) == 64
+        loan_amnt = np.array([record['loan_amnt'] for record in records])
+        assert loan_amnt.min() >= 500.0 and loan_amnt.max() <= 35000.0 and loan_amnt.std() > 1000.0
+        rates = np.array([record['loan_int_rate'] for record in records])
+        assert rates.min() >= 5.5 and rates.max() <= 16.5
+        assert {record['person_home_ownership'] for record in records} == {0.0, 1.0, 2.0}
+
+class TestModelRegistry:
+    """Test hot swapping of model versions"""
+    
+    def make_root(self, tmp_path):
+        """Artifact root with the trained model as its only version"""
+        from models.tree_ensemble import TreeEnsemble
+        from models.feature_schema import FeatureSchema, SCHEMA_FILENAME
+        
+        try:
+            self.ensemble = TreeEnsemble.load(backend_path / "trained_models" / "artifacts")
+        except FileNotFoundError:
+            pytest.skip("Trained model artifacts not available")
+        self.documents = {SCHEMA_FILENAME: FeatureSchema.for_artifact(backend_path / "trained_models" / "artifacts").to_dict()}
+        self.first = self.ensemble.save(tmp_path, documents=self.documents).name
+        return tmp_path
+    
+    def save_variant(self, root, scale):
+        """New LATEST version with every leaf value scaled"""
+        from models.tree_ensemble import TreeEnsemble, _NODE_ARRAYS
+        
+        nodes = {name: getattr(self.ensemble, name) for name in _NODE_ARRAYS}
+        nodes['value'] = nodes['value'] * scale
+        variant = TreeEnsemble(self.ensemble.feature_names, self.ensemble.tree_offsets, nodes, self.ensemble.sigmoid)
+        return variant.save(root, documents=self.documents).name
+    
+    def test_swap_keeps_pinned_version_until_drained(self, tmp_path):
+        from services.model_registry import ModelRegistry
+        
+        root = self.make_root(tmp_path)
+        registry = ModelRegistry(str(root), warm_up=False)
+        assert registry.refresh()
+        assert not registry.refresh()
+        
+        with registry.acquire() as pinned:
+            second = self.save_variant(root, 0.5)
+            assert registry.refresh()
+            
+            assert registry.current.version == second
+            assert pinned.version == self.first
+            assert registry.get(self.first) is pinned
+            assert registry.metrics()['draining'] == [self.first]
+        
+        assert registry.metrics()['draining'] == []
+        assert registry.metrics()['swaps'] == 2
+        with pytest.raises(LookupError):
+            registry.get(self.first)
+    
+    def test_services_share_one_ensemble_per_version(self, tmp_path):
+        from services.model_registry import ModelRegistry
+        
+        root = self.make_root(tmp_path)
+        registry = ModelRegistry(str(root), warm_up=False)
+        handle = registry.load(self.first)
+        
+        assert handle.explainability.explainer.ensemble is handle.prediction.model
+        assert registry.load(self.first).prediction.model is handle.prediction.model
+        second = self.save_variant(root, 0.5)
+        assert registry.load(second).prediction.model is not handle.prediction.model
+    
+    def test_invalid_version_is_not_swapped_in(self, tmp_path):
+        from services.model_registry import ModelRegistry
+        
+        root = self.make_root(tmp_path)
+        registry = ModelRegistry(str(root), warm_up=False)
+        registry.refresh()
+        
+        self.save_variant(root, np.nan)
+        with pytest.raises(ValueError):
+            registry.refresh()
+        
+        assert registry.current.version == self.first
+        assert registry.metrics()['failed_loads'] == 1
+    
+    def test_inference_pool_runs_pinned_version(self, tmp_path):
+        from services.model_registry import ModelRegistry
+        
+        root = self.make_root(tmp_path)
+        registry = ModelRegistry(str(root), warm_up=False)
+        registry.refresh()
+        pool = InferencePool(mode="thread", max_workers=1, max_queue=1,
+                             resolver=lambda name, version: registry.get(version).service(name))
+        features = registry.current.prediction.schema.encode({'person_income': 50000, 'loan_amnt': 15000})
+        
+        async def run(version):
+            return await pool.run("prediction", "predict_encoded", features, version=version)
+        
+        with registry.acquire() as pinned:
+            self.save_variant(root, 2.0)
+            registry.refresh()
+            old = asyncio.run(run(pinned.version))
+            new = asyncio.run(run(None))
+        pool.shutdown()
+        
+        assert old['risk_probability'] == pinned.prediction.predict_encoded(features)['risk_probability']
+        assert new['risk_probability'] != old['risk_probability']
+    
+    def test_worker_serves_pinned_version_without_swapping(self, tmp_path, monkeypatch):
+        from services import inference_pool
+        from services.model_registry import ModelRegistry
+        
+        root = self.make_root(tmp_path)
+        registry = ModelRegistry(str(root), warm_up=False)
+        registry.refresh()
+        monkeypatch.setattr(inference_pool, '_worker_registry', registry)
+        monkeypatch.setattr(inference_pool, '_worker_handles', inference_pool.OrderedDict())
+        first = registry.current
+        
+        second = self.save_variant(root, 0.5)
+        # Unpinned calls follow LATEST; the replaced version stays cached for pinned calls
+        assert inference_pool._worker_handle(None).version == second
+        assert registry.current.version == second
+        with patch.object(registry, 'load', wraps=registry.load) as load:
+            for _ in range(3):
+                assert inference_pool._worker_handle(self.first) is first
+                assert inference_pool._worker_handle(second) is registry.current
+        load.assert_not_called()
+        assert registry.current.version == second
+        assert registry.metrics()['swaps'] == 2
+
+class TestRetrainJobManager:
+    """Test supervised retraining subprocesses"""
+
+    def make_manager(self, tmp_path, script, **kwargs):
+        from services.retrain_jobs import RetrainJobManager
+        return RetrainJobManager(lambda n_cpus: [sys.executable, "-c", script, str(n_cpus)],
+                                 log_dir=str(tmp_path), **kwargs)
+
+    def test_successful_job_reports_new_version(self, tmp_path):
+        async def on_success():
+            return "v2"
+
+        manager = self.make_manager(tmp_path, "import os, sys; print('threads', os.environ['OMP_NUM_THREADS'], sys.argv[1])",
+                                    on_success=on_success)
+
+        async def run():
+            job = await manager.start()
+            await manager._tasks[job.job_id]
+            return job
+
+        job = asyncio.run(run()).to_dict()
+
+        assert job['status'] == 'succeeded'
+        assert job['returncode'] == 0
+        assert job['version'] == 'v2'
+        assert job['log_tail'] == ['threads 1 1']
+
+    def test_cancel_stops_running_job(self, tmp_path):
+        from services.retrain_jobs import RetrainJobConflict
+
+        manager = self.make_manager(tmp_path, "import time; time.sleep(30)", cancel_grace_s=1.0)
+
+        async def run():
+            job = await manager.start()
+            with pytest.raises(RetrainJobConflict):
+                await manager.start()
+            start = time.perf_counter()
+            await manager.cancel(job.job_id)
+            return job, time.perf_counter() - start
+
+        job, elapsed = asyncio.run(run())
+
+        assert job.status == 'cancelled'
+        assert elapsed < 5
+        assert manager.active is None
+
+    def test_failed_job(self, tmp_path):
+        manager = self.make_manager(tmp_path, "raise SystemExit(3)")
+
+        async def run():
+            job = await manager.start()
+            await manager._tasks[job.job_id]
+            return job
+
+        job = asyncio.run(run())
+
+        assert job.status == 'failed'
+        assert job.returncode == 3
+
+class TestExplainabilityService:
+    """Test ExplainabilityService (if explainer is available)"""
+    
+    def setup_method(self):
+        try:
+            from services.explainability_service import ExplainabilityService
+            self.explainability_service = ExplainabilityService(str(backend_path / "trained_models" / "shap_explainer.pkl"))
+            self.has_explainer = self.explainability_service.explainer is not None
+        except Exception:
+            self.has_explainer = False
+    
+    def test_explain_from_record_matches_fresh_explanation(self):
+        """Test that a stored SHAP record renders the same explanation"""
+        if not self.has_explainer:
+            pytest.skip("Explainer not available")
+        
+        input_data = pd.read_csv(backend_path / "data" / "processed_data.csv").head(1).to_dict(orient="records")[0]
+        features = self.explainability_service.schema.encode(input_data)
+        
+        fresh = self.explainability_service.explain_encoded(features, input_data, top_n=5)
+        record = self.explainability_service.shap_record(features)
+        cached = self.explainability_service.explain_from_record(record, input_data, top_n=5)
+        
+        assert cached["top_features"] == fresh["top_features"]
+        assert cached["base_value"] == fresh["base_value"]
+        assert cached["readable_explanation"] == fresh["readable_explanation"]
+
+    def test_explain_batch_matches_single_explanations(self):
+        """Test that the one-call batch path returns the per-row explanations"""
+        if not self.has_explainer:
+            pytest.skip("Explainer not available")
+        
+        input_data_list = pd.read_csv(backend_path / "data" / "processed_data.csv").head(8).to_dict(orient="records")
+        input_data_list.append({'person_income': 50000, 'loan_amnt': 15000})  # sparse row with many ties
+        
+        batch = self.explainability_service.explain_batch(input_data_list, top_n=10)
+        
+        assert len(batch) == len(input_data_list)
+        for input_data, batch_explanation in zip(input_data_list, batch):
+            single = self.explainability_service.explain_prediction(input_data, top_n=10)
+            assert list(batch_explanation["top_features"]) == list(single["top_features"])
+            assert batch_explanation["top_features"] == single["top_features"]
+            assert batch_explanation["readable_explanation"] == single["readable_explanation"]
+            assert batch_explanation["total_shap_contribution"] == pytest.approx(single["total_shap_contribution"])
+
+class TestFeatureRanking:
+    """Test vectorized top-k feature ranking"""
+    
+    def test_rank_top_features_orders_by_magnitude(self):
+        import numpy as np
+        from services.explainability_service import ExplainabilityService
+        
+        shap_values = np.array([
+            [0.1, -0.5, 0.0, 0.3],
+            [0.0, 0.0, 0.2, 0.0],
+        ])
+        top = ExplainabilityService.rank_top_features(shap_values, 3)
+        
+        assert top[0].tolist() == [1, 3, 0]
+        # Ties at the cut-off keep feature order, like a stable sort
+        assert top[1].tolist() == [2, 0, 1]
+        assert ExplainabilityService.rank_top_features(shap_values, 10).shape == (2, 4)
+    
+    def test_build_explanation_renders_only_top_features(self):
+        import numpy as np
+        from services.explainability_service import ExplainabilityService
+        
+        with patch.object(ExplainabilityService, '_load_explainer'):
+            service = ExplainabilityService()
+        n_features = service.schema.n_features
+        shap_row = np.linspace(-0.2, 0.3, n_features)
+        feature_values = np.ones(n_features)
+        
+        with patch.object(service, '_get_feature_description', wraps=service._get_feature_description) as describe:
+            explanation = service.build_explanation(feature_values, shap_row, -4.0, {}, top_n=3)
+        
+        assert describe.call_count == 3
+        assert list(explanation["top_features"]) == service.schema.feature_names[-3:][::-1]
+        assert explanation["total_shap_contribution"] == pytest.approx(shap_row.sum())
+        
+        assert service._get_feature_description('late_payments_12m', 2.0, 0.1) == \
+            "Having 2 late payments in the last 12 months significantly increases your risk"
+        assert service._get_feature_recommendation('loan_amnt', 1.0, 0.005) is None
+        assert service._get_feature_recommendation('loan_amnt', 1.0, -0.5) is None
+    
+    def test_descriptions_show_submitted_values(self):
+        import numpy as np
+        from services.explainability_service import ExplainabilityService
+        
+        with patch.object(ExplainabilityService, '_load_explainer'):
+            service = ExplainabilityService()
+        income, rate = service.schema.feature_index['person_income'], service.schema.feature_index['loan_int_rate']
+        shap_row = np.zeros(service.schema.n_features)
+        shap_row[[income, rate]] = [-0.4, 0.2]
+        # Model input after clipping (income capped) and filling (rate missing from the request)
+        feature_values = np.zeros(service.schema.n_features)
+        feature_values[[income, rate]] = [150000.0, 11.0]
+        
+        explanation = service.build_explanation(feature_values, shap_row, -4.0, {'person_income': 2500000}, top_n=2)
+        
+        top = explanation["top_features"]
+        assert top['person_income']['feature_value'] == 2500000.0
+        assert "₹2,500,000" in top['person_income']['description']
+        assert top['loan_int_rate']['feature_value'] == 11.0
 
 class TestServiceIntegration:
     """Test service integration scenarios"""
@@ -0,0 +1,304 @@
+# backend/tests/test_training.py
+"""
+Tests for the Federated Training Pipeline
+
+Tests data ingestion, client partitioning, local model training and
+federated aggregation.
+"""
+
+import pytest
+import pandas as pd
+import numpy as np
+from pathlib import Path
+import sys
+
+# Add backend to path
+backend_path = Path(__file__).parent.parent
+sys.path.append(str(backend_path))
+
+from models.federated_gbdt import FederatedClient, FederatedHistogramGBDT
+from scripts.client_partitioning import partition_clients, write_shards
+from models.tree_shap import TreeShapExplainer
+from scripts.data_ingestion import (
+    StreamingDeduplicator, hash_partition, iter_table_chunks, read_csv_projected, read_table, stream_partition_csv, write_table
+)
+from models.quantile_sketch import StreamingStatistics
+from scripts.data_preprocessing import DataPreprocessor
+from scripts.train_model import FederatedLearningSimulator, SharedClientData
+
+SAMPLE_DATA_PATH = backend_path / "data" / "processed_data.csv"
+
+
+@pytest.fixture(scope="module")
+def client_datasets():
+    df = pd.read_csv(SAMPLE_DATA_PATH)
+    df['target'] = df['target'].map({0.0: 0, 0.21: 0, 1.0: 1})
+    df = df.dropna(subset=['target']).astype({'target': int})
+    df = df.sample(frac=1, random_state=42)
+    return [df.iloc[rows] for rows in np.array_split(np.arange(len(df)), 4)]
+
+
+@pytest.fixture(scope="module")
+def training_data(client_datasets):
+    simulator = FederatedLearningSimulator(str(SAMPLE_DATA_PATH))
+    X, y = simulator.prepare_features_and_target(pd.concat(client_datasets))
+    return X.to_numpy(dtype=np.float64), y.to_numpy(), list(X.columns)
+
+
+class TestDataIngestion:
+    """Test chunked CSV reading and streaming client partitioning"""
+
+    def test_projected_read_uses_declared_dtypes(self):
+        df = read_csv_projected(str(SAMPLE_DATA_PATH), ['loan_grade', 'loan_amnt', 'customer_id'], chunk_rows=128)
+        expected = pd.read_csv(SAMPLE_DATA_PATH, usecols=['loan_grade', 'loan_amnt', 'customer_id'])
+
+        assert list(df.columns) == ['loan_grade', 'loan_amnt', 'customer_id']
+        assert df['loan_grade'].dtype == np.int32
+        pd.testing.assert_frame_equal(df, expected[df.columns], check_dtype=False)
+
+    def test_raw_csv_loads_chunked_and_whole(self, tmp_path):
+        """Files that are not label-encoded keep inferred dtypes; missing IDs stay missing"""
+        raw = pd.DataFrame({
+            'person_id': [1, None, 3, 4, None],
+            'person_home_ownership': ['RENT', 'OWN', 'MORTGAGE', 'RENT', None],
+            'loan_amnt': [1000.0, 2500.0, None, 4000.0, 800.0],
+        })
+        path = tmp_path / "raw.csv"
+        raw.to_csv(path, index=False)
+        preprocessor = DataPreprocessor()
+
+        whole = preprocessor.load_data(str(path))
+        chunked = preprocessor.load_data(str(path), chunk_rows=2)
+
+        assert chunked['person_id'].dtype == 'Int64'
+        assert chunked['person_id'].isna().sum() == 2
+        assert chunked['person_home_ownership'].tolist()[:4] == ['RENT', 'OWN', 'MORTGAGE', 'RENT']
+        pd.testing.assert_frame_equal(chunked, whole, check_dtype=False)
+
+    def test_stream_partition_is_complete_and_chunk_independent(self, tmp_path):
+        small = stream_partition_csv(str(SAMPLE_DATA_PATH), str(tmp_path / "small"), 4,
+                                     key_column='customer_id', chunk_rows=97)
+        large = stream_partition_csv(str(SAMPLE_DATA_PATH), str(tmp_path / "large"), 4,
+                                     key_column='customer_id', chunk_rows=10000)
+
+        assert [shard['rows'] for shard in small] == [shard['rows'] for shard in large]
+        assert sum(shard['rows'] for shard in small) == len(pd.read_csv(SAMPLE_DATA_PATH))
+        # Every customer's rows land on a single client
+        owners = pd.concat([pd.read_csv(shard['path'], usecols=['customer_id']).assign(client=shard['client_id'])
+                            for shard in small])
+        assert (owners.groupby('customer_id')['client'].nunique() == 1).all()
+
+
+    @pytest.mark.parametrize("extension", [".parquet", ".arrow"])
+    def test_columnar_round_trip_and_projection(self, tmp_path, extension):
+        df = pd.read_csv(SAMPLE_DATA_PATH)
+        path = str(tmp_path / f"processed_data{extension}")
+        write_table(df, path)
+
+        pd.testing.assert_frame_equal(read_table(path), df)
+        columns = ['loan_amnt', 'age', 'target']
+        pd.testing.assert_frame_equal(read_table(path, columns), df[columns])
+        chunks = list(iter_table_chunks(path, chunk_rows=100, columns=columns))
+        assert max(len(chunk) for chunk in chunks) == 100
+        pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), df[columns])
+
+    def test_stream_partition_to_parquet_matches_csv(self, tmp_path):
+        csv_shards = stream_partition_csv(str(SAMPLE_DATA_PATH), str(tmp_path / "csv"), 3,
+                                          key_column='customer_id', chunk_rows=200)
+        parquet_shards = stream_partition_csv(str(SAMPLE_DATA_PATH), str(tmp_path / "parquet"), 3,
+                                              key_column='customer_id', chunk_rows=200, output_format='parquet')
+
+        for csv_shard, parquet_shard in zip(csv_shards, parquet_shards):
+            assert parquet_shard['path'].endswith('.parquet')
+            pd.testing.assert_frame_equal(read_table(parquet_shard['path']), read_table(csv_shard['path']))
+
+    def test_streaming_dedup_matches_drop_duplicates(self):
+        df = pd.read_csv(SAMPLE_DATA_PATH)
+        df = pd.concat([df, df.iloc[::3], df.iloc[::5]], ignore_index=True)
+        deduplicator = StreamingDeduplicator()
+        duplicated = np.concatenate([deduplicator.duplicated(df.iloc[rows])
+                                     for rows in np.array_split(np.arange(len(df)), 7)])
+
+        np.testing.assert_array_equal(duplicated, df.duplicated().to_numpy())
+        assert deduplicator.duplicates == df.duplicated().sum()
+        assert len(deduplicator.seen) == len(df.drop_duplicates())
+
+    def test_stream_partition_dedup_counts_per_shard(self, tmp_path):
+        df = pd.read_csv(SAMPLE_DATA_PATH)
+        repeated = df.iloc[::4]
+        path = tmp_path / "with_duplicates.csv"
+        pd.concat([df, repeated]).to_csv(path, index=False)
+
+        clean = stream_partition_csv(str(SAMPLE_DATA_PATH), str(tmp_path / "clean"), 3, chunk_rows=150)
+        dedup = stream_partition_csv(str(path), str(tmp_path / "dedup"), 3, chunk_rows=150, dedup=True)
+
+        assert [shard['rows'] for shard in dedup] == [shard['rows'] for shard in clean]
+        assert sum(shard['duplicates_dropped'] for shard in dedup) == len(repeated)
+        for shard in dedup:
+            # A duplicate is counted against the shard holding its first occurrence
+            rows = read_table(shard['path'])
+            assert shard['duplicates_dropped'] == rows['person_id'].isin(repeated['person_id']).sum()
+
+
+class TestDataPreprocessing:
+    """Test vectorized cleaning and categorical encoding"""
+
+    def test_clean_data_fills_and_caps(self):
+        df = pd.DataFrame({
+            'loan_amnt': [1000.0, np.nan, 1200.0, 1100.0, 90000.0, 1300.0],
+            'age': [30.0, 40.0, np.nan, 50.0, 60.0, 70.0],
+            'region': ['north', None, 'south', 'south', 'north', 'east'],
+        })
+        clean = DataPreprocessor().clean_data(df)
+
+        assert not clean.isna().any().any()
+        assert clean.loc[1, 'loan_amnt'] == df['loan_amnt'].median()
+        assert clean.loc[2, 'age'] == df['age'].median()
+        # Tie between north and south: the smallest, as Series.mode() returns
+        assert clean.loc[1, 'region'] == 'north'
+        # Caps come from the quartiles after filling, as before vectorization:
+        # loan_amnt filled with its median 1200 has q1 1125 and q3 1275
+        assert clean['loan_amnt'].max() == 1275 + 1.5 * (1275 - 1125)
+        assert df['loan_amnt'].isna().sum() == 1  # input untouched
+
+    def test_encoding_matches_label_encoder(self):
+        from sklearn.preprocessing import LabelEncoder
+
+        train = pd.DataFrame({'loan_intent': ['MEDICAL', 'EDUCATION', 'VENTURE', 'MEDICAL']})
+        preprocessor = DataPreprocessor()
+        encoded = preprocessor.encode_categorical_features(train)
+        np.testing.assert_array_equal(encoded['loan_intent'], LabelEncoder().fit_transform(train['loan_intent']))
+
+        serving = pd.DataFrame({'loan_intent': ['VENTURE', 'UNKNOWN', 'EDUCATION']})
+        encoded = preprocessor.encode_categorical_features(serving)
+        assert encoded['loan_intent'].tolist() == [2, 0, 0]
+
+
+    def test_chunked_cleaning_with_merged_sketches(self):
+        df = pd.read_csv(SAMPLE_DATA_PATH)
+        df.loc[::7, 'loan_amnt'] = np.nan
+        chunks = [df.iloc[rows] for rows in np.array_split(np.arange(len(df)), 4)]
+
+        exact = DataPreprocessor()
+        exact.clean_data(df)
+        streaming = DataPreprocessor()
+        # k above the row count keeps the sketches exact, leaving only quantile interpolation differences
+        stats = StreamingStatistics.merged([streaming.collect_statistics([chunk], k=len(df)) for chunk in chunks])
+        cleaned = pd.concat(streaming.clean_chunks(chunks, stats))
+
+        assert not cleaned['loan_amnt'].isna().any()
+        for col in ('loan_amnt', 'person_income', 'loan_int_rate'):
+            np.testing.assert_allclose(streaming.clip_bounds[col], exact.clip_bounds[col], rtol=0.01)
+            assert cleaned[col].max() <= streaming.clip_bounds[col][1]
+
+
+class TestClientPartitioning:
+    """Test deterministic hash-based client partitioning"""
+
+    def test_iid_partition_views_match_streaming_split(self, tmp_path):
+        df = pd.read_csv(SAMPLE_DATA_PATH)
+        partition = partition_clients(df, 4)
+
+        np.testing.assert_array_equal(partition.clients, hash_partition(df, 4, 'person_id'))
+        assert all(np.shares_memory(rows, partition.order) for rows in partition)
+        np.testing.assert_array_equal(np.sort(np.concatenate(list(partition))), np.arange(len(df)))
+
+        paths = write_shards(partition.frames(df), str(tmp_path), 'parquet')
+        for i, path in enumerate(paths):
+            pd.testing.assert_frame_equal(read_table(path), df.iloc[partition.indices(i)].reset_index(drop=True))
+
+    @pytest.mark.parametrize("scheme", ["label_skew", "quantity_skew"])
+    def test_skewed_partitions_are_deterministic_per_key(self, scheme):
+        df = pd.read_csv(SAMPLE_DATA_PATH)
+        partition = partition_clients(df, 5, scheme, key_column='customer_id', alpha=0.3)
+        shuffled = df.sample(frac=1, random_state=7)
+        reshuffled = partition_clients(shuffled, 5, scheme, key_column='customer_id', alpha=0.3)
+
+        # Assignment follows the rows, not their order, and keeps each customer on one client
+        np.testing.assert_array_equal(reshuffled.clients, partition.clients[shuffled.index])
+        owners = pd.Series(partition.clients).groupby(df['customer_id']).nunique()
+        assert (owners == 1).all()
+        assert sum(partition.sizes) == len(df)
+
+        # Rows with a missing key or label are still assigned, and the same way for any row order
+        holes = df.copy()
+        holes.loc[holes.index % 7 == 0, 'customer_id'] = np.nan
+        holes.loc[holes.index % 11 == 0, 'target'] = np.nan
+        partition = partition_clients(holes, 5, scheme, key_column='customer_id', alpha=0.3)
+        reshuffled = partition_clients(holes.loc[shuffled.index], 5, scheme, key_column='customer_id', alpha=0.3)
+
+        assert partition.clients.min() >= 0
+        assert sum(partition.sizes) == len(holes)
+        np.testing.assert_array_equal(reshuffled.clients, partition.clients[shuffled.index])
+
+
+class TestClientTraining:
+    """Test sequential and process-pool client training"""
+
+    def test_shared_client_data_views(self):
+        blocks = [(np.arange(6, dtype=np.float64).reshape(3, 2), np.array([0, 1, 0])),
+                  (np.full((2, 2), 7.0), np.array([1, 1]))]
+        shared = SharedClientData.create(blocks)
+        try:
+            X, y = shared.client(1)
+            assert np.shares_memory(X, shared.matrix)
+            np.testing.assert_array_equal(X, blocks[1][0])
+            np.testing.assert_array_equal(y, blocks[1][1])
+        finally:
+            shared.close()
+            shared.unlink()
+
+    def test_parallel_matches_sequential(self, client_datasets):
+        simulator = FederatedLearningSimulator(str(SAMPLE_DATA_PATH), n_clients=4, n_jobs=2, client_workers=2)
+        X, _ = simulator.prepare_features_and_target(client_datasets[0])
+
+        sequential = FederatedLearningSimulator(str(SAMPLE_DATA_PATH), n_clients=4, n_jobs=1)
+        expected = sequential.train_client_models(client_datasets)
+        models = simulator.train_client_models(client_datasets)
+
+        assert len(models) == 4
+        for model, reference in zip(models, expected):
+            assert list(model.feature_name_) == list(reference.feature_name_)
+            np.testing.assert_allclose(model.predict_proba(X), reference.predict_proba(X))
+
+
+    def test_process_hosted_federated_clients_match_local(self, client_datasets):
+        simulator = FederatedLearningSimulator(str(SAMPLE_DATA_PATH), n_clients=4, client_workers=2)
+        simulator.federated_params['n_estimators'] = 5
+        sequential = FederatedLearningSimulator(str(SAMPLE_DATA_PATH), n_clients=4)
+        sequential.federated_params['n_estimators'] = 5
+
+        model = simulator.aggregate_global_model(client_datasets)
+        expected = sequential.aggregate_global_model(client_datasets)
+
+        X = simulator.prepare_features_and_target(client_datasets[0])[0].to_numpy(dtype=np.float64)
+        np.testing.assert_array_equal(model.predict_raw(X), expected.predict_raw(X))
+
+
+class TestFederatedGBDT:
+    """Test the federated histogram GBDT global model"""
+
+    def test_clients_match_pooled_training(self, training_data):
+        X, y, feature_names = training_data
+        pooled = FederatedHistogramGBDT(n_estimators=10)
+        pooled_model = pooled.fit([FederatedClient(X, y)], feature_names)
+
+        clients = [FederatedClient(X[rows], y[rows]) for rows in np.array_split(np.arange(len(X)), 3)]
+        federated = FederatedHistogramGBDT(n_estimators=10)
+        federated_model = federated.fit(clients, feature_names, bin_edges=pooled.bin_edges)
+
+        np.testing.assert_allclose(federated_model.predict_raw(X), pooled_model.predict_raw(X), atol=1e-9)
+        # Clients' running scores agree with the exported ensemble
+        np.testing.assert_allclose(np.concatenate([c.raw for c in clients]), federated_model.predict_raw(X))
+        assert federated.history[1]['bytes_up'] > pooled.history[1]['bytes_up']
+
+    def test_global_model_serves_and_explains(self, training_data):
+        X, y, feature_names = training_data
+        clients = [FederatedClient(X[rows], y[rows]) for rows in np.array_split(np.arange(len(X)), 4)]
+        model = FederatedHistogramGBDT(n_estimators=20).fit(clients, feature_names)
+
+        assert model.n_trees == 20
+        explainer = TreeShapExplainer(model)
+        shap_values = explainer.shap_values(X[:20])
+        np.testing.assert_allclose(explainer.expected_value + shap_values.sum(axis=1), model.predict_raw(X[:20]),
+                                   atol=1e-9)